@@ -0,0 +1,119 @@
+"""Асинхронный клиент CalendarService на grpc.aio.
+
+Сервисам на asyncio не нужно держать поток на каждый ожидающий вызов, как
+при вызовах синхронного CalendarClient через run_in_executor: вызовы
+AsyncCalendarClient - сопрограммы, и любое их число идет одновременно по
+каналам одного пула (channels.AsyncChannelPool). HTTP/2 мультиплексирует
+их в одном соединении, и следующий запрос уходит, не дожидаясь ответа на
+предыдущий.
+
+Сроки, повторы чтений, keepalive и сжатие задает ChannelConfig, как и для
+синхронного клиента. Ошибки gRPC (срок, недоступность сервера, неверный
+запрос) выходят из методов как grpc.aio.AioRpcError, а отказы сервиса
+(конфликт, событие не найдено, версия не совпала) - как ответы с
+success=False.
+
+    async with AsyncCalendarClient(ChannelConfig(target='localhost:50054')) as client:
+        response = await client.create_event(title='Встреча', start_time='2030-01-01T10:00',
+                                              end_time='2030-01-01T11:00', attendees=['a@x'])
+        events = await client.gather_events(ids, concurrency=100)
+        async for event in client.iter_events(organizer='a@x'):
+            ...
+"""
+import asyncio
+from typing import AsyncIterator, Iterable, List, Optional
+
+import calendar_pb2
+from channels import AsyncChannelPool, ChannelConfig
+
+
+# Сколько вызовов gather_events держит одновременно по умолчанию
+DEFAULT_CONCURRENCY = 64
+
+
+class AsyncCalendarClient:
+    """Сопрограммы create/get/update/delete/list поверх пула каналов grpc.aio.
+
+    Создается внутри работающего цикла событий.
+    """
+
+    def __init__(self, config: ChannelConfig = ChannelConfig()):
+        self.pool = AsyncChannelPool(config)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def wait_ready(self, timeout: Optional[float] = None):
+        await self.pool.wait_ready(timeout)
+
+    async def create_event(self, **fields) -> calendar_pb2.EventResponse:
+        """Создает событие из полей EventDetails (title, start_time, end_time, attendees, ...)"""
+        return await self.pool.stub().CreateEvent(calendar_pb2.EventDetails(**fields))
+
+    async def get_event(self, event_id: str, if_none_match: int = 0) -> Optional[calendar_pb2.EventDetails]:
+        """Событие по ID, None - события нет.
+
+        С if_none_match, равным текущей версии, сервер отвечает без данных
+        события (status not_modified).
+        """
+        event = await self.pool.stub().GetEvent(calendar_pb2.EventRequest(
+            event_id=event_id, if_none_match=if_none_match
+        ))
+        return None if event.status == 'not_found' else event
+
+    async def update_event(self, event_id: str, version: int = 0, **fields) -> calendar_pb2.EventResponse:
+        """Меняет только переданные поля события (update_mask).
+
+        С version обновление выполняется, только если текущая версия
+        события совпадает, иначе ответ несет текущую версию события.
+        """
+        request = calendar_pb2.EventDetails(event_id=event_id, version=version, **fields)
+        request.update_mask.paths.extend(fields)
+        return await self.pool.stub().UpdateEvent(request)
+
+    async def delete_event(self, event_id: str, version: int = 0) -> calendar_pb2.EventResponse:
+        return await self.pool.stub().DeleteEvent(calendar_pb2.EventRequest(event_id=event_id, if_match=version))
+
+    async def list_events(self, **filter_fields) -> calendar_pb2.EventList:
+        """Одна страница ListEvents по полям EventsFilter (page_size, page_token, organizer, ...)"""
+        return await self.pool.stub().ListEvents(calendar_pb2.EventsFilter(**filter_fields))
+
+    async def iter_events(self, **filter_fields) -> AsyncIterator[calendar_pb2.EventDetails]:
+        """События по фильтру по мере получения из StreamEvents, без сборки в один ответ"""
+        async for event in self.pool.stub().StreamEvents(calendar_pb2.EventsFilter(**filter_fields)):
+            yield event
+
+    async def gather_events(self, event_ids: Iterable[str],
+                            concurrency: int = DEFAULT_CONCURRENCY) -> List[Optional[calendar_pb2.EventDetails]]:
+        """События по списку ID в том же порядке (None - события нет).
+
+        Запросы GetEvent идут параллельно, но одновременно не больше
+        concurrency, чтобы большой список не занял все потоки сервера.
+        Первая ошибка gRPC отменяет оставшиеся запросы. ValueError -
+        concurrency меньше 1.
+        """
+        if concurrency < 1:
+            raise ValueError("Число одновременных запросов должно быть не меньше 1")
+        event_ids = list(event_ids)
+        results: List[Optional[calendar_pb2.EventDetails]] = [None] * len(event_ids)
+        positions = iter(range(len(event_ids)))
+
+        async def worker():
+            # Каждый исполнитель берет следующий ID, пока они не кончатся
+            for position in positions:
+                results[position] = await self.get_event(event_ids[position])
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(event_ids)))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+        return results
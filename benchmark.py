@@ -0,0 +1,1145 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent import futures
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional
+
+import grpc
+import grpc.aio
+
+import calendar_pb2
+import calendar_pb2_grpc
+from async_client import AsyncCalendarClient
+from cache import ResponseCache
+from channels import ChannelConfig, ChannelPool
+from records import DAY, EventRecord, parse_timestamp
+from recurrence import Recurrence, occurrence
+from logs import log
+from persistence import WriteAheadLog, encode_change, open_store, write_snapshot
+from server import AsyncCalendarServicer, CalendarServicer, add_servicer, close_store, create_server
+from storage import InMemoryEventStore
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+BASE_TIME = datetime(2025, 1, 1, 8, 0)
+EVENTS_PER_HOUR = 50
+
+
+def synthetic_events(count: int, attendee_pool: int = 1000, seed: int = 17,
+                     per_hour: int = EVENTS_PER_HOUR) -> List[Dict]:
+    """Генерирует синтетический календарь заданного размера.
+
+    События идут плотным потоком по per_hour в час, поэтому при росте
+    календаря растет его длительность, а не плотность событий у участника.
+    Плотность (и доля пересечений у участников) задается per_hour
+    относительно размера пула участников attendee_pool.
+    """
+    return list(iter_synthetic_events(count, attendee_pool, seed, per_hour))
+
+
+def iter_synthetic_events(count: int, attendee_pool: int = 1000, seed: int = 17,
+                          per_hour: int = EVENTS_PER_HOUR) -> Iterator[Dict]:
+    """Лениво выдает события synthetic_events"""
+    rng = random.Random(seed)
+    created = BASE_TIME.isoformat()
+    for i in range(count):
+        start = BASE_TIME + timedelta(hours=i // per_hour, minutes=rng.randrange(0, 60, 15))
+        yield {
+            'event_id': f'bench_{i:08d}',
+            'title': f'Событие {i}',
+            'description': '',
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(minutes=rng.choice((30, 60, 90)))).isoformat(),
+            'location': '',
+            'attendees': [f'user{rng.randrange(attendee_pool)}@company.com' for _ in range(3)],
+            'organizer': f'user{rng.randrange(attendee_pool)}@company.com',
+            'status': 'scheduled',
+            'created_at': created,
+            'updated_at': created
+        }
+
+
+def ordered_records(count: int, attendee_pool: int = 1000,
+                    per_hour: int = EVENTS_PER_HOUR) -> Iterator[EventRecord]:
+    """Синтетические записи в порядке (local_start, ID), не собирая их все в памяти"""
+    events = iter_synthetic_events(count, attendee_pool, per_hour=per_hour)
+    while True:
+        # События одного часа идут подряд, сортируем их внутри часа
+        hour = [EventRecord.from_dict(event) for event in islice(events, per_hour)]
+        if not hour:
+            return
+        hour.sort(key=lambda record: (record.local_start, record.event_id))
+        yield from hour
+
+
+def seeded_servicer(count: int, cache: Optional[ResponseCache] = None) -> CalendarServicer:
+    """Создает сервис с синтетическим календарем без проверки конфликтов"""
+    servicer = CalendarServicer(cache=cache)
+    servicer.store.clear()
+    for event in synthetic_events(count):
+        servicer.store.put(EventRecord.from_dict(event))
+    return servicer
+
+
+def event_details(event: Dict) -> calendar_pb2.EventDetails:
+    """Сообщение для CreateEvent из синтетического события"""
+    return calendar_pb2.EventDetails(
+        title=event['title'],
+        description=event['description'],
+        start_time=event['start_time'],
+        end_time=event['end_time'],
+        location=event['location'],
+        attendees=event['attendees'],
+        organizer=event['organizer']
+    )
+
+
+def start_server(servicer: CalendarServicer, workers: int = 10):
+    """Запускает сервер в текущем процессе на свободном порту"""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    add_servicer(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    return server, f'127.0.0.1:{port}'
+
+
+@contextlib.contextmanager
+def quiet():
+    """Отправляет вывод сервера в /dev/null, не убирая саму запись"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            yield
+        finally:
+            # Журнал запросов пишет из фонового потока - его записи выводим сюда же
+            log.flush()
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_conflicts(sizes: List[int], queries: int):
+    """Замеряет задержку check_time_conflicts для календарей разного размера"""
+    print(f"{'событий':>10} {'p50, мкс':>10} {'p99, мкс':>10} {'конфликтов':>11}")
+    for size in sizes:
+        servicer = seeded_servicer(size)
+        rng = random.Random(size)
+        hours = max(1, size // EVENTS_PER_HOUR)
+        samples = []
+        found = 0
+        for _ in range(queries):
+            start = BASE_TIME + timedelta(hours=rng.randrange(hours), minutes=rng.randrange(0, 60, 15))
+            end = start + timedelta(hours=1)
+            attendees = [f'user{rng.randrange(1000)}@company.com' for _ in range(3)]
+            begin = time.perf_counter()
+            conflicts = servicer.check_time_conflicts(
+                None, parse_timestamp(start.isoformat()), parse_timestamp(end.isoformat()), attendees
+            )
+            samples.append((time.perf_counter() - begin) * 1e6)
+            found += len(conflicts)
+        print(f"{size:>10} {statistics.median(samples):>10.1f} {percentile(samples, 0.99):>10.1f} {found:>11}")
+
+
+def measure_memory(build: Callable[[], object]) -> int:
+    """Возвращает объем памяти, занятый результатом build()"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def dict_list_scan(events: Dict[str, Dict], start_date: str, end_date: str) -> int:
+    """Фильтрация по датам в прежнем формате хранения (строки ISO)"""
+    found = 0
+    for event in events.values():
+        event_start = datetime.fromisoformat(event['start_time']).date()
+        if event_start < datetime.fromisoformat(start_date).date():
+            continue
+        if event_start > datetime.fromisoformat(end_date).date():
+            continue
+        calendar_pb2.EventDetails(**event)
+        found += 1
+    return found
+
+
+def dict_conflict_scan(events: Dict[str, Dict], start_time: str, end_time: str, attendees: List[str]) -> int:
+    """Полный проход проверки конфликтов в прежнем формате хранения"""
+    found = 0
+    start_dt = datetime.fromisoformat(start_time)
+    end_dt = datetime.fromisoformat(end_time)
+    for event in events.values():
+        if event['status'] != 'scheduled':
+            continue
+        existing_start = datetime.fromisoformat(event['start_time'])
+        existing_end = datetime.fromisoformat(event['end_time'])
+        if not (end_dt <= existing_start or start_dt >= existing_end):
+            if set(attendees) & set(event['attendees']):
+                found += 1
+    return found
+
+
+def record_scan(records: Dict[str, EventRecord], start: int, end: int, attendees: List[str]) -> int:
+    """Тот же полный проход по компактным записям с заранее разобранным временем"""
+    found = 0
+    wanted = set(attendees)
+    for record in records.values():
+        if record.status != 'scheduled':
+            continue
+        if not (end <= record.start or start >= record.end):
+            if wanted.intersection(record.attendees):
+                found += 1
+    return found
+
+
+def timed(func: Callable[[], object], repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - begin)
+    return best * 1000
+
+
+def bench_records(count: int):
+    """Сравнивает память и задержку словарей с ISO-строками и EventRecord"""
+    events = synthetic_events(count)
+    dict_size = measure_memory(lambda: {event['event_id']: dict(event, attendees=list(event['attendees']))
+                                        for event in synthetic_events(count)})
+    record_size = measure_memory(lambda: {record.event_id: record
+                                          for record in map(EventRecord.from_dict, synthetic_events(count))})
+
+    dicts = {event['event_id']: event for event in events}
+    records = {event['event_id']: EventRecord.from_dict(event) for event in events}
+
+    day = BASE_TIME.date().isoformat()
+    window = (BASE_TIME + timedelta(hours=5)).isoformat(), (BASE_TIME + timedelta(hours=6)).isoformat()
+    attendees = ['user1@company.com', 'user2@company.com']
+    servicer = seeded_servicer(count)
+    list_request = calendar_pb2.EventsFilter(start_date=day, end_date=day)
+
+    print(f"Событий: {count}")
+    print(f"{'':<28} {'dict + ISO':>12} {'EventRecord':>12}")
+    print(f"{'память на событие, байт':<28} {dict_size / count:>12.0f} {record_size / count:>12.0f}")
+    print(f"{'полный проход конфликтов, мс':<28} "
+          f"{timed(lambda: dict_conflict_scan(dicts, *window, attendees)):>12.1f} "
+          f"{timed(lambda: record_scan(records, *map(parse_timestamp, window), attendees)):>12.1f}")
+    print(f"{'ListEvents за день, мс':<28} "
+          f"{timed(lambda: dict_list_scan(dicts, day, day)):>12.1f} "
+          f"{timed(lambda: servicer.list_events(list_request)):>12.1f}")
+
+
+def bench_batch(count: int, batch_size: int):
+    """Сравнивает импорт через цикл CreateEvent и через BatchCreateEvents"""
+    requests = [event_details(event) for event in synthetic_events(count)]
+    results = {}
+
+    for mode in ('CreateEvent', 'BatchCreateEvents'):
+        with quiet():
+            servicer = CalendarServicer()
+            servicer.store.clear()
+            server, target = start_server(servicer)
+        with grpc.insecure_channel(target) as channel:
+            stub = calendar_pb2_grpc.CalendarServiceStub(channel)
+            created = 0
+            with quiet():
+                begin = time.perf_counter()
+                if mode == 'CreateEvent':
+                    for request in requests:
+                        created += stub.CreateEvent(request).success
+                else:
+                    for i in range(0, count, batch_size):
+                        batch = calendar_pb2.BatchCreateRequest(events=requests[i:i + batch_size])
+                        created += stub.BatchCreateEvents(batch).success_count
+                elapsed = time.perf_counter() - begin
+        server.stop(0)
+        results[mode] = count / elapsed
+        print(f"{mode:<18} {count / elapsed:>10.0f} событий/с (создано {created} из {count})")
+
+    print(f"Ускорение: {results['BatchCreateEvents'] / results['CreateEvent']:.1f}x")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def server_process(*args: str):
+    """Запускает server.py отдельным процессом и ждет готовности порта"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPT, '--port', str(port), *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    target = f'127.0.0.1:{port}'
+    try:
+        with grpc.insecure_channel(target) as channel:
+            grpc.channel_ready_future(channel).result(timeout=30)
+        yield target
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def drive_clients(target: str, clients: int, duration: float, channels: int):
+    """Держит clients одновременных клиентов, каждый шлет запросы без пауз"""
+    pool = [grpc.aio.insecure_channel(target) for _ in range(channels)]
+    stubs = [calendar_pb2_grpc.CalendarServiceStub(channel) for channel in pool]
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(index: int):
+        nonlocal errors
+        stub = stubs[index % len(stubs)]
+        get_request = calendar_pb2.EventRequest(event_id='event_001')
+        list_request = calendar_pb2.EventsFilter(page_size=10)
+        calls = 0
+        while time.perf_counter() < deadline:
+            begin = time.perf_counter()
+            try:
+                if calls % 4 == 3:
+                    await stub.ListEvents(list_request, timeout=30)
+                else:
+                    await stub.GetEvent(get_request, timeout=30)
+                latencies.append(time.perf_counter() - begin)
+            except grpc.aio.AioRpcError:
+                errors += 1
+            calls += 1
+
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    for channel in pool:
+        await channel.close()
+    return latencies, errors
+
+
+def bench_bulk(count: int, batch_size: int):
+    """BatchCreateEvents целиком: проверка каждого события хранилищем против BulkConflictChecker.
+
+    Пакеты двух видов: серия событий одних участников каждый час (как при
+    разворачивании повторяющегося события) и события случайных участников
+    вперемешку с календарем (как при импорте чужого календаря). Отдельно -
+    CreateEvent еженедельной серии из 100 вхождений (check_series). Время -
+    servicer.create_events с учетом записи; созданные события удаляются
+    после каждого запуска, чтобы следующий шел по тому же календарю.
+    """
+    attendees = ['user1@company.com', 'user2@company.com', 'user3@company.com']
+    hourly = [
+        calendar_pb2.EventDetails(title='Серия', start_time=(BASE_TIME + timedelta(hours=i)).isoformat(),
+                                  end_time=(BASE_TIME + timedelta(hours=i, minutes=30)).isoformat(),
+                                  attendees=attendees, organizer=attendees[0])
+        for i in range(batch_size)
+    ]
+    mixed = [event_details(event) for event in synthetic_events(batch_size, seed=count)]
+    weekly = [calendar_pb2.EventDetails(title='Планерка', start_time=BASE_TIME.isoformat(),
+                                        end_time=(BASE_TIME + timedelta(minutes=30)).isoformat(),
+                                        attendees=attendees, organizer=attendees[0],
+                                        recurrence=calendar_pb2.Recurrence(frequency='weekly', count=100))]
+
+    def create(servicer: CalendarServicer, requests, bulk: bool):
+        best = float('inf')
+        for _ in range(3):
+            begin = time.perf_counter()
+            responses = servicer.create_events(requests, bulk=bulk)
+            best = min(best, time.perf_counter() - begin)
+            created = [response.event.event_id for response in responses if response.success]
+            for event_id in created:
+                servicer.store.delete(event_id)
+        return best * 1000, len(requests) - len(created)
+
+    print(f"Событий: {count}, пакет: {batch_size}, мс")
+    print(f"{'':<24} {'по одному':>10} {'пакетом':>10} {'конфликтов':>11}")
+    for storage in ('memory', 'sqlite'):
+        data_dir = tempfile.mkdtemp(prefix='calendar-bench-') if storage == 'sqlite' else None
+        store = open_store(data_dir, storage)
+        store.load(ordered_records(count), count)
+        servicer = CalendarServicer(store, sample_data=False)
+        for name, requests in (('серия', hourly), ('вперемешку', mixed), ('CreateEvent серии', weekly)):
+            one_by_one, conflicting = create(servicer, requests, bulk=False)
+            bulk, _ = create(servicer, requests, bulk=True)
+            print(f"{storage + ', ' + name:<24} {one_by_one:>10.1f} {bulk:>10.1f} {conflicting:>11}")
+        close_store(store)
+        if data_dir:
+            shutil.rmtree(data_dir)
+
+
+def bench_freebusy(attendees: int, events_per_attendee: int, samples: int):
+    """Задержка GetFreeBusy и FindSlots для недельного окна группы участников"""
+    people = [f'user{i}@company.com' for i in range(attendees)]
+    rng = random.Random(attendees)
+    store = InMemoryEventStore()
+    records = []
+    for person in people:
+        # События участника разбросаны по году, в среднем несколько в день
+        for i in range(events_per_attendee):
+            start = BASE_TIME + timedelta(days=rng.randrange(365), hours=rng.randrange(10), minutes=rng.randrange(0, 60, 15))
+            end = start + timedelta(minutes=rng.choice((30, 60, 90)))
+            records.append(EventRecord(
+                f'{person}_{i}', 'Встреча', '', parse_timestamp(start.isoformat()), parse_timestamp(end.isoformat()),
+                '', [person], person, 'scheduled', 0, 0
+            ))
+    store.load(records)
+    servicer = CalendarServicer(store, sample_data=False)
+
+    def window(i: int):
+        start = BASE_TIME + timedelta(days=i % 358)
+        return start.isoformat(), (start + timedelta(days=7)).isoformat()
+
+    def free_busy(i: int):
+        start, end = window(i)
+        return servicer.free_busy(calendar_pb2.FreeBusyRequest(attendees=people, start_time=start, end_time=end))
+
+    def find_slots(i: int):
+        start, end = window(i)
+        return servicer.find_slots(calendar_pb2.FindSlotsRequest(
+            attendees=people, duration_minutes=30, start_time=start, end_time=end
+        ))
+
+    print(f"Участников: {attendees}, событий у каждого: {events_per_attendee}, окно - неделя")
+    print(f"{'':<14} {'p50, мкс':>9} {'p99, мкс':>9}")
+    print(f"{'GetFreeBusy':<14} {latency(free_busy, samples)}")
+    print(f"{'FindSlots':<14} {latency(find_slots, samples)}")
+
+
+def bench_recurring(series: int, days: int, samples: int):
+    """Ежедневные серии против тех же событий, сохраненных по одному"""
+    rng = random.Random(series)
+    rules = []
+    for i in range(series):
+        start = parse_timestamp((BASE_TIME + timedelta(minutes=rng.randrange(0, 600, 15))).isoformat())
+        rules.append(EventRecord(
+            f'standup_{i}', 'Планерка', '', start, start + 15 * 60 * 1_000_000, '', [f'team{i}@company.com'],
+            'lead@company.com', 'scheduled', 0, 0, recurrence=Recurrence('daily', count=days)
+        ))
+    stores = {'серии': InMemoryEventStore(), 'по одному': InMemoryEventStore()}
+    stores['серии'].load(rules)
+    stores['по одному'].load(
+        occurrence(rule, rule.start + day * DAY).replace(event_id=f'{rule.event_id}_{day}', recurrence=None)
+        for rule in rules for day in range(days)
+    )
+
+    base = parse_timestamp(BASE_TIME.isoformat())
+
+    def window(i: int):
+        start = base + (i % (days - 7)) * DAY
+        return start, start + 7 * DAY
+
+    def week(i: int) -> calendar_pb2.EventsFilter:
+        start = BASE_TIME + timedelta(days=i % (days - 7))
+        return calendar_pb2.EventsFilter(start_date=start.date().isoformat(),
+                                         end_date=(start + timedelta(days=6)).date().isoformat())
+
+    print(f"Серий: {series}, дней: {days}, окно - неделя")
+    print(f"{'хранилище':<12} {'записей':>8} {'ListEvents p50/p99, мкс':>24} {'конфликты p50/p99, мкс':>23}")
+    for name, store in stores.items():
+        servicer = CalendarServicer(store, sample_data=False)
+        listing = latency(lambda i: servicer.list_events(week(i)), samples)
+        conflicts = latency(lambda i: store.find_conflicts(*window(i), [f'team{i % series}@company.com']), samples)
+        print(f"{name:<12} {len(store):>8} {listing:>24} {conflicts:>23}")
+
+
+def bench_cache(count: int, hot: int, samples: int):
+    """Горячие GetEvent и ListEvents через gRPC с кешем ответов и без него"""
+    rng = random.Random(count)
+    hot_ids = [f'bench_{rng.randrange(count):08d}' for _ in range(hot)]
+    days = [(BASE_TIME + timedelta(hours=rng.randrange(count // EVENTS_PER_HOUR))).date().isoformat()
+            for _ in range(hot)]
+    get_requests = [calendar_pb2.EventRequest(event_id=hot_ids[i % hot]) for i in range(samples)]
+    list_requests = [calendar_pb2.EventsFilter(start_date=days[i % hot], end_date=days[i % hot], page_size=100)
+                     for i in range(samples)]
+
+    print(f"Событий: {count}, горячих запросов: {hot}, задержка в мкс (p50, p99)")
+    print(f"{'':<14} {'GetEvent':>19} {'ListEvents, 100':>19}")
+    for name, cache in (('без кеша', ResponseCache(max_events=0, max_lists=0)), ('с кешем', ResponseCache())):
+        with quiet():
+            servicer = seeded_servicer(count, cache)
+            server, target = start_server(servicer)
+            with grpc.insecure_channel(target) as channel:
+                stub = calendar_pb2_grpc.CalendarServiceStub(channel)
+                get = latency(lambda i: stub.GetEvent(get_requests[i]), samples)
+                listing = latency(lambda i: stub.ListEvents(list_requests[i]), samples)
+            server.stop(0)
+        print(f"{name:<14} {get:>19} {listing:>19}")
+    stats = servicer.cache.stats()
+    print("Попаданий/промахов: " + ", ".join(
+        f"{kind} {counters['hits']}/{counters['misses']}" for kind, counters in stats.items()
+    ))
+
+
+async def watch_round(watchers: int, writes: int, channels: int):
+    """Задержка записи и доставки изменения всем подписчикам на сервере grpc.aio"""
+    with quiet():
+        servicer = AsyncCalendarServicer(sample_data=False)
+    server = grpc.aio.server()
+    add_servicer(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    await server.start()
+    pool = [grpc.aio.insecure_channel(f'127.0.0.1:{port}') for _ in range(channels)]
+    stubs = [calendar_pb2_grpc.CalendarServiceStub(channel) for channel in pool]
+    # Большой пул участников - почти без конфликтов, отклоненная запись изменения не дает
+    requests = [event_details(event) for event in synthetic_events(writes, attendee_pool=10 ** 6)]
+
+    with quiet():
+        calls = [stubs[i % channels].WatchEvents(calendar_pb2.WatchRequest()) for i in range(watchers)]
+        for call in calls:
+            await call.read()  # progress с ревизией начала подписки
+        write_times, delivery_times = [], []
+        for request in requests:
+            begin = time.perf_counter()
+            if not servicer.create_event(request, include_event=False).success:
+                continue
+            written = time.perf_counter()
+            await asyncio.gather(*(call.read() for call in calls))
+            write_times.append((written - begin) * 1e6)
+            delivery_times.append((time.perf_counter() - begin) * 1e3)
+        for call in calls:
+            call.cancel()
+    for channel in pool:
+        await channel.close()
+    await server.stop(0)
+    return write_times, delivery_times
+
+
+def bench_watch(watchers: List[int], writes: int, channels: int):
+    """Запись не ждет подписчиков WatchEvents: задержка записи от их числа не зависит"""
+    print(f"Записей: {writes}, каналов: {channels}")
+    print(f"{'подписчиков':>12} {'запись p50/p99, мкс':>20} {'доставка всем p50/p99, мс':>27}")
+    for count in watchers:
+        write_times, delivery_times = asyncio.run(watch_round(count, writes, channels))
+        print(f"{count:>12} {statistics.median(write_times):>9.0f} {percentile(write_times, 0.99):>10.0f} "
+              f"{statistics.median(delivery_times):>13.1f} {percentile(delivery_times, 0.99):>13.1f}")
+
+
+def bench_load(clients: int, duration: float, channels: int, workers: int):
+    """Сравнивает сервер на пуле потоков и сервер grpc.aio под нагрузкой"""
+    modes = [
+        (f'пул из {workers} потоков', ('--workers', str(workers))),
+        ('asyncio', ('--async',)),
+    ]
+    print(f"Клиентов: {clients}, каналов: {channels}, длительность: {duration} с")
+    print(f"{'сервер':<20} {'запросов/с':>11} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+    for name, args in modes:
+        with server_process(*args) as target:
+            latencies, errors = asyncio.run(drive_clients(target, clients, duration, channels))
+        samples = [latency * 1000 for latency in latencies] or [0.0]
+        print(f"{name:<20} {len(latencies) / duration:>11.0f} {statistics.median(samples):>9.1f} "
+              f"{percentile(samples, 0.99):>9.1f} {errors:>7}")
+
+
+def client_process(target: str, clients: int, duration: float, channels: int):
+    """Отдельный процесс нагрузки: один клиентский процесс сам упирается в GIL"""
+    return asyncio.run(drive_clients(target, clients, duration, channels))
+
+
+def bench_scale(processes: List[int], client_processes: int, clients: int, duration: float):
+    """Пропускная способность чтения в зависимости от числа процессов сервера"""
+    print(f"Клиентских процессов: {client_processes}, клиентов в каждом: {clients}, "
+          f"длительность: {duration} с")
+    print(f"{'процессов':<10} {'запросов/с':>11} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+    context = multiprocessing.get_context('spawn')
+    for count in processes:
+        with server_process('--processes', str(count)) as target:
+            # Реплики принимают соединения после получения начальных данных
+            time.sleep(1)
+            with context.Pool(client_processes) as pool:
+                results = pool.starmap(
+                    client_process, [(target, clients, duration, 4)] * client_processes
+                )
+        latencies = [latency * 1000 for result, _ in results for latency in result]
+        errors = sum(errors for _, errors in results)
+        samples = latencies or [0.0]
+        print(f"{count:<10} {len(latencies) / duration:>11.0f} {statistics.median(samples):>9.1f} "
+              f"{percentile(samples, 0.99):>9.1f} {errors:>7}")
+
+
+def bench_persistence(count: int, log: int, writers: int, writes: int):
+    """Пропускная способность записи с журналом и время до первого запроса после запуска"""
+    requests = [event_details(event) for event in synthetic_events(writes)]
+    for mode in ('в памяти', 'с журналом'):
+        data_dir = tempfile.mkdtemp(prefix='calendar-bench-') if mode == 'с журналом' else None
+        with quiet():
+            servicer = CalendarServicer(open_store(data_dir), sample_data=False)
+            begin = time.perf_counter()
+            with futures.ThreadPoolExecutor(max_workers=writers) as pool:
+                created = sum(response.success for response in pool.map(servicer.create_event, requests))
+            elapsed = time.perf_counter() - begin
+            close_store(servicer.store)
+        print(f"Запись {mode:<11} {writes / elapsed:>10.0f} событий/с "
+              f"({writers} потоков, создано {created} из {writes})")
+        if data_dir:
+            shutil.rmtree(data_dir)
+
+    # Запуск: count событий в колоночном снимке и log изменений в журнале после него
+    data_dir = tempfile.mkdtemp(prefix='calendar-bench-')
+    begin = time.perf_counter()
+    write_snapshot(data_dir, count, ordered_records(count))
+    print(f"Снимок {count} событий записан за {time.perf_counter() - begin:.1f} с")
+    wal = WriteAheadLog(data_dir, count)
+    for revision, event in enumerate(ordered_records(log), count + 1):
+        event = event.replace(title='Изменено после снимка')
+        wal.append(revision, encode_change(revision, None, event))
+    wal.close()
+
+    with quiet():
+        begin = time.perf_counter()
+        store = open_store(data_dir)
+        server, target = start_server(CalendarServicer(store))
+        with grpc.insecure_channel(target) as channel:
+            stub = calendar_pb2_grpc.CalendarServiceStub(channel)
+            event = stub.GetEvent(calendar_pb2.EventRequest(event_id=f'bench_{count - 1:08d}'))
+            page = stub.ListEvents(calendar_pb2.EventsFilter(page_size=100))
+        elapsed = time.perf_counter() - begin
+        server.stop(0)
+        close_store(store)
+    assert event.event_id and len(page.events) == 100
+    print(f"Первый запрос после запуска ({len(store)} событий, из журнала {log}): {elapsed:.2f} с")
+    shutil.rmtree(data_dir)
+
+
+def latency(operation: Callable[[int], object], samples: int) -> str:
+    """Медиана и 99-й перцентиль задержки operation(номер попытки) в микросекундах"""
+    timings = []
+    for i in range(samples):
+        begin = time.perf_counter()
+        operation(i)
+        timings.append((time.perf_counter() - begin) * 1e6)
+    return f"{statistics.median(timings):>9.0f} {percentile(timings, 0.99):>9.0f}"
+
+
+def bench_storage(count: int, samples: int, writes: int):
+    """Сравнивает хранилища в памяти и SQLite на одном синтетическом календаре"""
+    rng = random.Random(count)
+    hours = max(1, count // EVENTS_PER_HOUR)
+    lookups = [f'bench_{rng.randrange(count):08d}' for _ in range(samples)]
+    windows = []
+    for _ in range(samples):
+        start = parse_timestamp((BASE_TIME + timedelta(hours=rng.randrange(hours))).isoformat())
+        windows.append((start, start + 3600 * 1_000_000,
+                        [f'user{rng.randrange(1000)}@company.com' for _ in range(3)]))
+    days = [parse_timestamp((BASE_TIME + timedelta(days=rng.randrange(max(1, hours // 24)))).isoformat())
+            for _ in range(samples)]
+    organizers = [f'user{rng.randrange(1000)}@company.com' for _ in range(samples)]
+    requests = [event_details(event) for event in synthetic_events(writes, seed=count)]
+
+    print(f"Событий: {count}, задержка в мкс (p50, p99)")
+    for storage in ('memory', 'sqlite'):
+        data_dir = tempfile.mkdtemp(prefix='calendar-bench-') if storage == 'sqlite' else None
+        store = open_store(data_dir, storage)
+        begin = time.perf_counter()
+        store.load(ordered_records(count), count)
+        loaded = time.perf_counter() - begin
+
+        print(f"{storage} (загрузка {loaded:.1f} с)")
+        print(f"  {'GetEvent':<30} {latency(lambda i: store.get(lookups[i]), samples)}")
+        print(f"  {'конфликты за час, 3 участника':<30} "
+              f"{latency(lambda i: store.find_conflicts(*windows[i]), samples)}")
+        print(f"  {'ListEvents за день, 100':<30} "
+              f"{latency(lambda i: list(islice(store.iter_query(days[i], days[i] + DAY), 100)), samples)}")
+        print(f"  {'ListEvents организатора, 100':<30} "
+              f"{latency(lambda i: list(islice(store.iter_query(organizer=organizers[i]), 100)), samples)}")
+
+        with quiet():
+            servicer = CalendarServicer(store, sample_data=False)
+            begin = time.perf_counter()
+            created = sum(servicer.create_event(request).success for request in requests)
+            elapsed = time.perf_counter() - begin
+        print(f"  {'CreateEvent, событий/с':<30} {writes / elapsed:>9.0f} (создано {created} из {writes})")
+        close_store(store)
+        if data_dir:
+            shutil.rmtree(data_dir)
+
+
+# Операции смешанной нагрузки, доли по умолчанию и перцентили отчета
+OPERATIONS = ('create', 'get', 'update', 'delete', 'list')
+DEFAULT_MIX = 'get=50,list=20,create=10,update=15,delete=5'
+PERCENTILES = (0.5, 0.95, 0.99, 0.999)
+CALL_TIMEOUT = 30.0
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Доли операций из строки вида 'get=50,list=20,create=10'"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"неизвестная операция {name!r}, доступны: {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"некорректная доля операции {name}: {weight!r}") from None
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("нужна хотя бы одна операция с положительной долей")
+    return mix
+
+
+class MixedWorkload:
+    """Смешанная нагрузка Create/Get/Update/Delete/List по синтетическому календарю.
+
+    ID существующих событий ведутся на стороне клиента: созданные
+    добавляются, удаленные убираются, поэтому Get, Update и Delete почти
+    всегда попадают в существующие события. Для каждой операции копятся
+    задержки успешных вызовов, ошибки gRPC и отказы сервиса (конфликт
+    расписания, событие не найдено).
+    """
+
+    def __init__(self, stubs: List[calendar_pb2_grpc.CalendarServiceStub], mix: Dict[str, float],
+                 events: int, attendee_pool: int, per_hour: int, seed: int = 1):
+        self.stubs = stubs
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.ids = [f'bench_{i:08d}' for i in range(events)]
+        self.hours = max(1, events // per_hour)
+        self.attendee_pool = attendee_pool
+        self.calls = 0
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.names}
+        self.errors = dict.fromkeys(self.names, 0)
+        self.rejected = dict.fromkeys(self.names, 0)
+
+    def next_operation(self) -> str:
+        return self.rng.choices(self.names, self.weights)[0]
+
+    def random_time(self) -> datetime:
+        return BASE_TIME + timedelta(hours=self.rng.randrange(self.hours), minutes=self.rng.randrange(0, 60, 15))
+
+    def random_id(self, remove: bool = False) -> str:
+        if not self.ids:
+            return 'bench_missing'
+        index = self.rng.randrange(len(self.ids))
+        event_id = self.ids[index]
+        if remove:
+            # Удаляемый ID больше не выбираем; порядок списка не важен
+            self.ids[index] = self.ids[-1]
+            self.ids.pop()
+        return event_id
+
+    def request(self, name: str):
+        """Метод заглушки и сообщение для очередной операции name"""
+        stub = self.stubs[self.calls % len(self.stubs)]
+        self.calls += 1
+        if name == 'get':
+            return stub.GetEvent, calendar_pb2.EventRequest(event_id=self.random_id())
+        if name == 'list':
+            day = self.random_time().date().isoformat()
+            return stub.ListEvents, calendar_pb2.EventsFilter(start_date=day, end_date=day, page_size=50)
+        if name == 'delete':
+            return stub.DeleteEvent, calendar_pb2.EventRequest(event_id=self.random_id(remove=True))
+        if name == 'update':
+            request = calendar_pb2.EventDetails(event_id=self.random_id(), title=f'Изменено {self.calls}')
+            request.update_mask.paths.append('title')
+            return stub.UpdateEvent, request
+        start = self.random_time()
+        return stub.CreateEvent, calendar_pb2.EventDetails(
+            title=f'Нагрузка {self.calls}',
+            start_time=start.isoformat(),
+            end_time=(start + timedelta(minutes=self.rng.choice((30, 60)))).isoformat(),
+            attendees=[f'user{self.rng.randrange(self.attendee_pool)}@company.com' for _ in range(3)],
+            organizer=f'user{self.rng.randrange(self.attendee_pool)}@company.com'
+        )
+
+    async def call(self, name: str, begin: float):
+        """Выполняет операцию name; задержка считается от begin - момента, когда вызов был запланирован"""
+        method, request = self.request(name)
+        try:
+            response = await method(request, timeout=CALL_TIMEOUT)
+        except grpc.aio.AioRpcError:
+            self.errors[name] += 1
+            return
+        self.latencies[name].append(time.perf_counter() - begin)
+        if name == 'get':
+            succeeded = response.status != 'not_found'
+        elif name == 'list':
+            succeeded = True
+        else:
+            succeeded = response.success
+        if not succeeded:
+            self.rejected[name] += 1
+        elif name == 'create':
+            self.ids.append(response.event.event_id)
+
+    async def closed_loop(self, concurrency: int, duration: float):
+        """concurrency клиентов, каждый шлет следующий запрос сразу после ответа"""
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            while time.perf_counter() < deadline:
+                await self.call(self.next_operation(), time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, duration: float):
+        """Запросы с постоянной частотой rate в секунду независимо от ответов.
+
+        Задержка считается от запланированного момента отправки, поэтому
+        отставание генератора или очередь на сервере попадают в задержку,
+        а не прячутся уменьшением частоты (coordinated omission).
+        """
+        start = time.perf_counter()
+        pending = set()
+        for index in range(int(rate * duration)):
+            scheduled = start + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self.call(self.next_operation(), scheduled))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        """Пропускная способность и перцентили задержки (мс) по операциям и по всем вместе"""
+        results = {}
+        groups = [(name, self.latencies[name], self.errors[name], self.rejected[name]) for name in self.names]
+        groups.append(('total', [latency for name in self.names for latency in self.latencies[name]],
+                       sum(self.errors.values()), sum(self.rejected.values())))
+        for name, latencies, errors, rejected in groups:
+            samples = sorted(latency * 1000 for latency in latencies) or [0.0]
+            result = {'count': len(latencies), 'throughput': len(latencies) / elapsed,
+                      'errors': errors, 'rejected': rejected}
+            for fraction in PERCENTILES:
+                result[percentile_name(fraction)] = samples[min(len(samples) - 1, int(len(samples) * fraction))]
+            results[name] = result
+        return results
+
+
+def percentile_name(fraction: float) -> str:
+    """0.5 -> 'p50', 0.999 -> 'p999'"""
+    return 'p' + f'{fraction * 100:g}'.replace('.', '')
+
+
+async def run_workload(target: str, workload_args: Dict, concurrency: int, rate: float,
+                       duration: float, warmup: float, channels: int) -> Dict[str, Dict[str, float]]:
+    """Прогревает сервер и подает смешанную нагрузку, возвращая отчет MixedWorkload.report"""
+    pool = [grpc.aio.insecure_channel(target) for _ in range(channels)]
+    stubs = [calendar_pb2_grpc.CalendarServiceStub(channel) for channel in pool]
+    workload = MixedWorkload(stubs, **workload_args)
+    if warmup > 0:
+        # Прогрев (соединения, кеши) в отчет не входит
+        await workload.closed_loop(concurrency, warmup)
+        workload.latencies = {name: [] for name in workload.names}
+        workload.errors = dict.fromkeys(workload.names, 0)
+        workload.rejected = dict.fromkeys(workload.names, 0)
+    begin = time.perf_counter()
+    if rate:
+        await workload.open_loop(rate, duration)
+    else:
+        await workload.closed_loop(concurrency, duration)
+    elapsed = time.perf_counter() - begin
+    for channel in pool:
+        await channel.close()
+    return workload.report(elapsed)
+
+
+def print_report(results: Dict[str, Dict[str, float]]):
+    columns = [percentile_name(fraction) for fraction in PERCENTILES]
+    print(f"{'операция':<9} {'вызовов':>8} {'в секунду':>10} "
+          + " ".join(f"{column + ', мс':>10}" for column in columns) + f" {'ошибок':>7} {'отказов':>8}")
+    for name, result in results.items():
+        print(f"{name:<9} {result['count']:>8} {result['throughput']:>10.0f} "
+              + " ".join(f"{result[column]:>10.2f}" for column in columns)
+              + f" {result['errors']:>7} {result['rejected']:>8}")
+
+
+def bench_mixed(args: argparse.Namespace):
+    """Смешанная нагрузка на сервер в этом же процессе или в отдельном.
+
+    Календарь из args.events событий загружается в хранилище до запуска
+    сервера: в своем процессе - напрямую, для отдельного процесса - через
+    колоночный снимок в каталоге данных (--data-dir), как при восстановлении.
+    """
+    workload_args = {'mix': args.mix, 'events': args.events, 'attendee_pool': args.attendees,
+                     'per_hour': args.per_hour, 'seed': args.seed}
+    records = ordered_records(args.events, args.attendees, args.per_hour)
+    mode = f"фиксированная частота {args.rate:g}/с" if args.rate else f"клиентов {args.concurrency}"
+    print(f"Событий: {args.events}, участников: {args.attendees}, событий в час: {args.per_hour}, "
+          f"{mode}, длительность: {args.duration} с")
+    print("Доли операций: " + ", ".join(f"{name} {weight:g}" for name, weight in args.mix.items()))
+
+    run = (args.concurrency, args.rate, args.duration, args.warmup, args.channels)
+    if args.server == 'inprocess':
+        store = InMemoryEventStore()
+        store.load(records, args.events)
+        with quiet():
+            server, port = create_server(store, 0, args.workers, sample_data=False)
+            results = asyncio.run(run_workload(f'127.0.0.1:{port}', workload_args, *run))
+            server.stop(0)
+    else:
+        data_dir = tempfile.mkdtemp(prefix='calendar-bench-')
+        try:
+            write_snapshot(data_dir, args.events, records)
+            with server_process('--data-dir', data_dir, *args.server_args.split()) as target:
+                results = asyncio.run(run_workload(target, workload_args, *run))
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': {key: value for key, value in vars(args).items() if key != 'output'},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+
+def bench_compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """Сравнивает два отчета bench_mixed; 1 - если есть регрессия больше threshold процентов"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline_report = json.load(f)
+    with open(current_path, encoding='utf-8') as f:
+        current_report = json.load(f)
+    baseline, current = baseline_report['results'], current_report['results']
+    differing = sorted(key for key, value in baseline_report['config'].items()
+                       if current_report['config'].get(key) != value)
+    if differing:
+        print(f"Внимание: прогоны с разными параметрами ({', '.join(differing)}), сравнение может быть некорректным")
+
+    # Для задержек рост - регрессия, для пропускной способности - падение
+    metrics = [('throughput', -1)] + [(percentile_name(fraction), 1) for fraction in PERCENTILES]
+    print(f"{'операция':<9} " + " ".join(f"{name:>18}" for name, _ in metrics))
+    regressions = []
+    for operation in baseline:
+        if operation not in current:
+            continue
+        cells = []
+        for metric, direction in metrics:
+            before, after = baseline[operation][metric], current[operation][metric]
+            change = (after - before) / before * 100 if before else 0.0
+            mark = ''
+            if change * direction > threshold:
+                mark = ' !'
+                regressions.append(f"{operation} {metric}: {before:.2f} -> {after:.2f} ({change:+.0f}%)")
+            cells.append(f"{f'{change:+.1f}%{mark}':>18}")
+        print(f"{operation:<9} " + " ".join(cells))
+
+    if regressions:
+        print(f"Регрессии больше {threshold:g}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"Регрессий больше {threshold:g}% нет")
+    return 0
+
+
+def sync_client_round(target: str, concurrency: int, duration: float, channels: int) -> List[float]:
+    """Задержки GetEvent синхронного клиента: concurrency потоков шлют запросы без пауз"""
+    request = calendar_pb2.EventRequest(event_id='event_001')
+    with ChannelPool(ChannelConfig(target=target, pool_size=channels)) as pool:
+        pool.wait_ready(30)
+        deadline = time.perf_counter() + duration
+
+        def caller() -> List[float]:
+            latencies = []
+            while (begin := time.perf_counter()) < deadline:
+                pool.stub().GetEvent(request)
+                latencies.append(time.perf_counter() - begin)
+            return latencies
+
+        with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            calls = [executor.submit(caller) for _ in range(concurrency)]
+            return [latency for call in calls for latency in call.result()]
+
+
+async def async_client_round(target: str, concurrency: int, duration: float, channels: int) -> List[float]:
+    """То же для AsyncCalendarClient: concurrency сопрограмм в одном потоке"""
+    async with AsyncCalendarClient(ChannelConfig(target=target, pool_size=channels)) as client:
+        await client.wait_ready(30)
+        deadline = time.perf_counter() + duration
+
+        async def caller() -> List[float]:
+            latencies = []
+            while (begin := time.perf_counter()) < deadline:
+                await client.get_event('event_001')
+                latencies.append(time.perf_counter() - begin)
+            return latencies
+
+        rounds = await asyncio.gather(*(caller() for _ in range(concurrency)))
+        return [latency for latencies in rounds for latency in latencies]
+
+
+async def async_gather(target: str, event_ids: List[str], concurrency: int) -> float:
+    async with AsyncCalendarClient(ChannelConfig(target=target)) as client:
+        await client.wait_ready(30)
+        begin = time.perf_counter()
+        await client.gather_events(event_ids, concurrency)
+        return time.perf_counter() - begin
+
+
+def bench_clients(concurrency: List[int], duration: float, channels: int, gather: int):
+    """Синхронный клиент в потоках против AsyncCalendarClient на одном сервере"""
+    print(f"Длительность: {duration} с, каналов: {channels}")
+    print(f"{'клиент':<8} {'вызовов':>8} {'запросов/с':>11} {'p50, мс':>9} {'p99, мс':>9}")
+    with server_process() as target:
+        for count in concurrency:
+            for name, latencies in (
+                ('sync', lambda: sync_client_round(target, count, duration, channels)),
+                ('async', lambda: asyncio.run(async_client_round(target, count, duration, channels))),
+            ):
+                samples = [latency * 1000 for latency in latencies()] or [0.0]
+                print(f"{name:<8} {count:>8} {len(samples) / duration:>11.0f} {statistics.median(samples):>9.2f} "
+                      f"{percentile(samples, 0.99):>9.2f}")
+
+        # Загрузка списка событий по ID: по одному, потоками и через gather_events
+        event_ids = ['event_001', 'event_002'] * (gather // 2)
+        request = calendar_pb2.EventRequest
+        with ChannelPool(ChannelConfig(target=target)) as pool:
+            pool.wait_ready(30)
+            begin = time.perf_counter()
+            for event_id in event_ids:
+                pool.stub().GetEvent(request(event_id=event_id))
+            sequential = time.perf_counter() - begin
+            with futures.ThreadPoolExecutor(max_workers=64) as executor:
+                begin = time.perf_counter()
+                list(executor.map(lambda event_id: pool.stub().GetEvent(request(event_id=event_id)), event_ids))
+                threaded = time.perf_counter() - begin
+        gathered = asyncio.run(async_gather(target, event_ids, 64))
+    print(f"\nЗагрузка {len(event_ids)} событий по ID:")
+    print(f"  по одному:              {sequential * 1000:>8.0f} мс")
+    print(f"  64 потока:              {threaded * 1000:>8.0f} мс")
+    print(f"  gather_events(64):      {gathered * 1000:>8.0f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки сервиса календаря")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    conflicts = subparsers.add_parser('conflicts', help="задержка проверки конфликтов")
+    conflicts.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    conflicts.add_argument('--queries', type=int, default=2000)
+
+    records = subparsers.add_parser('records', help="память и задержка формата хранения событий")
+    records.add_argument('--count', type=int, default=200_000)
+
+    batch = subparsers.add_parser('batch', help="импорт циклом CreateEvent против BatchCreateEvents")
+    batch.add_argument('--count', type=int, default=10_000)
+    batch.add_argument('--batch-size', type=int, default=1000)
+
+    bulk = subparsers.add_parser('bulk', help="пакетная проверка конфликтов на NumPy")
+    bulk.add_argument('--count', type=int, default=200_000)
+    bulk.add_argument('--batch-size', type=int, default=2000)
+
+    freebusy = subparsers.add_parser('freebusy', help="задержка GetFreeBusy и FindSlots")
+    freebusy.add_argument('--attendees', type=int, default=100)
+    freebusy.add_argument('--events', type=int, default=2000)
+    freebusy.add_argument('--samples', type=int, default=200)
+
+    recurring = subparsers.add_parser('recurring', help="повторяющиеся события: серии против отдельных записей")
+    recurring.add_argument('--series', type=int, default=200)
+    recurring.add_argument('--days', type=int, default=365)
+    recurring.add_argument('--samples', type=int, default=500)
+
+    cache = subparsers.add_parser('cache', help="горячие GetEvent и ListEvents с кешем ответов и без него")
+    cache.add_argument('--count', type=int, default=200_000)
+    cache.add_argument('--hot', type=int, default=20)
+    cache.add_argument('--samples', type=int, default=2000)
+
+    watch = subparsers.add_parser('watch', help="запись и доставка изменений подписчикам WatchEvents")
+    watch.add_argument('--watchers', type=int, nargs='+', default=[0, 100, 1000])
+    watch.add_argument('--writes', type=int, default=200)
+    watch.add_argument('--channels', type=int, default=16)
+
+    load = subparsers.add_parser('load', help="нагрузочный тест: пул потоков против grpc.aio")
+    load.add_argument('--clients', type=int, default=1000)
+    load.add_argument('--duration', type=float, default=10.0)
+    load.add_argument('--channels', type=int, default=16)
+    load.add_argument('--workers', type=int, default=10)
+
+    scale = subparsers.add_parser('scale', help="масштабирование чтений по числу процессов сервера")
+    scale.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    scale.add_argument('--client-processes', type=int, default=8)
+    scale.add_argument('--clients', type=int, default=50)
+    scale.add_argument('--duration', type=float, default=10.0)
+
+    persistence = subparsers.add_parser('persistence', help="запись с журналом и восстановление")
+    persistence.add_argument('--count', type=int, default=1_000_000)
+    persistence.add_argument('--log', type=int, default=10_000)
+    persistence.add_argument('--writers', type=int, default=16)
+    persistence.add_argument('--writes', type=int, default=20_000)
+
+    storage = subparsers.add_parser('storage', help="хранилище в памяти против SQLite")
+    storage.add_argument('--count', type=int, default=200_000)
+    storage.add_argument('--samples', type=int, default=2000)
+    storage.add_argument('--writes', type=int, default=2000)
+
+    mixed = subparsers.add_parser('mixed', help="смешанная нагрузка Create/Get/Update/Delete/List с перцентилями")
+    mixed.add_argument('--events', type=int, default=100_000, help="событий в календаре до начала нагрузки")
+    mixed.add_argument('--attendees', type=int, default=1000, help="размер пула участников")
+    mixed.add_argument('--per-hour', type=int, default=EVENTS_PER_HOUR,
+                       help="событий в час: вместе с --attendees задает плотность пересечений")
+    mixed.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help="доли операций")
+    mixed.add_argument('--concurrency', type=int, default=50, help="одновременных клиентов (замкнутая нагрузка)")
+    mixed.add_argument('--rate', type=float, default=0.0,
+                       help="запросов в секунду (открытая нагрузка вместо --concurrency)")
+    mixed.add_argument('--duration', type=float, default=10.0)
+    mixed.add_argument('--warmup', type=float, default=2.0)
+    mixed.add_argument('--channels', type=int, default=4)
+    mixed.add_argument('--seed', type=int, default=1)
+    mixed.add_argument('--server', choices=('inprocess', 'subprocess'), default='inprocess',
+                       help="сервер в этом процессе (пул потоков) или отдельным процессом server.py")
+    mixed.add_argument('--workers', type=int, default=10, help="потоков сервера в этом процессе")
+    mixed.add_argument('--server-args', default='',
+                       help="аргументы server.py для отдельного процесса, например --server-args=\"--async\"")
+    mixed.add_argument('--output', help="сохранить результаты в JSON для сравнения")
+
+    clients = subparsers.add_parser('clients', help="синхронный клиент против AsyncCalendarClient")
+    clients.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64], help="одновременных вызовов")
+    clients.add_argument('--duration', type=float, default=5.0)
+    clients.add_argument('--channels', type=int, default=1)
+    clients.add_argument('--gather', type=int, default=2000, help="событий для загрузки по ID")
+
+    compare = subparsers.add_parser('compare', help="сравнить два отчета mixed и найти регрессии")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=10.0, help="допустимое ухудшение, %%")
+
+    args = parser.parse_args()
+    if args.command == 'conflicts':
+        bench_conflicts(args.sizes, args.queries)
+    elif args.command == 'records':
+        bench_records(args.count)
+    elif args.command == 'batch':
+        bench_batch(args.count, args.batch_size)
+    elif args.command == 'bulk':
+        bench_bulk(args.count, args.batch_size)
+    elif args.command == 'freebusy':
+        bench_freebusy(args.attendees, args.events, args.samples)
+    elif args.command == 'recurring':
+        bench_recurring(args.series, args.days, args.samples)
+    elif args.command == 'cache':
+        bench_cache(args.count, args.hot, args.samples)
+    elif args.command == 'watch':
+        bench_watch(args.watchers, args.writes, args.channels)
+    elif args.command == 'load':
+        bench_load(args.clients, args.duration, args.channels, args.workers)
+    elif args.command == 'scale':
+        bench_scale(args.processes, args.client_processes, args.clients, args.duration)
+    elif args.command == 'persistence':
+        bench_persistence(args.count, args.log, args.writers, args.writes)
+    elif args.command == 'storage':
+        bench_storage(args.count, args.samples, args.writes)
+    elif args.command == 'mixed':
+        bench_mixed(args)
+    elif args.command == 'clients':
+        bench_clients(args.concurrency, args.duration, args.channels, args.gather)
+    elif args.command == 'compare':
+        sys.exit(bench_compare(args.baseline, args.current, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
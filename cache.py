@@ -0,0 +1,198 @@
+"""Кеш сериализованных ответов GetEvent и ListEvents.
+
+Сборка EventDetails из записи идет поле за полем в Python, а популярные
+события (общие собрания) запрашиваются тысячи раз в минуту. ResponseCache
+хранит уже сериализованные байты ответов: для GetEvent - по ID события,
+для ListEvents - по нормализованному фильтру (границы окна после разбора
+дат, организатор, статус, позиция токена страницы и размер страницы).
+Такие байты сервер отдает без создания сообщений (см. server.add_servicer).
+
+Кеш подписывается на изменения хранилища (EventStore.add_listener), поэтому
+запись, сделанная любым путем - CreateEvent, UpdateEvent, DeleteEvent,
+пакетными методами, импортом или репликацией, - вытесняет ровно ответ
+измененного события и списки, в фильтр которых попадает его старая или
+новая версия. Ответ, собранный по данным, которые успели измениться, пока
+он сериализовался, в кеш не попадает: перед чтением хранилища запоминается
+номер последнего изменения, и при расхождении ответ не сохраняется.
+
+Размер кеша ограничен числом записей и суммарным размером байтов (сначала
+вытесняются давно не использованные), а каждая запись живет не дольше ttl
+секунд: списки без конца окна раскрывают бесконечные серии от текущего
+времени и со временем устаревают без изменений хранилища.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from records import EventRecord
+
+
+# Ограничения кеша по умолчанию
+DEFAULT_MAX_EVENTS = 100_000
+DEFAULT_MAX_LISTS = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 60.0
+
+# Нормализованный фильтр ListEvents: (начало, конец, организатор, статус, позиция токена, размер страницы)
+ListKey = Tuple[Optional[int], Optional[int], str, str, Optional[Tuple[int, str]], int]
+
+V = TypeVar('V')
+
+
+class LRUCache(Generic[V]):
+    """Потокобезопасный LRU-кеш с ограничением по числу записей, размеру и времени жизни.
+
+    Размер записи передается в put явно. max_entries=0 отключает кеш.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: 'OrderedDict[Hashable, Tuple[V, int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V, size: int):
+        with self._lock:
+            self._put(key, value, size)
+
+    def _put(self, key: Hashable, value: V, size: int):
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes or not self.max_entries:
+            return
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.size += size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def _invalidate(self, key: Hashable):
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий, промахов и вытеснений и текущий размер"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def list_matches(key: ListKey, event: EventRecord) -> bool:
+    """Может ли событие попасть в выдачу списка key.
+
+    Для серий окно и позицию страницы не проверяем: вхождения раскрываются
+    от начала серии, и серия вытесняет все списки своего организатора
+    и статуса. Лишнее вытеснение безопасно, пропущенное - нет.
+    """
+    lower, upper, organizer, status, after, _ = key
+    if organizer and event.organizer != organizer:
+        return False
+    if status and event.status != status:
+        return False
+    if event.recurrence is not None:
+        return True
+    if lower is not None and event.local_start < lower:
+        return False
+    if upper is not None and event.local_start >= upper:
+        return False
+    if after is not None and (event.local_start, event.event_id) <= after:
+        return False
+    return True
+
+
+class ResponseCache:
+    """Сериализованные ответы GetEvent (по ID) и ListEvents (по фильтру).
+
+    invalidate подписывается на изменения хранилища. Чтение с заполнением:
+    revision = cache.revision; прочитать хранилище; cache.put_*(..., revision).
+    """
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS, max_lists: int = DEFAULT_MAX_LISTS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        self.events: LRUCache[Tuple[bytes, int]] = LRUCache(max_events, max_bytes, ttl)
+        self.lists: LRUCache[Tuple[bytes, int, str]] = LRUCache(max_lists, max_bytes, ttl)
+        # Ревизия последнего изменения хранилища, увиденного кешем
+        self.revision = 0
+
+    def get_event(self, event_id: str) -> Optional[Tuple[bytes, int]]:
+        """Ответ GetEvent и версия события"""
+        return self.events.get(event_id)
+
+    def put_event(self, event_id: str, data: bytes, version: int, revision: int):
+        """Сохраняет ответ GetEvent, если с ревизии revision хранилище не менялось"""
+        with self.events._lock:
+            if revision == self.revision:
+                self.events._put(event_id, (data, version), len(data))
+
+    def get_list(self, key: ListKey) -> Optional[Tuple[bytes, int, str]]:
+        """Ответ ListEvents, число событий в нем и etag страницы"""
+        return self.lists.get(key)
+
+    def put_list(self, key: ListKey, data: bytes, count: int, etag: str, revision: int):
+        with self.lists._lock:
+            if revision == self.revision:
+                self.lists._put(key, (data, count, etag), len(data))
+
+    def invalidate(self, revision: int, current: Optional[EventRecord], event: Optional[EventRecord]):
+        """Подписчик EventStore.add_listener: вытесняет ответы, которые изменение могло затронуть"""
+        changed = [record for record in (current, event) if record is not None]
+        with self.events._lock:
+            self.revision = revision
+            for record in changed:
+                self.events._invalidate(record.event_id)
+        with self.lists._lock:
+            stale = [key for key in self.lists._entries
+                     if any(list_matches(key, record) for record in changed)]
+            for key in stale:
+                self.lists._invalidate(key)
+
+    def clear(self):
+        """Очищает кеш (после load и clear хранилища, которые подписчиков не уведомляют)"""
+        self.events.clear()
+        self.lists.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {'events': self.events.stats(), 'lists': self.lists.stats()}
@@ -22,25 +22,58 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0e\x63\x61lendar.proto\x12\x08\x63\x61lendar\"\xda\x01\n\x0c\x45ventDetails\x12\x10\n\x08\x65vent_id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x12\n\nstart_time\x18\x04 \x01(\t\x12\x10\n\x08\x65nd_time\x18\x05 \x01(\t\x12\x10\n\x08location\x18\x06 \x01(\t\x12\x11\n\tattendees\x18\x07 \x03(\t\x12\x11\n\torganizer\x18\x08 \x01(\t\x12\x0e\n\x06status\x18\t \x01(\t\x12\x12\n\ncreated_at\x18\n \x01(\t\x12\x12\n\nupdated_at\x18\x0b \x01(\t\" \n\x0c\x45ventRequest\x12\x10\n\x08\x65vent_id\x18\x01 \x01(\t\"X\n\rEventResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12%\n\x05\x65vent\x18\x03 \x01(\x0b\x32\x16.calendar.EventDetails\"W\n\x0c\x45ventsFilter\x12\x12\n\nstart_date\x18\x01 \x01(\t\x12\x10\n\x08\x65nd_date\x18\x02 \x01(\t\x12\x11\n\torganizer\x18\x03 \x01(\t\x12\x0e\n\x06status\x18\x04 \x01(\t\"H\n\tEventList\x12&\n\x06\x65vents\x18\x01 \x03(\x0b\x32\x16.calendar.EventDetails\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x32\xc8\x02\n\x0f\x43\x61lendarService\x12>\n\x0b\x43reateEvent\x12\x16.calendar.EventDetails\x1a\x17.calendar.EventResponse\x12:\n\x08GetEvent\x12\x16.calendar.EventRequest\x1a\x16.calendar.EventDetails\x12>\n\x0bUpdateEvent\x12\x16.calendar.EventDetails\x1a\x17.calendar.EventResponse\x12>\n\x0b\x44\x65leteEvent\x12\x16.calendar.EventRequest\x1a\x17.calendar.EventResponse\x12\x39\n\nListEvents\x12\x16.calendar.EventsFilter\x1a\x13.calendar.EventListb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0e\x63\x61lendar.proto\x12\x08\x63\x61lendar\x1a google/protobuf/field_mask.proto\"\xc6\x02\n\x0c\x45ventDetails\x12\x10\n\x08\x65vent_id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x12\n\nstart_time\x18\x04 \x01(\t\x12\x10\n\x08\x65nd_time\x18\x05 \x01(\t\x12\x10\n\x08location\x18\x06 \x01(\t\x12\x11\n\tattendees\x18\x07 \x03(\t\x12\x11\n\torganizer\x18\x08 \x01(\t\x12\x0e\n\x06status\x18\t \x01(\t\x12\x12\n\ncreated_at\x18\n \x01(\t\x12\x12\n\nupdated_at\x18\x0b \x01(\t\x12(\n\nrecurrence\x18\x0c \x01(\x0b\x32\x14.calendar.Recurrence\x12\x0f\n\x07version\x18\r \x01(\x03\x12/\n\x0bupdate_mask\x18\x0e \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"u\n\nRecurrence\x12\x11\n\tfrequency\x18\x01 \x01(\t\x12\x10\n\x08interval\x18\x02 \x01(\x05\x12\r\n\x05\x63ount\x18\x03 \x01(\x05\x12\r\n\x05until\x18\x04 \x01(\t\x12\x10\n\x08weekdays\x18\x05 \x03(\x05\x12\x12\n\nexceptions\x18\x06 \x03(\t\"I\n\x0c\x45ventRequest\x12\x10\n\x08\x65vent_id\x18\x01 \x01(\t\x12\x10\n\x08if_match\x18\x02 \x01(\x03\x12\x15\n\rif_none_match\x18\x03 \x01(\x03\"X\n\rEventResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12%\n\x05\x65vent\x18\x03 \x01(\x0b\x32\x16.calendar.EventDetails\"\x95\x01\n\x0c\x45ventsFilter\x12\x12\n\nstart_date\x18\x01 \x01(\t\x12\x10\n\x08\x65nd_date\x18\x02 \x01(\t\x12\x11\n\torganizer\x18\x03 \x01(\t\x12\x0e\n\x06status\x18\x04 \x01(\t\x12\x11\n\tpage_size\x18\x05 \x01(\x05\x12\x12\n\npage_token\x18\x06 \x01(\t\x12\x15\n\rif_none_match\x18\x07 \x01(\t\"\x85\x01\n\tEventList\x12&\n\x06\x65vents\x18\x01 \x03(\x0b\x32\x16.calendar.EventDetails\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x12\x17\n\x0fnext_page_token\x18\x03 \x01(\t\x12\x0c\n\x04\x65tag\x18\x04 \x01(\t\x12\x14\n\x0cnot_modified\x18\x05 \x01(\x08\"<\n\x12\x42\x61tchCreateRequest\x12&\n\x06\x65vents\x18\x01 \x03(\x0b\x32\x16.calendar.EventDetails\"&\n\x11\x42\x61tchEventRequest\x12\x11\n\tevent_ids\x18\x01 \x03(\t\"U\n\x12\x42\x61tchEventResponse\x12(\n\x07results\x18\x01 \x03(\x0b\x32\x17.calendar.EventResponse\x12\x15\n\rsuccess_count\x18\x02 \x01(\x05\"<\n\x0bImportError\x12\r\n\x05index\x18\x01 \x01(\x05\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t\"j\n\x0cImportResult\x12\x11\n\tprocessed\x18\x01 \x01(\x05\x12\x10\n\x08imported\x18\x02 \x01(\x05\x12\x0e\n\x06\x66\x61iled\x18\x03 \x01(\x05\x12%\n\x06\x65rrors\x18\x04 \x03(\x0b\x32\x15.calendar.ImportError\"4\n\x0cTimeInterval\x12\x12\n\nstart_time\x18\x01 \x01(\t\x12\x10\n\x08\x65nd_time\x18\x02 \x01(\t\"J\n\x0f\x46reeBusyRequest\x12\x11\n\tattendees\x18\x01 \x03(\t\x12\x12\n\nstart_time\x18\x02 \x01(\t\x12\x10\n\x08\x65nd_time\x18\x03 \x01(\t\"F\n\x0c\x41ttendeeBusy\x12\x10\n\x08\x61ttendee\x18\x01 \x01(\t\x12$\n\x04\x62usy\x18\x02 \x03(\x0b\x32\x16.calendar.TimeInterval\"c\n\x10\x46reeBusyResponse\x12)\n\tattendees\x18\x01 \x03(\x0b\x32\x16.calendar.AttendeeBusy\x12$\n\x04\x62usy\x18\x02 \x03(\x0b\x32\x16.calendar.TimeInterval\"\x95\x01\n\x10\x46indSlotsRequest\x12\x11\n\tattendees\x18\x01 \x03(\t\x12\x18\n\x10\x64uration_minutes\x18\x02 \x01(\x05\x12\x12\n\nstart_time\x18\x03 \x01(\t\x12\x10\n\x08\x65nd_time\x18\x04 \x01(\t\x12\x1b\n\x13granularity_minutes\x18\x05 \x01(\x05\x12\x11\n\tmax_slots\x18\x06 \x01(\x05\":\n\x11\x46indSlotsResponse\x12%\n\x05slots\x18\x01 \x03(\x0b\x32\x16.calendar.TimeInterval\"N\n\x0cWatchRequest\x12&\n\x06\x66ilter\x18\x01 \x01(\x0b\x32\x16.calendar.EventsFilter\x12\x16\n\x0esince_revision\x18\x02 \x01(\x03\"T\n\x0b\x45ventChange\x12\x10\n\x08revision\x18\x01 \x01(\x03\x12\x0c\n\x04type\x18\x02 \x01(\t\x12%\n\x05\x65vent\x18\x03 \x01(\x0b\x32\x16.calendar.EventDetails\"0\n\x0bSyncRequest\x12\x12\n\nsync_token\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\x05\"m\n\x0cSyncResponse\x12\x13\n\x0b\x63hanged_ids\x18\x01 \x03(\t\x12\x13\n\x0b\x64\x65leted_ids\x18\x02 \x03(\t\x12\x12\n\nsync_token\x18\x03 \x01(\t\x12\x10\n\x08has_more\x18\x04 \x01(\x08\x12\r\n\x05reset\x18\x05 \x01(\x08\x32\xbc\x07\n\x0f\x43\x61lendarService\x12>\n\x0b\x43reateEvent\x12\x16.calendar.EventDetails\x1a\x17.calendar.EventResponse\x12:\n\x08GetEvent\x12\x16.calendar.EventRequest\x1a\x16.calendar.EventDetails\x12>\n\x0bUpdateEvent\x12\x16.calendar.EventDetails\x1a\x17.calendar.EventResponse\x12>\n\x0b\x44\x65leteEvent\x12\x16.calendar.EventRequest\x1a\x17.calendar.EventResponse\x12\x39\n\nListEvents\x12\x16.calendar.EventsFilter\x1a\x13.calendar.EventList\x12@\n\x0cStreamEvents\x12\x16.calendar.EventsFilter\x1a\x16.calendar.EventDetails0\x01\x12O\n\x11\x42\x61tchCreateEvents\x12\x1c.calendar.BatchCreateRequest\x1a\x1c.calendar.BatchEventResponse\x12\x42\n\x0e\x42\x61tchGetEvents\x12\x1b.calendar.BatchEventRequest\x1a\x13.calendar.EventList\x12N\n\x11\x42\x61tchDeleteEvents\x12\x1b.calendar.BatchEventRequest\x1a\x1c.calendar.BatchEventResponse\x12\x42\n\x0cImportEvents\x12\x16.calendar.EventDetails\x1a\x16.calendar.ImportResult(\x01\x30\x01\x12\x44\n\x0bGetFreeBusy\x12\x19.calendar.FreeBusyRequest\x1a\x1a.calendar.FreeBusyResponse\x12\x44\n\tFindSlots\x12\x1a.calendar.FindSlotsRequest\x1a\x1b.calendar.FindSlotsResponse\x12>\n\x0bWatchEvents\x12\x16.calendar.WatchRequest\x1a\x15.calendar.EventChange0\x01\x12;\n\nSyncEvents\x12\x15.calendar.SyncRequest\x1a\x16.calendar.SyncResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'calendar_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_EVENTDETAILS']._serialized_start=29
-  _globals['_EVENTDETAILS']._serialized_end=247
-  _globals['_EVENTREQUEST']._serialized_start=249
-  _globals['_EVENTREQUEST']._serialized_end=281
-  _globals['_EVENTRESPONSE']._serialized_start=283
-  _globals['_EVENTRESPONSE']._serialized_end=371
-  _globals['_EVENTSFILTER']._serialized_start=373
-  _globals['_EVENTSFILTER']._serialized_end=460
-  _globals['_EVENTLIST']._serialized_start=462
-  _globals['_EVENTLIST']._serialized_end=534
-  _globals['_CALENDARSERVICE']._serialized_start=537
-  _globals['_CALENDARSERVICE']._serialized_end=865
+  _globals['_EVENTDETAILS']._serialized_start=63
+  _globals['_EVENTDETAILS']._serialized_end=389
+  _globals['_RECURRENCE']._serialized_start=391
+  _globals['_RECURRENCE']._serialized_end=508
+  _globals['_EVENTREQUEST']._serialized_start=510
+  _globals['_EVENTREQUEST']._serialized_end=583
+  _globals['_EVENTRESPONSE']._serialized_start=585
+  _globals['_EVENTRESPONSE']._serialized_end=673
+  _globals['_EVENTSFILTER']._serialized_start=676
+  _globals['_EVENTSFILTER']._serialized_end=825
+  _globals['_EVENTLIST']._serialized_start=828
+  _globals['_EVENTLIST']._serialized_end=961
+  _globals['_BATCHCREATEREQUEST']._serialized_start=963
+  _globals['_BATCHCREATEREQUEST']._serialized_end=1023
+  _globals['_BATCHEVENTREQUEST']._serialized_start=1025
+  _globals['_BATCHEVENTREQUEST']._serialized_end=1063
+  _globals['_BATCHEVENTRESPONSE']._serialized_start=1065
+  _globals['_BATCHEVENTRESPONSE']._serialized_end=1150
+  _globals['_IMPORTERROR']._serialized_start=1152
+  _globals['_IMPORTERROR']._serialized_end=1212
+  _globals['_IMPORTRESULT']._serialized_start=1214
+  _globals['_IMPORTRESULT']._serialized_end=1320
+  _globals['_TIMEINTERVAL']._serialized_start=1322
+  _globals['_TIMEINTERVAL']._serialized_end=1374
+  _globals['_FREEBUSYREQUEST']._serialized_start=1376
+  _globals['_FREEBUSYREQUEST']._serialized_end=1450
+  _globals['_ATTENDEEBUSY']._serialized_start=1452
+  _globals['_ATTENDEEBUSY']._serialized_end=1522
+  _globals['_FREEBUSYRESPONSE']._serialized_start=1524
+  _globals['_FREEBUSYRESPONSE']._serialized_end=1623
+  _globals['_FINDSLOTSREQUEST']._serialized_start=1626
+  _globals['_FINDSLOTSREQUEST']._serialized_end=1775
+  _globals['_FINDSLOTSRESPONSE']._serialized_start=1777
+  _globals['_FINDSLOTSRESPONSE']._serialized_end=1835
+  _globals['_WATCHREQUEST']._serialized_start=1837
+  _globals['_WATCHREQUEST']._serialized_end=1915
+  _globals['_EVENTCHANGE']._serialized_start=1917
+  _globals['_EVENTCHANGE']._serialized_end=2001
+  _globals['_SYNCREQUEST']._serialized_start=2003
+  _globals['_SYNCREQUEST']._serialized_end=2051
+  _globals['_SYNCRESPONSE']._serialized_start=2053
+  _globals['_SYNCRESPONSE']._serialized_end=2162
+  _globals['_CALENDARSERVICE']._serialized_start=2165
+  _globals['_CALENDARSERVICE']._serialized_end=3121
 # @@protoc_insertion_point(module_scope)
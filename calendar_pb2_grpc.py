@@ -26,7 +26,8 @@ if _version_not_supported:
 
 
 class CalendarServiceStub(object):
-    """Missing associated documentation comment in .proto file."""
+    """Сервис для занесения новых событий в календарь
+    """
 
     def __init__(self, channel):
         """Constructor.
@@ -59,37 +60,151 @@ class CalendarServiceStub(object):
                 request_serializer=calendar__pb2.EventsFilter.SerializeToString,
                 response_deserializer=calendar__pb2.EventList.FromString,
                 _registered_method=True)
+        self.StreamEvents = channel.unary_stream(
+                '/calendar.CalendarService/StreamEvents',
+                request_serializer=calendar__pb2.EventsFilter.SerializeToString,
+                response_deserializer=calendar__pb2.EventDetails.FromString,
+                _registered_method=True)
+        self.BatchCreateEvents = channel.unary_unary(
+                '/calendar.CalendarService/BatchCreateEvents',
+                request_serializer=calendar__pb2.BatchCreateRequest.SerializeToString,
+                response_deserializer=calendar__pb2.BatchEventResponse.FromString,
+                _registered_method=True)
+        self.BatchGetEvents = channel.unary_unary(
+                '/calendar.CalendarService/BatchGetEvents',
+                request_serializer=calendar__pb2.BatchEventRequest.SerializeToString,
+                response_deserializer=calendar__pb2.EventList.FromString,
+                _registered_method=True)
+        self.BatchDeleteEvents = channel.unary_unary(
+                '/calendar.CalendarService/BatchDeleteEvents',
+                request_serializer=calendar__pb2.BatchEventRequest.SerializeToString,
+                response_deserializer=calendar__pb2.BatchEventResponse.FromString,
+                _registered_method=True)
+        self.ImportEvents = channel.stream_stream(
+                '/calendar.CalendarService/ImportEvents',
+                request_serializer=calendar__pb2.EventDetails.SerializeToString,
+                response_deserializer=calendar__pb2.ImportResult.FromString,
+                _registered_method=True)
+        self.GetFreeBusy = channel.unary_unary(
+                '/calendar.CalendarService/GetFreeBusy',
+                request_serializer=calendar__pb2.FreeBusyRequest.SerializeToString,
+                response_deserializer=calendar__pb2.FreeBusyResponse.FromString,
+                _registered_method=True)
+        self.FindSlots = channel.unary_unary(
+                '/calendar.CalendarService/FindSlots',
+                request_serializer=calendar__pb2.FindSlotsRequest.SerializeToString,
+                response_deserializer=calendar__pb2.FindSlotsResponse.FromString,
+                _registered_method=True)
+        self.WatchEvents = channel.unary_stream(
+                '/calendar.CalendarService/WatchEvents',
+                request_serializer=calendar__pb2.WatchRequest.SerializeToString,
+                response_deserializer=calendar__pb2.EventChange.FromString,
+                _registered_method=True)
+        self.SyncEvents = channel.unary_unary(
+                '/calendar.CalendarService/SyncEvents',
+                request_serializer=calendar__pb2.SyncRequest.SerializeToString,
+                response_deserializer=calendar__pb2.SyncResponse.FromString,
+                _registered_method=True)
 
 
 class CalendarServiceServicer(object):
-    """Missing associated documentation comment in .proto file."""
+    """Сервис для занесения новых событий в календарь
+    """
 
     def CreateEvent(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """RPC метод для создания нового события
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
     def GetEvent(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """RPC метод для получения информации о событии по его ID
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
     def UpdateEvent(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """RPC метод для обновления существующего события
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
     def DeleteEvent(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """RPC метод для удаления события по его ID
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
     def ListEvents(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """RPC метод для получения списка всех событий
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamEvents(self, request, context):
+        """RPC метод для потоковой выдачи событий по фильтру в порядке времени начала
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchCreateEvents(self, request, context):
+        """RPC метод для пакетного создания событий с проверкой конфликтов внутри пакета
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetEvents(self, request, context):
+        """RPC метод для получения нескольких событий по их ID
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchDeleteEvents(self, request, context):
+        """RPC метод для удаления нескольких событий по их ID
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ImportEvents(self, request_iterator, context):
+        """RPC метод для потокового импорта событий с подтверждением прогресса
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetFreeBusy(self, request, context):
+        """RPC метод для получения занятого времени участников в заданном окне
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FindSlots(self, request, context):
+        """RPC метод для поиска времени, когда все участники свободны
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchEvents(self, request, context):
+        """RPC метод для подписки на изменения событий по фильтру
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SyncEvents(self, request, context):
+        """RPC метод для получения изменений событий после токена синхронизации
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
@@ -122,6 +237,51 @@ def add_CalendarServiceServicer_to_server(servicer, server):
                     request_deserializer=calendar__pb2.EventsFilter.FromString,
                     response_serializer=calendar__pb2.EventList.SerializeToString,
             ),
+            'StreamEvents': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamEvents,
+                    request_deserializer=calendar__pb2.EventsFilter.FromString,
+                    response_serializer=calendar__pb2.EventDetails.SerializeToString,
+            ),
+            'BatchCreateEvents': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchCreateEvents,
+                    request_deserializer=calendar__pb2.BatchCreateRequest.FromString,
+                    response_serializer=calendar__pb2.BatchEventResponse.SerializeToString,
+            ),
+            'BatchGetEvents': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetEvents,
+                    request_deserializer=calendar__pb2.BatchEventRequest.FromString,
+                    response_serializer=calendar__pb2.EventList.SerializeToString,
+            ),
+            'BatchDeleteEvents': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchDeleteEvents,
+                    request_deserializer=calendar__pb2.BatchEventRequest.FromString,
+                    response_serializer=calendar__pb2.BatchEventResponse.SerializeToString,
+            ),
+            'ImportEvents': grpc.stream_stream_rpc_method_handler(
+                    servicer.ImportEvents,
+                    request_deserializer=calendar__pb2.EventDetails.FromString,
+                    response_serializer=calendar__pb2.ImportResult.SerializeToString,
+            ),
+            'GetFreeBusy': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetFreeBusy,
+                    request_deserializer=calendar__pb2.FreeBusyRequest.FromString,
+                    response_serializer=calendar__pb2.FreeBusyResponse.SerializeToString,
+            ),
+            'FindSlots': grpc.unary_unary_rpc_method_handler(
+                    servicer.FindSlots,
+                    request_deserializer=calendar__pb2.FindSlotsRequest.FromString,
+                    response_serializer=calendar__pb2.FindSlotsResponse.SerializeToString,
+            ),
+            'WatchEvents': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchEvents,
+                    request_deserializer=calendar__pb2.WatchRequest.FromString,
+                    response_serializer=calendar__pb2.EventChange.SerializeToString,
+            ),
+            'SyncEvents': grpc.unary_unary_rpc_method_handler(
+                    servicer.SyncEvents,
+                    request_deserializer=calendar__pb2.SyncRequest.FromString,
+                    response_serializer=calendar__pb2.SyncResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'calendar.CalendarService', rpc_method_handlers)
@@ -131,7 +291,8 @@ def add_CalendarServiceServicer_to_server(servicer, server):
 
  # This class is part of an EXPERIMENTAL API.
 class CalendarService(object):
-    """Missing associated documentation comment in .proto file."""
+    """Сервис для занесения новых событий в календарь
+    """
 
     @staticmethod
     def CreateEvent(request,
@@ -267,3 +428,246 @@ class CalendarService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StreamEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/calendar.CalendarService/StreamEvents',
+            calendar__pb2.EventsFilter.SerializeToString,
+            calendar__pb2.EventDetails.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchCreateEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/calendar.CalendarService/BatchCreateEvents',
+            calendar__pb2.BatchCreateRequest.SerializeToString,
+            calendar__pb2.BatchEventResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchGetEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/calendar.CalendarService/BatchGetEvents',
+            calendar__pb2.BatchEventRequest.SerializeToString,
+            calendar__pb2.EventList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchDeleteEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/calendar.CalendarService/BatchDeleteEvents',
+            calendar__pb2.BatchEventRequest.SerializeToString,
+            calendar__pb2.BatchEventResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ImportEvents(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/calendar.CalendarService/ImportEvents',
+            calendar__pb2.EventDetails.SerializeToString,
+            calendar__pb2.ImportResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetFreeBusy(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/calendar.CalendarService/GetFreeBusy',
+            calendar__pb2.FreeBusyRequest.SerializeToString,
+            calendar__pb2.FreeBusyResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def FindSlots(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/calendar.CalendarService/FindSlots',
+            calendar__pb2.FindSlotsRequest.SerializeToString,
+            calendar__pb2.FindSlotsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/calendar.CalendarService/WatchEvents',
+            calendar__pb2.WatchRequest.SerializeToString,
+            calendar__pb2.EventChange.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SyncEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/calendar.CalendarService/SyncEvents',
+            calendar__pb2.SyncRequest.SerializeToString,
+            calendar__pb2.SyncResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,126 @@
+"""Журнал изменений хранилища для подписок WatchEvents.
+
+ChangeLog подписывается на изменения хранилища (EventStore.add_listener)
+и хранит последние capacity изменений в порядке ревизий. Подписчик читает
+изменения после известной ему ревизии и, если новых нет, ждет следующих;
+переподключившийся клиент продолжает с последней полученной ревизии, пока
+она не вытеснена из журнала (иначе RevisionCompacted и полная
+синхронизация через ListEvents).
+
+Запись не должна ждать подписчиков: обработчик изменения только дописывает
+его в журнал и будит один поток рассылки, а тот уже будит ожидающие потоки
+и циклы событий asyncio. Поэтому стоимость записи не зависит от числа
+подписчиков, а каждый подписчик сам забирает изменения со своей скоростью;
+отставший больше чем на capacity изменений получает RevisionCompacted.
+"""
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from records import EventRecord
+from storage import EventStore
+
+
+# Сколько последних изменений хранит журнал
+DEFAULT_CAPACITY = 100_000
+
+# (ревизия, старая запись, новая запись), None - записи нет
+Change = Tuple[int, Optional[EventRecord], Optional[EventRecord]]
+
+
+class RevisionCompacted(LookupError):
+    """Изменения после запрошенной ревизии уже вытеснены из журнала"""
+
+
+class ChangeLog:
+    """Ограниченный журнал последних изменений хранилища с ожиданием новых"""
+
+    def __init__(self, store: EventStore, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        # Ревизия последнего изменения; журнал - изменения (first, revision]
+        self.revision = store.revision
+        self._first = store.revision + 1
+        self._changes: List[Change] = []
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._changed = threading.Condition()
+        # Будущее каждого цикла событий, которое завершается при новых изменениях
+        self._loops: Dict[asyncio.AbstractEventLoop, asyncio.Future] = {}
+        store.add_listener(self.append)
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def append(self, revision: int, current: Optional[EventRecord], event: Optional[EventRecord]):
+        """Подписчик EventStore.add_listener: дописывает изменение, не дожидаясь читателей"""
+        with self._lock:
+            if revision != self.revision + 1:
+                # Пропуск ревизий (load хранилища): прежние изменения журнал не продолжают
+                self._changes = []
+                self._first = revision
+            self._changes.append((revision, current, event))
+            self.revision = revision
+            # Обрезаем журнал пачками, чтобы не сдвигать список на каждой записи
+            if len(self._changes) > 2 * self.capacity:
+                del self._changes[:-self.capacity]
+                self._first = self._changes[0][0]
+        self._pending.set()
+
+    def read(self, after: int, limit: int) -> List[Change]:
+        """До limit изменений с ревизией больше after.
+
+        RevisionCompacted - часть этих изменений уже вытеснена,
+        ValueError - ревизия after еще не наступила.
+        """
+        with self._lock:
+            if after > self.revision:
+                raise ValueError(f"Ревизия {after} еще не наступила (текущая {self.revision})")
+            if after < self._first - 1:
+                raise RevisionCompacted(
+                    f"Изменения после ревизии {after} уже вытеснены из журнала, "
+                    f"нужна полная синхронизация (в журнале - с ревизии {self._first})"
+                )
+            start = after - self._first + 1
+            return self._changes[start:start + limit]
+
+    def wait(self, after: int, timeout: float) -> bool:
+        """Ждет изменения с ревизией больше after не дольше timeout секунд"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.revision > after, timeout)
+
+    async def wait_async(self, after: int, timeout: float) -> bool:
+        """Как wait, но не блокируя цикл событий"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._loops.get(loop)
+            if future is None:
+                future = self._loops[loop] = loop.create_future()
+        if self.revision > after:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.revision > after
+
+    def _wake(self, loop: asyncio.AbstractEventLoop):
+        """Выполняется в цикле loop: завершает его будущее и заводит новое"""
+        with self._lock:
+            future = self._loops[loop]
+            self._loops[loop] = loop.create_future()
+        future.set_result(None)
+
+    def _dispatch(self):
+        """Поток рассылки: будит подписчиков после каждой порции изменений"""
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            with self._changed:
+                self._changed.notify_all()
+            with self._lock:
+                loops = list(self._loops)
+            for loop in loops:
+                try:
+                    loop.call_soon_threadsafe(self._wake, loop)
+                except RuntimeError:
+                    # Цикл событий уже закрыт
+                    with self._lock:
+                        self._loops.pop(loop, None)
@@ -0,0 +1,208 @@
+"""Каналы клиентов CalendarService: пул соединений, keepalive, сжатие, сроки и повторы.
+
+Все вызовы одного канала gRPC идут по одному соединению HTTP/2, и медленный
+ответ или большой поток задерживает остальные вызовы этого соединения.
+Кроме того, многопроцессный сервер (cluster.py) распределяет между
+процессами соединения, а не вызовы. ChannelPool открывает несколько
+каналов, каждый со своим соединением (grpc.use_local_subchannel_pool), и
+раздает их вызовам по кругу.
+
+Сроки вызовов и повторы задаются конфигурацией сервиса gRPC
+(service_config), поэтому действуют для каждого вызова без обертки над
+заглушкой:
+- обычные вызовы получают срок timeout секунд, если вызывающий не передал
+  свой timeout;
+- потоковые StreamEvents, ImportEvents и WatchEvents срока по умолчанию не
+  имеют;
+- повторяются при retry_codes только чтения: повтор CreateEvent создал бы
+  событие второй раз, поэтому записи не повторяются.
+"""
+import asyncio
+import itertools
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import grpc
+import grpc.aio
+
+import calendar_pb2
+import calendar_pb2_grpc
+
+
+SERVICE = calendar_pb2.DESCRIPTOR.services_by_name['CalendarService']
+
+# Методы без побочных эффектов: их повтор безопасен
+READ_METHODS = frozenset((
+    'GetEvent', 'ListEvents', 'StreamEvents', 'BatchGetEvents', 'GetFreeBusy', 'FindSlots', 'SyncEvents'
+))
+
+# Сервер (server.KEEPALIVE_OPTIONS) принимает пинги не чаще раза в столько
+# секунд, а на более частые закрывает соединение (GOAWAY too_many_pings)
+MIN_KEEPALIVE_TIME = 10.0
+
+COMPRESSION = {
+    'none': grpc.Compression.NoCompression,
+    'gzip': grpc.Compression.Gzip,
+    'deflate': grpc.Compression.Deflate,
+}
+
+
+class ChannelConfig(NamedTuple):
+    """Настройки каналов клиента"""
+    target: str = 'localhost:50054'
+    # Число каналов (соединений HTTP/2) в пуле
+    pool_size: int = 1
+    # Пинг соединения каждые keepalive_time секунд (0 - без пингов, иначе не меньше
+    # MIN_KEEPALIVE_TIME) и ожидание ответа на него
+    keepalive_time: float = 60.0
+    keepalive_timeout: float = 20.0
+    # Пинговать ли соединение без активных вызовов
+    keepalive_without_calls: bool = False
+    max_send_message_length: int = 16 * 1024 * 1024
+    max_receive_message_length: int = 64 * 1024 * 1024
+    # Сжатие сообщений: none, gzip или deflate
+    compression: str = 'none'
+    # Срок обычного вызова по умолчанию, секунды (None - без срока)
+    timeout: Optional[float] = 10.0
+    # Сроки отдельных методов, перекрывающие timeout (None - без срока)
+    method_timeouts: Tuple[Tuple[str, Optional[float]], ...] = ()
+    # Число попыток чтения, включая первую (1 - без повторов, gRPC ограничивает 5)
+    max_attempts: int = 3
+    retry_codes: Tuple[str, ...] = ('UNAVAILABLE',)
+    initial_backoff: float = 0.05
+    max_backoff: float = 1.0
+    backoff_multiplier: float = 2.0
+
+
+def format_duration(seconds: float) -> str:
+    """Длительность в формате конфигурации сервиса: 0.05 -> '0.05s'"""
+    return f'{seconds:.6f}'.rstrip('0').rstrip('.') + 's'
+
+
+def service_config(config: ChannelConfig) -> dict:
+    """Конфигурация сервиса gRPC со сроками и политикой повторов по методам"""
+    method_timeouts = dict(config.method_timeouts)
+    # Методы с одинаковыми настройками объединяются в одну запись methodConfig
+    groups: Dict[Tuple[Optional[float], bool], List[str]] = {}
+    for method in SERVICE.methods:
+        # Потоковым методам срок по умолчанию не назначается
+        streaming = method.client_streaming or method.server_streaming
+        timeout = method_timeouts.get(method.name, None if streaming else config.timeout)
+        retry = method.name in READ_METHODS and config.max_attempts > 1
+        groups.setdefault((timeout, retry), []).append(method.name)
+
+    method_configs = []
+    for (timeout, retry), names in groups.items():
+        method_config = {'name': [{'service': SERVICE.full_name, 'method': name} for name in names]}
+        if timeout is not None:
+            method_config['timeout'] = format_duration(timeout)
+        if retry:
+            method_config['retryPolicy'] = {
+                'maxAttempts': config.max_attempts,
+                'initialBackoff': format_duration(config.initial_backoff),
+                'maxBackoff': format_duration(config.max_backoff),
+                'backoffMultiplier': config.backoff_multiplier,
+                'retryableStatusCodes': list(config.retry_codes),
+            }
+        method_configs.append(method_config)
+    return {'methodConfig': method_configs}
+
+
+def channel_options(config: ChannelConfig) -> List[Tuple[str, object]]:
+    """Аргументы канала gRPC по настройкам; ValueError - настройки некорректны"""
+    if config.compression not in COMPRESSION:
+        raise ValueError(f"Неизвестное сжатие: {config.compression} (допустимы {', '.join(COMPRESSION)})")
+    unknown = [code for code in config.retry_codes if code not in grpc.StatusCode.__members__]
+    if unknown:
+        raise ValueError(f"Неизвестные коды gRPC для повтора: {', '.join(unknown)}")
+    if 0 < config.keepalive_time < MIN_KEEPALIVE_TIME:
+        raise ValueError(f"Интервал keepalive должен быть не меньше {MIN_KEEPALIVE_TIME:g} секунд "
+                         f"(0 - без пингов): сервер отклоняет более частые пинги")
+    options = [
+        # Свой пул подключений у каждого канала: иначе каналы с одинаковыми
+        # аргументами делят одно соединение
+        ('grpc.use_local_subchannel_pool', 1),
+        ('grpc.max_send_message_length', config.max_send_message_length),
+        ('grpc.max_receive_message_length', config.max_receive_message_length),
+        ('grpc.enable_retries', 1),
+        ('grpc.service_config', json.dumps(service_config(config))),
+    ]
+    if config.keepalive_time:
+        options += [
+            ('grpc.keepalive_time_ms', int(config.keepalive_time * 1000)),
+            ('grpc.keepalive_timeout_ms', int(config.keepalive_timeout * 1000)),
+            ('grpc.keepalive_permit_without_calls', int(config.keepalive_without_calls)),
+            ('grpc.http2.max_pings_without_data', 0),
+        ]
+    return options
+
+
+class ChannelPool:
+    """Каналы к серверу календаря, раздаваемые вызовам по кругу"""
+
+    def __init__(self, config: ChannelConfig = ChannelConfig()):
+        if config.pool_size < 1:
+            raise ValueError("В пуле должен быть хотя бы один канал")
+        self.config = config
+        options = channel_options(config)
+        self.channels = [
+            grpc.insecure_channel(config.target, options=options, compression=COMPRESSION[config.compression])
+            for _ in range(config.pool_size)
+        ]
+        self.stubs = [calendar_pb2_grpc.CalendarServiceStub(channel) for channel in self.channels]
+        self._next = itertools.cycle(self.stubs)
+
+    def stub(self) -> calendar_pb2_grpc.CalendarServiceStub:
+        """Заглушка следующего канала пула"""
+        return next(self._next)
+
+    def wait_ready(self, timeout: Optional[float] = None):
+        """Ждет подключения всех каналов, grpc.FutureTimeoutError - не дождались"""
+        for channel in self.channels:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncChannelPool:
+    """Каналы grpc.aio с теми же настройками, что у ChannelPool.
+
+    Создается внутри работающего цикла событий, которым потом и пользуется.
+    """
+
+    def __init__(self, config: ChannelConfig = ChannelConfig()):
+        if config.pool_size < 1:
+            raise ValueError("В пуле должен быть хотя бы один канал")
+        self.config = config
+        options = channel_options(config)
+        self.channels = [
+            grpc.aio.insecure_channel(config.target, options=options, compression=COMPRESSION[config.compression])
+            for _ in range(config.pool_size)
+        ]
+        self.stubs = [calendar_pb2_grpc.CalendarServiceStub(channel) for channel in self.channels]
+        self._next = itertools.cycle(self.stubs)
+
+    def stub(self) -> calendar_pb2_grpc.CalendarServiceStub:
+        """Заглушка следующего канала пула"""
+        return next(self._next)
+
+    async def wait_ready(self, timeout: Optional[float] = None):
+        """Ждет подключения всех каналов, asyncio.TimeoutError - не дождались"""
+        await asyncio.wait_for(asyncio.gather(*(channel.channel_ready() for channel in self.channels)), timeout)
+
+    async def close(self):
+        await asyncio.gather(*(channel.close() for channel in self.channels))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -1,12 +1,136 @@
 import grpc
-from datetime import datetime, timedelta
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, TextIO
 import calendar_pb2
 import calendar_pb2_grpc
+from channels import COMPRESSION, ChannelConfig, ChannelPool
+
+def read_json_events(f: TextIO) -> Iterator[calendar_pb2.EventDetails]:
+    """Лениво читает события из файла JSON Lines (один объект на строку)"""
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        data = json.loads(line)
+        yield calendar_pb2.EventDetails(
+            title=data.get('title', ''),
+            description=data.get('description', ''),
+            start_time=data.get('start_time', ''),
+            end_time=data.get('end_time', ''),
+            location=data.get('location', ''),
+            attendees=data.get('attendees', []),
+            organizer=data.get('organizer', '')
+        )
+
+def unfold_ics_lines(f: TextIO) -> Iterator[str]:
+    """Склеивает перенесенные строки iCalendar (продолжение начинается с пробела)"""
+    current = None
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+def ics_text(value: str) -> str:
+    """Снимает экранирование текстового значения iCalendar"""
+    return (value.replace('\\n', '\n').replace('\\N', '\n')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+def ics_time(value: str) -> str:
+    """Переводит время iCalendar (20241225T143000Z или 20241225) в ISO"""
+    if 'T' not in value:
+        return datetime.strptime(value, '%Y%m%d').isoformat()
+    if value.endswith('Z'):
+        return datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc).isoformat()
+    return datetime.strptime(value, '%Y%m%dT%H%M%S').isoformat()
+
+def ics_address(value: str) -> str:
+    return value[len('mailto:'):] if value.lower().startswith('mailto:') else value
+
+def read_ics_events(f: TextIO) -> Iterator[calendar_pb2.EventDetails]:
+    """Лениво читает блоки VEVENT из файла iCalendar"""
+    event: Dict[str, str] = {}
+    attendees: List[str] = []
+    in_event = False
+    for line in unfold_ics_lines(f):
+        name_part, _, value = line.partition(':')
+        name = name_part.split(';', 1)[0].upper()
+        
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event, attendees, in_event = {}, [], True
+        elif name == 'END' and value.upper() == 'VEVENT' and in_event:
+            in_event = False
+            yield calendar_pb2.EventDetails(
+                title=event.get('SUMMARY', ''),
+                description=event.get('DESCRIPTION', ''),
+                start_time=event.get('DTSTART', ''),
+                end_time=event.get('DTEND', ''),
+                location=event.get('LOCATION', ''),
+                attendees=attendees,
+                organizer=event.get('ORGANIZER', '')
+            )
+        elif in_event:
+            if name in ('DTSTART', 'DTEND'):
+                event[name] = ics_time(value)
+            elif name == 'ATTENDEE':
+                attendees.append(ics_address(value))
+            elif name == 'ORGANIZER':
+                event[name] = ics_address(value)
+            elif name in ('SUMMARY', 'DESCRIPTION', 'LOCATION'):
+                event[name] = ics_text(value)
+
+def read_events(path: str) -> Iterator[calendar_pb2.EventDetails]:
+    """Открывает файл сразу, а события читает лениво; формат - .ics или JSON Lines"""
+    f = open(path, encoding='utf-8')
+    parse = read_ics_events if path.lower().endswith('.ics') else read_json_events
+    
+    def events():
+        with f:
+            yield from parse(f)
+    
+    return events()
 
 class CalendarClient:
-    def __init__(self, host='localhost', port=50054):
-        self.channel = grpc.insecure_channel(f'{host}:{port}')
-        self.stub = calendar_pb2_grpc.CalendarServiceStub(self.channel)
+    def __init__(self, host='localhost', port=50054, config: Optional[ChannelConfig] = None):
+        """Клиент сервера host:port; config - пул каналов, keepalive, сжатие, сроки и повторы"""
+        config = (config or ChannelConfig())._replace(target=f'{host}:{port}')
+        self.pool = ChannelPool(config)
+        # Полученные события по ID: повторный GetEvent передает только версию
+        self.events = {}
+        # Ревизия последнего полученного изменения: watch продолжает с нее
+        self.watch_revision = 0
+        # Токен синхронизации копии self.events: sync загружает только изменения после него
+        self.sync_token = ''
+    
+    @property
+    def stub(self) -> calendar_pb2_grpc.CalendarServiceStub:
+        """Заглушка следующего канала пула: вызовы распределяются по соединениям"""
+        return self.pool.stub()
+    
+    def close(self):
+        self.pool.close()
+    
+    def fetch_event(self, event_id):
+        """Получает событие, не загружая его повторно, если версия не изменилась"""
+        cached = self.events.get(event_id)
+        event = self.stub.GetEvent(calendar_pb2.EventRequest(
+            event_id=event_id,
+            if_none_match=cached.version if cached is not None else 0
+        ))
+        if event.status == "not_modified":
+            return cached
+        if event.status == "not_found":
+            self.events.pop(event_id, None)
+        else:
+            self.events[event_id] = event
+        return event
     
     def print_event(self, event):
         """Выводит информацию о событии"""
@@ -21,8 +145,14 @@ class CalendarClient:
         print(f"Организатор: {event.organizer}")
         print(f"Статус: {event.status}")
         print(f"Участники: {', '.join(event.attendees) if event.attendees else 'нет'}")
+        if event.HasField('recurrence'):
+            recurrence = event.recurrence
+            limit = f", {recurrence.count} раз" if recurrence.count else ""
+            if recurrence.until:
+                limit += f", до {recurrence.until}"
+            print(f"Повторение: {recurrence.frequency}, каждый {recurrence.interval}-й период{limit}")
         print(f"Создано: {event.created_at}")
-        print(f"Обновлено: {event.updated_at}")
+        print(f"Обновлено: {event.updated_at} (версия {event.version})")
         print("=" * 60)
 
     def input_datetime(self, prompt):
@@ -66,6 +196,16 @@ class CalendarClient:
         attendees_input = input().strip()
         attendees = [a.strip() for a in attendees_input.split(',')] if attendees_input else []
         
+        recurrence = None
+        frequency = input("Повторение (daily, weekly, monthly; пусто - без повторения): ").strip()
+        if frequency:
+            count = input("Число повторений (пусто - без ограничения): ").strip()
+            try:
+                recurrence = calendar_pb2.Recurrence(frequency=frequency, count=int(count or 0))
+            except ValueError:
+                print("Число повторений должно быть числом")
+                return False
+        
         try:
             response = self.stub.CreateEvent(calendar_pb2.EventDetails(
                 title=title,
@@ -74,7 +214,8 @@ class CalendarClient:
                 end_time=end_time,
                 location=location,
                 attendees=attendees,
-                organizer=organizer
+                organizer=organizer,
+                recurrence=recurrence
             ))
             
             if response.success:
@@ -95,7 +236,7 @@ class CalendarClient:
         event_id = input("Введите ID события: ").strip()
         
         try:
-            event = self.stub.GetEvent(calendar_pb2.EventRequest(event_id=event_id))
+            event = self.fetch_event(event_id)
             
             if event.status == "not_found":
                 print(f"Событие с ID '{event_id}' не найдено")
@@ -114,8 +255,9 @@ class CalendarClient:
         event_id = input("Введите ID события для обновления: ").strip()
         
         try:
-            # Сначала получаем текущие данные события
-            current_event = self.stub.GetEvent(calendar_pb2.EventRequest(event_id=event_id))
+            # Событие из локальной копии показываем без запроса; если оно
+            # устарело, сервер отклонит обновление по версии
+            current_event = self.events.get(event_id) or self.fetch_event(event_id)
             
             if not current_event.event_id or current_event.status == "not_found":
                 print(f"Событие с ID '{event_id}' не найдено")
@@ -142,28 +284,38 @@ class CalendarClient:
             print("Новые участники (введите через запятую, оставьте пустым чтобы не менять): ")
             attendees_input = input().strip()
             
-            # Используем текущие значения если новые не введены
+            # Отправляем только введенные поля, остальные сервер берет из текущей версии
             event_details = calendar_pb2.EventDetails(
                 event_id=event_id,
-                title=title if title else current_event.title,
-                description=description if description else current_event.description,
-                start_time=start_time if start_time else current_event.start_time,
-                end_time=end_time if end_time else current_event.end_time,
-                location=location if location else current_event.location,
-                organizer=organizer if organizer else current_event.organizer,
-                attendees=list(current_event.attendees)  # по умолчанию текущие участники
+                title=title,
+                description=description,
+                start_time=start_time or '',
+                end_time=end_time or '',
+                location=location,
+                organizer=organizer,
+                attendees=[a.strip() for a in attendees_input.split(',') if a.strip()],
+                # Обновление не затрет изменения, сделанные после получения события
+                version=current_event.version
             )
-            
-            # Обновляем участников если введены новые
-            if attendees_input:
-                event_details.attendees[:] = [a.strip() for a in attendees_input.split(',') if a.strip()]
+            values = {
+                'title': title, 'description': description, 'start_time': start_time, 'end_time': end_time,
+                'location': location, 'organizer': organizer, 'attendees': attendees_input
+            }
+            event_details.update_mask.paths.extend(name for name, value in values.items() if value)
+            if not event_details.update_mask.paths:
+                print("Изменений нет")
+                return True
             
             response = self.stub.UpdateEvent(event_details)
             
             if response.success:
                 print("УСПЕХ: Событие успешно обновлено!")
+                self.events[event_id] = response.event
                 self.print_event(response.event)
             else:
+                if response.event.event_id:
+                    # Событие изменено другим запросом - запоминаем текущую версию
+                    self.events[event_id] = response.event
                 print(f"ОШИБКА: {response.message}")
                 
             return response.success
@@ -177,24 +329,22 @@ class CalendarClient:
         print("\n--- СПИСОК СОБЫТИЙ ---")
         
         try:
-            # Получаем все события
-            events = self.stub.ListEvents(calendar_pb2.EventsFilter())
-            
-            if events.total_count == 0:
-                print("Событий не найдено")
-                return True
-            
-            print(f"Найдено событий: {events.total_count}\n")
-            
-            for i, event in enumerate(events.events, 1):
+            # Получаем все события потоком и выводим их по мере поступления
+            count = 0
+            for count, event in enumerate(self.stub.StreamEvents(calendar_pb2.EventsFilter()), 1):
                 start_dt = datetime.fromisoformat(event.start_time)
-                print(f"{i}. {event.title}")
+                print(f"{count}. {event.title}")
                 print(f"   Время: {start_dt.strftime('%Y-%m-%d %H:%M')}")
                 print(f"   Организатор: {event.organizer}")
                 print(f"   Статус: {event.status}")
                 print(f"   ID: {event.event_id}")
                 print()
             
+            if count == 0:
+                print("Событий не найдено")
+            else:
+                print(f"Найдено событий: {count}")
+            
             return True
             
         except grpc.RpcError as e:
@@ -220,8 +370,181 @@ class CalendarClient:
             print(f"Ошибка gRPC: {e.details()}")
             return False
 
+    def input_attendees(self):
+        """Ввод списка участников через запятую"""
+        attendees_input = input("Участники (через запятую): ").strip()
+        return [a.strip() for a in attendees_input.split(',') if a.strip()]
+    
+    def free_busy(self):
+        """Выводит занятое время участников"""
+        print("\n--- ЗАНЯТОСТЬ УЧАСТНИКОВ ---")
+        attendees = self.input_attendees()
+        start_time = self.input_datetime("Начало периода")
+        end_time = self.input_datetime("Конец периода")
+        
+        try:
+            response = self.stub.GetFreeBusy(calendar_pb2.FreeBusyRequest(
+                attendees=attendees, start_time=start_time or "", end_time=end_time or ""
+            ))
+            
+            for attendee in response.attendees:
+                print(f"{attendee.attendee}:")
+                if not attendee.busy:
+                    print("   свободен")
+                for interval in attendee.busy:
+                    print(f"   занят {interval.start_time} - {interval.end_time}")
+            
+            return True
+            
+        except grpc.RpcError as e:
+            print(f"Ошибка gRPC: {e.details()}")
+            return False
+    
+    def find_slots(self):
+        """Ищет время, когда свободны все участники"""
+        print("\n--- ПОИСК СВОБОДНОГО ВРЕМЕНИ ---")
+        attendees = self.input_attendees()
+        start_time = self.input_datetime("Начало периода")
+        end_time = self.input_datetime("Конец периода")
+        
+        try:
+            duration = int(input("Длительность встречи (минут): ").strip())
+        except ValueError:
+            print("Длительность должна быть числом")
+            return False
+        
+        try:
+            response = self.stub.FindSlots(calendar_pb2.FindSlotsRequest(
+                attendees=attendees, duration_minutes=duration,
+                start_time=start_time or "", end_time=end_time or ""
+            ))
+            
+            if not response.slots:
+                print("Свободного времени не найдено")
+            for number, slot in enumerate(response.slots, 1):
+                print(f"{number}. {slot.start_time} - {slot.end_time}")
+            
+            return True
+            
+        except grpc.RpcError as e:
+            print(f"Ошибка gRPC: {e.details()}")
+            return False
+
+    def import_events(self, path=None):
+        """Импортирует события из файла .ics или JSON Lines одним потоком"""
+        print("\n--- ИМПОРТ СОБЫТИЙ ---")
+        if path is None:
+            path = input("Путь к файлу (.ics или .jsonl): ").strip()
+        
+        try:
+            # Файл читается лениво: события отправляются по мере чтения
+            events = read_events(path)
+            result = None
+            for result in self.stub.ImportEvents(events):
+                print(f"Обработано: {result.processed}, импортировано: {result.imported}, ошибок: {result.failed}")
+                for error in result.errors:
+                    print(f"   #{error.index} '{error.title}': {error.message}")
+            
+            if result is None:
+                print("Файл не содержит событий")
+                return False
+            
+            print(f"УСПЕХ: импортировано {result.imported} из {result.processed} событий")
+            return True
+            
+        except OSError as e:
+            print(f"Ошибка чтения файла: {e}")
+            return False
+        except grpc.RpcError as e:
+            print(f"Ошибка gRPC: {e.details()}")
+            return False
+
+    def watch_events(self):
+        """Выводит изменения событий по мере их появления (до Ctrl+C)"""
+        print("\n--- ПОДПИСКА НА ИЗМЕНЕНИЯ ---")
+        organizer = input("Организатор (оставьте пустым для всех): ").strip()
+        print("Ожидание изменений, Ctrl+C - остановить")
+        
+        request = calendar_pb2.WatchRequest(
+            filter=calendar_pb2.EventsFilter(organizer=organizer),
+            since_revision=self.watch_revision
+        )
+        call = self.stub.WatchEvents(request)
+        try:
+            for change in call:
+                self.watch_revision = change.revision
+                if change.type != 'progress':
+                    print(f"[{change.revision}] {change.type}: {change.event.title} ({change.event.event_id})")
+            return True
+        except KeyboardInterrupt:
+            call.cancel()
+            print(f"\nПодписка остановлена на ревизии {self.watch_revision}")
+            return True
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.OUT_OF_RANGE:
+                # Пропущенные изменения недоступны - следующая подписка начнется заново
+                self.watch_revision = 0
+            print(f"Ошибка gRPC: {e.details()}")
+            return False
+
+    def sync_events(self):
+        """Обновляет локальную копию событий, загружая только изменившиеся с прошлой синхронизации"""
+        print("\n--- СИНХРОНИЗАЦИЯ ---")
+        
+        try:
+            changed = deleted = 0
+            while True:
+                response = self.stub.SyncEvents(calendar_pb2.SyncRequest(sync_token=self.sync_token))
+                if response.reset:
+                    # Изменения после токена неизвестны - загружаем все события заново
+                    self.events = {event.event_id: event
+                                   for event in self.stub.StreamEvents(calendar_pb2.EventsFilter())}
+                    self.sync_token = response.sync_token
+                    print(f"Загружено событий: {len(self.events)}")
+                    return True
+                if response.changed_ids:
+                    batch = self.stub.BatchGetEvents(calendar_pb2.BatchEventRequest(event_ids=response.changed_ids))
+                    for event in batch.events:
+                        if event.status == "not_found":
+                            # Удалено уже после ответа - узнаем при следующей синхронизации
+                            self.events.pop(event.event_id, None)
+                        else:
+                            self.events[event.event_id] = event
+                for event_id in response.deleted_ids:
+                    self.events.pop(event_id, None)
+                changed += len(response.changed_ids)
+                deleted += len(response.deleted_ids)
+                self.sync_token = response.sync_token
+                if not response.has_more:
+                    break
+            
+            print(f"Изменено событий: {changed}, удалено: {deleted}, всего в копии: {len(self.events)}")
+            return True
+            
+        except grpc.RpcError as e:
+            print(f"Ошибка gRPC: {e.details()}")
+            return False
+
 def main():
     """Основная функция клиента"""
+    parser = argparse.ArgumentParser(description="Клиент CalendarService")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=50054)
+    parser.add_argument('--channels', type=int, default=1, help="число соединений с сервером")
+    parser.add_argument('--compression', choices=tuple(COMPRESSION), default='none', help="сжатие сообщений")
+    parser.add_argument('--timeout', type=float, default=10.0, help="срок вызова по умолчанию, секунды (0 - без срока)")
+    parser.add_argument('--keepalive', type=float, default=60.0,
+                        help="интервал пингов соединения, не меньше 10 секунд (0 - без пингов)")
+    args = parser.parse_args()
+    
+    try:
+        client = CalendarClient(args.host, args.port, ChannelConfig(
+            pool_size=args.channels, compression=args.compression, timeout=args.timeout or None,
+            keepalive_time=args.keepalive
+        ))
+    except ValueError as e:
+        parser.error(str(e))
+    
     print("=== Calendar Service Client ===")
     print("Доступные команды:")
     print("  create - создать новое событие")
@@ -229,17 +552,21 @@ def main():
     print("  update - обновить событие")
     print("  list   - список всех событий")
     print("  delete - удалить событие")
+    print("  import - импортировать события из файла")
+    print("  busy   - занятое время участников")
+    print("  slots  - найти время, когда все участники свободны")
+    print("  watch  - следить за изменениями событий")
+    print("  sync   - синхронизировать локальную копию событий")
     print("  exit   - выйти")
     print("=" * 40)
     
-    client = CalendarClient()
-    
     while True:
         print("\nВведите команду: ", end="")
         command = input().strip().lower()
         
         if command == 'exit':
             print("Выход из программы...")
+            client.close()
             break
         
         elif command == 'create':
@@ -257,8 +584,23 @@ def main():
         elif command == 'delete':
             client.delete_event()
         
+        elif command == 'import':
+            client.import_events()
+        
+        elif command == 'busy':
+            client.free_busy()
+        
+        elif command == 'slots':
+            client.find_slots()
+        
+        elif command == 'watch':
+            client.watch_events()
+        
+        elif command == 'sync':
+            client.sync_events()
+        
         else:
-            print("Неизвестная команда. Доступные команды: create, get, update, list, delete, exit")
+            print("Неизвестная команда. Доступные команды: create, get, update, list, delete, import, busy, slots, watch, sync, exit")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
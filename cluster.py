@@ -0,0 +1,312 @@
+"""Многопроцессный режим сервера календаря.
+
+Один процесс CPython упирается в GIL, поэтому сервер запускается несколькими
+процессами, которые слушают один порт с SO_REUSEPORT, а ядро распределяет
+между ними входящие соединения.
+
+Проверка конфликтов должна видеть все события участника сразу, а событие
+может затрагивать участников из разных разделов, поэтому записи не делятся
+между процессами по ключу. Вместо этого:
+- основной процесс (номер 0) владеет хранилищем и выполняет все записи;
+- остальные процессы держат полные реплики хранилища, отвечают на чтения
+  сами, а записи пересылают основному процессу через локальный сокет;
+- основной процесс рассылает изменения репликам в порядке ревизий, а ответ
+  на запись несет ревизию в завершающих метаданных: реплика возвращает
+  ответ клиенту, только применив эту ревизию, поэтому клиент видит свои
+  записи при следующем чтении.
+
+Чтения масштабируются с числом процессов, записи - нет.
+"""
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
+from typing import List, Optional, Tuple
+
+import grpc
+
+import calendar_pb2_grpc
+from records import EventRecord
+from persistence import open_store
+from logs import setup
+from metrics import PHASES, MetricsInterceptor
+from server import (DEFAULT_PORT, KEEPALIVE_OPTIONS, CalendarServicer, add_servicer, close_store, print_banner,
+                    start_metrics, watcher_limit)
+from storage import EventStore, InMemoryEventStore
+
+
+# Завершающие метаданные с ревизией хранилища после записи
+REVISION_HEADER = 'x-calendar-revision'
+
+# Сколько реплика ждет применения записи, прежде чем ответить клиенту
+SYNC_TIMEOUT = 5.0
+
+SERVER_OPTIONS = KEEPALIVE_OPTIONS + [('grpc.so_reuseport', 1)]
+
+
+def remaining_timeout(context) -> Optional[float]:
+    """Остаток срока вызова клиента для пересылки, None если срок не задан"""
+    remaining = context.time_remaining()
+    # Без срока grpc сообщает остаток до бесконечно далекого момента
+    return remaining if remaining is not None and remaining < 86400 else None
+
+
+class Replicator:
+    """Рассылает изменения хранилища основного процесса в очереди реплик"""
+
+    def __init__(self, queues: List[multiprocessing.Queue]):
+        self.queues = queues
+
+    def __call__(self, revision: int, current: Optional[EventRecord], event: Optional[EventRecord]):
+        if event is None:
+            change = ('delete', revision, current.event_id)
+        else:
+            change = ('put', revision, event.to_row())
+        for changes in self.queues:
+            changes.put(change)
+
+    def send_initial(self, store: EventStore):
+        """Передает репликам текущее содержимое хранилища и сообщает о готовности"""
+        revision, records = store.dump()
+        rows = [event.to_row() for event in records]
+        for changes in self.queues:
+            for row in rows:
+                changes.put(('put', revision, row))
+            changes.put(('ready', revision, store.epoch))
+
+
+class Replica:
+    """Применяет поток изменений основного процесса к локальной копии хранилища.
+
+    Начальное содержимое загружается в хранилище целиком с ревизией основного
+    процесса, а дальше каждое изменение увеличивает ревизию реплики на
+    единицу, как и в основном процессе, поэтому ревизии (и продолжение
+    подписки WatchEvents) совпадают во всех процессах. Эпоху истории
+    изменений реплика тоже берет у основного процесса, поэтому токены
+    SyncEvents действуют в любом процессе.
+    """
+
+    def __init__(self, store: EventStore, changes: multiprocessing.Queue):
+        self.store = store
+        self.changes = changes
+        self.revision = 0
+        self.ready = threading.Event()
+        self._applied = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        initial = []
+        while True:
+            kind, revision, payload = self.changes.get()
+            if not self.ready.is_set():
+                if kind == 'put':
+                    initial.append(EventRecord.from_row(payload))
+                    continue
+                self.store.load(initial, revision)
+                self.store.epoch = payload
+                initial = None
+                self.ready.set()
+            elif kind == 'put':
+                self.store.put(EventRecord.from_row(payload))
+            elif kind == 'delete':
+                self.store.delete(payload)
+            with self._applied:
+                self.revision = revision
+                self._applied.notify_all()
+
+    def wait_for(self, revision: int, timeout: float = SYNC_TIMEOUT) -> bool:
+        """Ждет, пока реплика применит изменения до ревизии revision включительно"""
+        with self._applied:
+            return self._applied.wait_for(lambda: self.revision >= revision, timeout)
+
+
+class PrimaryServicer(CalendarServicer):
+    """Сервис основного процесса: выполняет записи и сообщает их ревизию"""
+
+    def mark_revision(self, context):
+        context.set_trailing_metadata(((REVISION_HEADER, str(self.store.revision)),))
+
+    def CreateEvent(self, request, context):
+        response = super().CreateEvent(request, context)
+        self.mark_revision(context)
+        return response
+
+    def UpdateEvent(self, request, context):
+        response = super().UpdateEvent(request, context)
+        self.mark_revision(context)
+        return response
+
+    def DeleteEvent(self, request, context):
+        response = super().DeleteEvent(request, context)
+        self.mark_revision(context)
+        return response
+
+    def BatchCreateEvents(self, request, context):
+        response = super().BatchCreateEvents(request, context)
+        self.mark_revision(context)
+        return response
+
+    def BatchDeleteEvents(self, request, context):
+        response = super().BatchDeleteEvents(request, context)
+        self.mark_revision(context)
+        return response
+
+    def ImportEvents(self, request_iterator, context):
+        yield from super().ImportEvents(request_iterator, context)
+        self.mark_revision(context)
+
+
+class ReplicaServicer(CalendarServicer):
+    """Сервис реплики: читает из локальной копии, записи пересылает основному процессу"""
+
+    def __init__(self, replica: Replica, primary_target: str, max_watchers: Optional[int] = None):
+        super().__init__(store=replica.store, sample_data=False, max_watchers=max_watchers)
+        self.replica = replica
+        self.primary = calendar_pb2_grpc.CalendarServiceStub(grpc.insecure_channel(primary_target))
+
+    def wait_for_primary(self, call):
+        """Дожидается применения записи, выполненной вызовом call основного процесса"""
+        for key, value in call.trailing_metadata() or ():
+            if key == REVISION_HEADER:
+                self.replica.wait_for(int(value))
+
+    def forward(self, method, request, context):
+        try:
+            response, call = method.with_call(request, timeout=remaining_timeout(context))
+        except grpc.RpcError as e:
+            context.abort(e.code(), e.details())
+        self.wait_for_primary(call)
+        return response
+
+    def CreateEvent(self, request, context):
+        return self.forward(self.primary.CreateEvent, request, context)
+
+    def UpdateEvent(self, request, context):
+        return self.forward(self.primary.UpdateEvent, request, context)
+
+    def DeleteEvent(self, request, context):
+        return self.forward(self.primary.DeleteEvent, request, context)
+
+    def BatchCreateEvents(self, request, context):
+        return self.forward(self.primary.BatchCreateEvents, request, context)
+
+    def BatchDeleteEvents(self, request, context):
+        return self.forward(self.primary.BatchDeleteEvents, request, context)
+
+    def ImportEvents(self, request_iterator, context):
+        call = self.primary.ImportEvents(request_iterator, timeout=remaining_timeout(context))
+        try:
+            yield from call
+        except grpc.RpcError as e:
+            context.abort(e.code(), e.details())
+        self.wait_for_primary(call)
+
+
+def run_worker(index: int, port: int, primary_target: str, changes, max_workers: int,
+               data_dir: Optional[str] = None, storage: str = 'memory',
+               metrics_port: Optional[int] = None, trace_phases: bool = False,
+               log_settings: Tuple[dict, Optional[str]] = ({}, None)):
+    """Точка входа процесса: номер 0 - основной процесс, остальные - реплики.
+
+    Основному процессу передается список очередей всех реплик, реплике -
+    ее собственная очередь. Данные на диске (data_dir) ведет только основной
+    процесс, реплики держат копию в памяти. Метрики каждый процесс отдает
+    на своем порту metrics_port + index. log_settings - настройки журнала
+    и файл, который процесс перечитывает по SIGHUP (см. logs.setup).
+    """
+    # Остановка лаунчером (SIGTERM) проходит тот же путь, что и Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    PHASES.enable(trace_phases)
+    setup(*log_settings)
+
+    if index == 0:
+        store = open_store(data_dir, storage)
+        servicer = PrimaryServicer(store, max_watchers=watcher_limit(max_workers))
+        # Сервер еще не принимает запросы, поэтому между срезом и подпиской изменений нет
+        replicator = Replicator(changes)
+        replicator.send_initial(store)
+        store.add_listener(replicator)
+    else:
+        replica = Replica(InMemoryEventStore(), changes)
+        replica.start()
+        # Реплика принимает соединения только с полной копией данных
+        replica.ready.wait()
+        servicer = ReplicaServicer(replica, primary_target, watcher_limit(max_workers))
+
+    interceptors = []
+    if metrics_port is not None:
+        interceptors.append(MetricsInterceptor(start_metrics(servicer, metrics_port + index)))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),
+                         interceptors=interceptors, options=SERVER_OPTIONS)
+    if index == 0:
+        server.add_insecure_port(primary_target)
+    add_servicer(servicer, server)
+    server.add_insecure_port(f'[::]:{port}')
+    server.start()
+
+    print(f"Процесс {index} ({'основной' if index == 0 else 'реплика'}, pid {os.getpid()}) готов")
+
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        server.stop(0).wait()
+    finally:
+        close_store(servicer.store)
+
+
+def serve_cluster(port: int = DEFAULT_PORT, processes: Optional[int] = None, max_workers: int = 10,
+                  data_dir: Optional[str] = None, storage: str = 'memory',
+                  metrics_port: Optional[int] = None, trace_phases: bool = False,
+                  log_settings: Tuple[dict, Optional[str]] = ({}, None)):
+    """Запускает сервер календаря в processes процессах на одном порту"""
+    processes = processes or os.cpu_count() or 1
+    # grpc не переживает fork после инициализации, поэтому процессы запускаются через spawn
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue() for _ in range(processes - 1)]
+    socket_dir = tempfile.mkdtemp(prefix='calendar-')
+    primary_target = f"unix:{os.path.join(socket_dir, 'primary.sock')}"
+
+    workers = [context.Process(target=run_worker, args=(
+        0, port, primary_target, queues, max_workers, data_dir, storage, metrics_port, trace_phases, log_settings
+    ))]
+    for index, changes in enumerate(queues, 1):
+        workers.append(context.Process(
+            target=run_worker, args=(index, port, primary_target, changes, max_workers, None, 'memory',
+                                     metrics_port, trace_phases, log_settings)
+        ))
+    for worker in workers:
+        worker.start()
+
+    print_banner(port, f"{processes} процессов с SO_REUSEPORT, по {max_workers} потоков")
+    # По SIGTERM тоже останавливаем процессы-обработчики, а не бросаем их
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if hasattr(signal, 'SIGHUP'):
+        def reload_logs(signum, frame):
+            # Настройки журнала перечитывают процессы-обработчики
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGHUP)
+
+        signal.signal(signal.SIGHUP, reload_logs)
+
+    try:
+        # Без любого из процессов кластер неполон - останавливаем все
+        while all(worker.is_alive() for worker in workers):
+            time.sleep(1)
+        print("Один из процессов сервера завершился")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+        print("Сервер остановлен")
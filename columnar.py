@@ -0,0 +1,413 @@
+"""Колоночный формат снимка событий для открытия через mmap.
+
+Снимок не загружается в память целиком: файл отображается в память, а
+колонки и индексы читаются на месте через memoryview. Записи EventRecord
+создаются только для событий, которые действительно попали в ответ,
+поэтому время запуска не зависит от числа событий.
+
+Строки файла упорядочены по (локальное время начала, ID), так что колонка
+local_start одновременно служит упорядоченным индексом по датам, а списки
+строк организатора и статуса уже отсортированы в порядке выдачи.
+
+Разделы файла (числа - little-endian, каждый раздел выровнен по 8 байт):
+- таблица строк: смещения (q), данные UTF-8 и хеш-таблица строка -> номер;
+- колонки по строкам: start, end, local_start, created_at, updated_at (q),
+  start_offset, end_offset (i, NO_OFFSET - пояс не задан), ссылки на строки
+  event_id, title, description, location, organizer, status (I),
+  начало списка участников (q, строк + 1) и сами списки участников (I);
+- каталог ID: отсортированные ссылки на строки ID и номера строк;
+- каталоги организаторов и статусов: ключи, границы и списки строк;
+- каталог участников: запланированные события каждого участника,
+  отсортированные по началу (строки и начала), и наибольшая длительность;
+- серии (повторяющиеся события): их немного, поэтому они не входят в
+  строки и каталоги, а хранятся списком кортежей EventRecord.to_row в
+  pickle и загружаются в память целиком;
+- колонка version (q) - номер версии события.
+
+Снимки предыдущих версий формата (CALCOL01 без раздела серий и CALCOL02
+без колонки версий) читаются, версия их событий считается равной 1.
+"""
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from records import EventRecord
+
+
+MAGIC = b'CALCOL03'
+NO_OFFSET = -2 ** 31
+
+_SECTIONS = (
+    'string_offsets', 'string_data', 'string_hash',
+    'start', 'end', 'local_start', 'created_at', 'updated_at', 'start_offset', 'end_offset',
+    'event_id', 'title', 'description', 'location', 'organizer', 'status',
+    'attendee_bounds', 'attendees',
+    'id_keys', 'id_rows',
+    'organizer_keys', 'organizer_bounds', 'organizer_rows',
+    'status_keys', 'status_bounds', 'status_rows',
+    'attendee_keys', 'attendee_bounds_dir', 'attendee_rows', 'attendee_starts', 'attendee_max_duration',
+    'series', 'version',
+)
+_TYPECODES = {
+    'string_offsets': 'q', 'string_data': 'B', 'string_hash': 'I',
+    'start': 'q', 'end': 'q', 'local_start': 'q', 'created_at': 'q', 'updated_at': 'q',
+    'start_offset': 'i', 'end_offset': 'i',
+    'event_id': 'I', 'title': 'I', 'description': 'I', 'location': 'I', 'organizer': 'I', 'status': 'I',
+    'attendee_bounds': 'q', 'attendees': 'I',
+    'id_keys': 'I', 'id_rows': 'I',
+    'organizer_keys': 'I', 'organizer_bounds': 'q', 'organizer_rows': 'I',
+    'status_keys': 'I', 'status_bounds': 'q', 'status_rows': 'I',
+    'attendee_keys': 'I', 'attendee_bounds_dir': 'q', 'attendee_rows': 'I',
+    'attendee_starts': 'q', 'attendee_max_duration': 'q',
+    'series': 'B', 'version': 'q',
+}
+# Разделы каждой версии формата
+_FORMATS = {b'CALCOL01': _SECTIONS[:-2], b'CALCOL02': _SECTIONS[:-1], MAGIC: _SECTIONS}
+
+
+def _header(sections: Tuple[str, ...]) -> struct.Struct:
+    """Заголовок: магическое число, ревизия, число событий и (смещение, длина) разделов"""
+    return struct.Struct('<8sQQ' + 'QQ' * len(sections))
+
+
+_HEADER = _header(_SECTIONS)
+
+
+def _string_hash(data: bytes) -> int:
+    return zlib.crc32(data)
+
+
+class _Directory:
+    """Каталог ключ (ссылка на строку) -> срез списка строк в процессе записи"""
+
+    def __init__(self):
+        self.rows: Dict[int, array] = {}
+
+    def add(self, key: int, row: int):
+        rows = self.rows.get(key)
+        if rows is None:
+            rows = self.rows[key] = array('I')
+        rows.append(row)
+
+    def build(self) -> Tuple[array, array, array]:
+        keys = array('I', sorted(self.rows))
+        bounds = array('q', [0])
+        postings = array('I')
+        for key in keys:
+            postings.extend(self.rows[key])
+            bounds.append(len(postings))
+        return keys, bounds, postings
+
+
+def write_columnar(path: str, revision: int, records: Iterable[EventRecord]):
+    """Записывает снимок; records должны идти в порядке (local_start, event_id)"""
+    strings: Dict[str, int] = {}
+    string_data = bytearray()
+    string_offsets = array('q', [0])
+
+    def ref(value: str) -> int:
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+            string_data.extend(value.encode())
+            string_offsets.append(len(string_data))
+        return index
+
+    columns = {name: array(_TYPECODES[name]) for name in (
+        'start', 'end', 'local_start', 'created_at', 'updated_at', 'start_offset', 'end_offset',
+        'event_id', 'title', 'description', 'location', 'organizer', 'status', 'attendees', 'version',
+    )}
+    attendee_bounds = array('q', [0])
+    organizers = _Directory()
+    statuses = _Directory()
+    # Для участников копим (начало, строка) и длительности запланированных событий
+    timelines: Dict[int, List[Tuple[int, int]]] = {}
+    max_durations: Dict[int, int] = {}
+
+    series = []
+    previous = None
+    for event in records:
+        if event.recurrence is not None:
+            series.append(event.to_row())
+            continue
+        row = len(columns['start'])
+        position = (event.local_start, event.event_id)
+        if previous is not None and position <= previous:
+            raise ValueError("События снимка должны быть упорядочены по (local_start, event_id)")
+        previous = position
+
+        columns['start'].append(event.start)
+        columns['end'].append(event.end)
+        columns['local_start'].append(event.local_start)
+        columns['created_at'].append(event.created_at)
+        columns['updated_at'].append(event.updated_at)
+        columns['version'].append(event.version)
+        columns['start_offset'].append(NO_OFFSET if event.start_offset is None else event.start_offset)
+        columns['end_offset'].append(NO_OFFSET if event.end_offset is None else event.end_offset)
+        columns['event_id'].append(ref(event.event_id))
+        columns['title'].append(ref(event.title))
+        columns['description'].append(ref(event.description))
+        columns['location'].append(ref(event.location))
+        organizer = ref(event.organizer)
+        status = ref(event.status)
+        columns['organizer'].append(organizer)
+        columns['status'].append(status)
+        organizers.add(organizer, row)
+        statuses.add(status, row)
+
+        attendees = [ref(attendee) for attendee in event.attendees]
+        columns['attendees'].extend(attendees)
+        attendee_bounds.append(len(columns['attendees']))
+        if event.status == 'scheduled':
+            duration = event.end - event.start
+            for attendee in set(attendees):
+                timelines.setdefault(attendee, []).append((event.start, row))
+                if duration > max_durations.get(attendee, 0):
+                    max_durations[attendee] = duration
+
+    count = len(columns['start'])
+    sections = dict(columns)
+    sections['attendee_bounds'] = attendee_bounds
+    sections['string_offsets'] = string_offsets
+    sections['string_data'] = array('B', string_data)
+
+    # Хеш-таблица с открытой адресацией: номер строки + 1, 0 - пустая ячейка
+    size = 1
+    while size < 2 * len(strings) + 1:
+        size *= 2
+    string_hash = array('I', bytes(4 * size))
+    for value, index in strings.items():
+        slot = _string_hash(value.encode()) & (size - 1)
+        while string_hash[slot]:
+            slot = (slot + 1) & (size - 1)
+        string_hash[slot] = index + 1
+    sections['string_hash'] = string_hash
+
+    ids = sorted(range(count), key=columns['event_id'].__getitem__)
+    sections['id_keys'] = array('I', (columns['event_id'][row] for row in ids))
+    sections['id_rows'] = array('I', ids)
+    sections['organizer_keys'], sections['organizer_bounds'], sections['organizer_rows'] = organizers.build()
+    sections['status_keys'], sections['status_bounds'], sections['status_rows'] = statuses.build()
+
+    attendee_keys = array('I', sorted(timelines))
+    attendee_bounds_dir = array('q', [0])
+    attendee_rows = array('I')
+    attendee_starts = array('q')
+    attendee_max_duration = array('q')
+    for attendee in attendee_keys:
+        timeline = sorted(timelines[attendee])
+        attendee_starts.extend(start for start, _ in timeline)
+        attendee_rows.extend(row for _, row in timeline)
+        attendee_bounds_dir.append(len(attendee_rows))
+        attendee_max_duration.append(max_durations.get(attendee, 0))
+    sections['attendee_keys'] = attendee_keys
+    sections['attendee_bounds_dir'] = attendee_bounds_dir
+    sections['attendee_rows'] = attendee_rows
+    sections['attendee_starts'] = attendee_starts
+    sections['attendee_max_duration'] = attendee_max_duration
+    sections['series'] = array('B', pickle.dumps(series, pickle.HIGHEST_PROTOCOL))
+
+    with open(path, 'wb') as f:
+        f.write(bytes(_HEADER.size))
+        layout = []
+        for name in _SECTIONS:
+            padding = -f.tell() % 8
+            f.write(bytes(padding))
+            offset = f.tell()
+            data = sections[name].tobytes()
+            f.write(data)
+            layout.extend((offset, len(data)))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, revision, count, *layout))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ColumnarSnapshot:
+    """Снимок событий, открытый через mmap; все чтения идут напрямую из файла"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._sections = _FORMATS.get(self._mmap[:len(MAGIC)])
+        if self._sections is None:
+            raise ValueError(f"Неизвестный формат снимка: {path}")
+        header = _header(self._sections).unpack_from(self._mmap, 0)
+        self.revision = header[1]
+        self._count = header[2]
+
+        view = memoryview(self._mmap)
+        # В снимках до CALCOL03 колонки версий нет
+        self._version = None
+        for i, name in enumerate(self._sections):
+            offset, length = header[3 + 2 * i], header[4 + 2 * i]
+            section = view[offset:offset + length]
+            typecode = _TYPECODES[name]
+            setattr(self, '_' + name, section if typecode == 'B' else section.cast(typecode))
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        for name in self._sections:
+            getattr(self, '_' + name).release()
+        self._mmap.close()
+
+    def string(self, index: int) -> str:
+        offsets = self._string_offsets
+        return str(self._string_data[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def string_ref(self, value: str) -> Optional[int]:
+        """Номер строки в таблице, None если такой строки в снимке нет"""
+        data = value.encode()
+        table = self._string_hash
+        mask = len(table) - 1
+        slot = _string_hash(data) & mask
+        offsets = self._string_offsets
+        while True:
+            entry = table[slot]
+            if not entry:
+                return None
+            index = entry - 1
+            if self._string_data[offsets[index]:offsets[index + 1]] == data:
+                return index
+            slot = (slot + 1) & mask
+
+    def _lookup(self, keys, bounds, value: str) -> Tuple[int, int]:
+        """Границы списка строк для значения в каталоге"""
+        key = self.string_ref(value)
+        if key is None:
+            return 0, 0
+        pos = bisect_left(keys, key)
+        if pos == len(keys) or keys[pos] != key:
+            return 0, 0
+        return bounds[pos], bounds[pos + 1]
+
+    def find(self, event_id: str) -> Optional[int]:
+        """Номер строки события по ID"""
+        key = self.string_ref(event_id)
+        if key is None:
+            return None
+        pos = bisect_left(self._id_keys, key)
+        if pos == len(self._id_keys) or self._id_keys[pos] != key:
+            return None
+        return self._id_rows[pos]
+
+    def event_id(self, row: int) -> str:
+        return self.string(self._event_id[row])
+
+    def end(self, row: int) -> int:
+        return self._end[row]
+
+    def record(self, row: int) -> EventRecord:
+        """Создает запись события для строки снимка"""
+        string = self.string
+        start_offset = self._start_offset[row]
+        end_offset = self._end_offset[row]
+        attendees = self._attendees[self._attendee_bounds[row]:self._attendee_bounds[row + 1]]
+        return EventRecord(
+            event_id=string(self._event_id[row]),
+            title=string(self._title[row]),
+            description=string(self._description[row]),
+            start=self._start[row],
+            end=self._end[row],
+            location=string(self._location[row]),
+            attendees=[string(attendee) for attendee in attendees],
+            organizer=string(self._organizer[row]),
+            status=string(self._status[row]),
+            created_at=self._created_at[row],
+            updated_at=self._updated_at[row],
+            start_offset=None if start_offset == NO_OFFSET else start_offset,
+            end_offset=None if end_offset == NO_OFFSET else end_offset,
+            version=1 if self._version is None else self._version[row]
+        )
+
+    def series(self) -> List[EventRecord]:
+        """Серии снимка (в строках и каталогах их нет)"""
+        if 'series' not in self._sections:
+            return []
+        return [EventRecord.from_row(row) for row in pickle.loads(self._series)]
+
+    def rows(self) -> range:
+        return range(self._count)
+
+    def overlapping(self, attendee: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """(начало, строка) запланированных событий участника, пересекающихся с [start, end)"""
+        key = self.string_ref(attendee)
+        if key is None:
+            return
+        pos = bisect_left(self._attendee_keys, key)
+        if pos == len(self._attendee_keys) or self._attendee_keys[pos] != key:
+            return
+        lo, hi = self._attendee_bounds_dir[pos], self._attendee_bounds_dir[pos + 1]
+        starts = self._attendee_starts[lo:hi]
+        # Тот же прием, что в индексе в памяти: дальше max_duration назад искать незачем
+        first = bisect_right(starts, start - self._attendee_max_duration[pos])
+        last = bisect_left(starts, end)
+        ends = self._end
+        rows = self._attendee_rows
+        for i in range(lo + first, lo + last):
+            row = rows[i]
+            if ends[row] > start:
+                yield starts[i - lo], row
+
+    def query(self, lower: Optional[int] = None, upper: Optional[int] = None,
+              organizer: str = '', status: str = '',
+              after: Optional[Tuple[int, str]] = None) -> Iterator[Tuple[int, str, int]]:
+        """Выдает (local_start, ID, строка) подходящих событий в порядке выдачи.
+
+        Как и планировщик хранилища, перебирает меньший из кандидатов:
+        диапазон колонки local_start или список строк организатора/статуса.
+        """
+        local_start = self._local_start
+        lo = 0 if lower is None else bisect_left(local_start, lower)
+        hi = self._count if upper is None else bisect_left(local_start, upper)
+        if after is not None:
+            lo = max(lo, bisect_left(local_start, after[0]))
+        hi = max(lo, hi)
+
+        organizer_ref = status_ref = None
+        plans = [(hi - lo, None)]
+        if organizer:
+            organizer_ref = self.string_ref(organizer)
+            if organizer_ref is None:
+                return
+            first, last = self._lookup(self._organizer_keys, self._organizer_bounds, organizer)
+            plans.append((last - first, self._organizer_rows[first:last]))
+        if status:
+            status_ref = self.string_ref(status)
+            if status_ref is None:
+                return
+            first, last = self._lookup(self._status_keys, self._status_bounds, status)
+            plans.append((last - first, self._status_rows[first:last]))
+        _, candidates = min(plans, key=lambda plan: plan[0])
+        if candidates is None:
+            candidates = range(lo, hi)
+
+        organizers = self._organizer
+        statuses = self._status
+        for row in candidates:
+            if row < lo:
+                continue
+            if row >= hi:
+                return
+            if organizer_ref is not None and organizers[row] != organizer_ref:
+                continue
+            if status_ref is not None and statuses[row] != status_ref:
+                continue
+            event_id = self.event_id(row)
+            if after is not None and (local_start[row], event_id) <= after:
+                continue
+            yield local_start[row], event_id, row
+
+    def count(self, lower: Optional[int] = None, upper: Optional[int] = None) -> int:
+        local_start = self._local_start
+        lo = 0 if lower is None else bisect_left(local_start, lower)
+        hi = self._count if upper is None else bisect_left(local_start, upper)
+        return max(0, hi - lo)
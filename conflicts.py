@@ -0,0 +1,246 @@
+"""Пакетная проверка конфликтов для BatchCreateEvents и импорта.
+
+Проверка одного события идет по индексу хранилища, но у пакета из сотен
+событий накладные расходы на каждое (блокировки, проход по участникам,
+создание записей) складываются. BulkConflictChecker один раз выбирает из
+хранилища события участников пакета за общий интервал времени, раскладывает
+их по участникам в отсортированные массивы NumPy int64 и отвечает на
+вопросы сразу для всех пар (событие пакета, участник) через searchsorted.
+
+Число пересечений интервала [s, e) с событиями участника равно числу
+событий, начавшихся до e, минус число событий, закончившихся не позже s
+(такие события начались еще раньше). Оба числа дает searchsorted по
+отсортированным началам и концам, поэтому событие пакета без конфликтов
+обходится без цикла Python; сами конфликтующие события ищутся только для
+пар с ненулевым числом пересечений.
+
+NumPy - необязательная зависимость: без него, как и для пакетов, где
+участники почти не повторяются, проверка выполняется по одному событию
+через индекс хранилища, с теми же результатами. Серии в пакете всегда
+проверяются по одному (EventStore.event_conflicts).
+
+Найденные конфликты передаются в EventStore.create вместе с ревизией
+хранилища, на которой они вычислены (checked), и хранилище не проверяет
+кандидата повторно, если с тех пор в нем ничего не менялось. Так же
+проверяется конечная серия в CreateEvent (check_series): ее вхождения -
+пакет событий одних участников.
+"""
+from itertools import islice
+from typing import Dict, List, Optional, Sequence
+
+from indexes import AttendeeIntervalIndex
+from records import EventRecord
+from recurrence import occurrence_starts, series_end
+from storage import CheckedConflicts, Conflicts, EventStore
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# С какого размера пакета проверка по массивам выгоднее проверки по одному
+BULK_THRESHOLD = 16
+
+# Сколько событий пакета в среднем должно приходиться на участника: выборка
+# событий участников из хранилища окупается, только если их проверяют
+# сразу для многих событий пакета
+MIN_EVENTS_PER_ATTENDEE = 8
+
+# До скольких вхождений серию выгодно проверять пакетом: проверка хранилищем
+# перебирает только события участников за время серии, а пакетная - еще и
+# каждое вхождение, поэтому длинные серии хранилище проверяет быстрее
+MAX_SERIES_OCCURRENCES = 500
+
+
+class BulkConflictChecker:
+    """Конфликты пакета событий-кандидатов с хранилищем и друг с другом.
+
+    Конфликты с хранилищем вычисляются при создании по его состоянию на этот
+    момент, если пакет выгодно проверять целиком (тогда bulk истинно), иначе -
+    по одному при каждом вызове conflicts. События пакета сохраняются по
+    порядку, поэтому принятые события передаются в accept, и conflicts(i)
+    учитывает их для последующих кандидатов. Кандидаты, проверяемые по
+    одному, проверяются по текущему состоянию хранилища, где принятые
+    события уже есть.
+    """
+
+    def __init__(self, store: EventStore, candidates: Sequence[EventRecord]):
+        self.store = store
+        self.candidates = list(candidates)
+        # Ревизия хранилища, которой соответствуют конфликты вместе с принятыми событиями
+        self.revision = store.revision
+        self._stored = self._check_store()
+        self.bulk = self._stored is not None
+        self._accepted = AttendeeIntervalIndex()
+        self._accepted_events: Dict[str, EventRecord] = {}
+        # После принятой серии заранее вычисленные конфликты неполны
+        self._series_accepted = False
+
+    def conflicts(self, index: int) -> Conflicts:
+        """Конфликты кандидата index в том же виде, что у EventStore.find_conflicts"""
+        event = self.candidates[index]
+        if event.status != 'scheduled':
+            return []
+        if self._stored is None or event.recurrence is not None or self._series_accepted:
+            return self.store.event_conflicts(event)
+        found = list(self._stored[index])
+        if not self._accepted_events:
+            return found
+        overlaps = self._accepted.find_overlaps(event.start, event.end, event.attendees,
+                                                exclude_id=event.event_id)
+        if overlaps:
+            found.extend((self._accepted_events[event_id], common) for event_id, common in overlaps)
+            found.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+        return found
+
+    def checked(self, index: int) -> Optional[CheckedConflicts]:
+        """Конфликты кандидата index для EventStore.create; None - их проверит хранилище"""
+        event = self.candidates[index]
+        if self._stored is None or event.recurrence is not None or self._series_accepted:
+            return None
+        return CheckedConflicts(self.revision, self.conflicts(index))
+
+    def accept(self, event: EventRecord):
+        """Учитывает сохраненное событие пакета при проверке следующих кандидатов"""
+        self.revision += 1
+        if event.recurrence is not None:
+            self._series_accepted = True
+        elif event.status == 'scheduled':
+            self._accepted.add(event.event_id, event.start, event.end, event.attendees)
+            self._accepted_events[event.event_id] = event
+
+    def _check_store(self) -> Optional[List[Conflicts]]:
+        scheduled = [index for index, event in enumerate(self.candidates)
+                     if event.status == 'scheduled' and event.recurrence is None]
+        if np is None or len(scheduled) < BULK_THRESHOLD:
+            return None
+        found = self._find_bulk(scheduled)
+        if found is None:
+            return None
+
+        results: List[Conflicts] = []
+        for candidate, hits in zip(self.candidates, found):
+            conflicts = []
+            for (event_id, _), (event, attendees) in hits.items():
+                if event_id == candidate.event_id:
+                    continue
+                # Общие участники - в порядке участников кандидата, как у хранилища
+                common = [attendee for attendee in dict.fromkeys(candidate.attendees) if attendee in attendees]
+                conflicts.append((event, common))
+            conflicts.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+            results.append(conflicts)
+        return results
+
+    def _find_bulk(self, scheduled: List[int]) -> Optional[List[Dict[tuple, tuple]]]:
+        """Для каждого кандидата: (ID, начало) события -> (событие, множество общих участников).
+
+        Вхождения одной серии различаются началом.
+
+        Интервалы всех участников сводятся в одну числовую ось: участник с
+        номером k занимает на ней отрезок [k * span, (k + 1) * span), поэтому
+        один searchsorted отвечает сразу за все пары (кандидат, участник).
+        None - пакет невыгодно проверять целиком (участники почти не
+        повторяются или ось не помещается в int64), тогда проверка идет по одному.
+        """
+        codes: Dict[str, int] = {}
+        pair_candidates: List[int] = []
+        pair_codes: List[int] = []
+        for index in scheduled:
+            for attendee in dict.fromkeys(self.candidates[index].attendees):
+                pair_candidates.append(index)
+                pair_codes.append(codes.setdefault(attendee, len(codes)))
+        if len(pair_codes) < MIN_EVENTS_PER_ATTENDEE * len(codes):
+            return None
+
+        # Все события, которые могут пересечься с пакетом, - одним запросом к хранилищу
+        lower = min(self.candidates[index].start for index in scheduled)
+        upper = max(self.candidates[index].end for index in scheduled)
+        existing = self.store.find_conflicts(lower, upper, codes)
+        max_duration = max((event.end - event.start for event, _ in existing), default=0)
+        origin = lower - max_duration
+        span = upper - origin + max_duration + 1
+        if span * len(codes) >= 2 ** 62:
+            return None
+
+        event_numbers: List[int] = []
+        keys: List[int] = []
+        end_keys: List[int] = []
+        for number, (event, common) in enumerate(existing):
+            for attendee in common:
+                offset = codes[attendee] * span - origin
+                event_numbers.append(number)
+                keys.append(event.start + offset)
+                end_keys.append(event.end + offset)
+
+        order = np.argsort(np.array(keys, dtype=np.int64), kind='stable')
+        starts = np.array(keys, dtype=np.int64)[order]
+        ends = np.array(end_keys, dtype=np.int64)[order]
+        numbers = np.array(event_numbers, dtype=np.int64)[order]
+        sorted_ends = np.sort(ends)
+
+        offsets = np.array(pair_codes, dtype=np.int64) * span - origin
+        candidate_starts = np.fromiter((self.candidates[index].start for index in pair_candidates),
+                                       dtype=np.int64, count=len(pair_candidates)) + offsets
+        candidate_ends = np.fromiter((self.candidates[index].end for index in pair_candidates),
+                                     dtype=np.int64, count=len(pair_candidates)) + offsets
+        # Пересечений = начались до конца кандидата - закончились не позже его начала
+        his = np.searchsorted(starts, candidate_ends, 'left')
+        counts = his - np.searchsorted(sorted_ends, candidate_starts, 'right')
+        los = np.searchsorted(starts, candidate_starts - max_duration, 'right')
+
+        # Окна пар с пересечениями разворачиваются в один массив позиций
+        pairs = np.flatnonzero(counts > 0)
+        lengths = his[pairs] - los[pairs]
+        pair_of = np.repeat(pairs, lengths)
+        positions = np.arange(len(pair_of)) + np.repeat(los[pairs] - (np.cumsum(lengths) - lengths), lengths)
+        hit = ends[positions] > candidate_starts[pair_of]
+
+        names = list(codes)
+        found: List[Dict[tuple, tuple]] = [{} for _ in self.candidates]
+        for pair, number in zip(pair_of[hit].tolist(), numbers[positions[hit]].tolist()):
+            event = existing[number][0]
+            attendee = names[pair_codes[pair]]
+            candidate_hits = found[pair_candidates[pair]]
+            key = (event.event_id, event.start)
+            entry = candidate_hits.get(key)
+            if entry is None:
+                candidate_hits[key] = (event, {attendee})
+            else:
+                entry[1].add(attendee)
+        return found
+
+
+def check_series(store: EventStore, event: EventRecord) -> Optional[CheckedConflicts]:
+    """Конфликты конечной серии event для EventStore.create.
+
+    Вхождения серии проверяются BulkConflictChecker как пакет, пересечения
+    с другими сериями - SeriesIndex.series_conflicts, как в хранилище. None -
+    серия бесконечна, длиннее MAX_SERIES_OCCURRENCES вхождений или ее
+    невыгодно проверять пакетом, тогда ее проверит хранилище.
+    """
+    if event.recurrence is None or event.status != 'scheduled':
+        return None
+    end = series_end(event)
+    if end is None:
+        return None
+    starts = list(islice(occurrence_starts(event, event.start, end), MAX_SERIES_OCCURRENCES + 1))
+    if len(starts) > MAX_SERIES_OCCURRENCES:
+        return None
+    # Вхождения проверяются как обычные события тех же участников
+    single = event.replace(recurrence=None)
+    duration = event.end - event.start
+    occurrences = [single.moved(start, start + duration) for start in starts]
+    checker = BulkConflictChecker(store, occurrences)
+    if not checker.bulk:
+        return None
+
+    # Обычное событие конфликтует с серией один раз, сколько бы вхождений оно ни задело
+    found: Dict[str, tuple] = {}
+    for index in range(len(occurrences)):
+        for other, common in checker.conflicts(index):
+            if other.recurrence is None:
+                found.setdefault(other.event_id, (other, common))
+    conflicts = list(found.values()) + store.series.series_conflicts(event)
+    conflicts.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+    return CheckedConflicts(checker.revision, conflicts)
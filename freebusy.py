@@ -0,0 +1,62 @@
+"""Занятое и свободное время участников.
+
+Занятость вычисляется по запланированным событиям (status == 'scheduled'),
+как и при проверке конфликтов: интервалы событий участников, пересекающихся
+с окном, берутся из того же индекса хранилища (EventStore.busy_intervals)
+без создания записей событий, после чего интервалы каждого участника и всех
+участников вместе объединяются проходом по началам (sweep line). Стоимость
+запроса пропорциональна числу событий участников в окне, а не размеру
+календаря.
+"""
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from storage import EventStore
+
+Interval = Tuple[int, int]
+
+# Максимальная длина окна поиска
+MAX_WINDOW = 366 * 86400 * 1_000_000
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Объединяет пересекающиеся и смежные интервалы, результат - в порядке начала"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def busy_by_attendee(store: EventStore, start: int, end: int,
+                     attendees: Iterable[str]) -> Dict[str, List[Interval]]:
+    """Объединенные интервалы занятости каждого участника, обрезанные по окну [start, end)"""
+    return {
+        attendee: merge_intervals((max(busy_start, start), min(busy_end, end)) for busy_start, busy_end in busy)
+        for attendee, busy in store.busy_intervals(start, end, attendees).items()
+    }
+
+
+def merged_busy(store: EventStore, start: int, end: int, attendees: Iterable[str]) -> List[Interval]:
+    """Объединенные интервалы, когда занят хотя бы один из участников"""
+    busy = store.busy_intervals(start, end, attendees)
+    return merge_intervals(interval for intervals in busy.values() for interval in intervals)
+
+
+def free_slots(busy: List[Interval], start: int, end: int, duration: int, granularity: int,
+               offset: int = 0) -> Iterator[Interval]:
+    """Выдает слоты длины duration внутри [start, end), не пересекающие busy.
+
+    busy - объединенные интервалы в порядке начала. Начала слотов кратны
+    granularity по часам пояса со смещением offset (в микросекундах).
+    """
+    free_from = start
+    for busy_start, busy_end in busy + [(end, end)]:
+        # Первое выровненное начало не раньше начала свободного промежутка
+        slot = -(-(free_from + offset) // granularity) * granularity - offset
+        while slot + duration <= busy_start:
+            yield slot, slot + duration
+            slot += granularity
+        free_from = max(free_from, busy_end)
@@ -0,0 +1,267 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class _Timeline:
+    """Отсортированные по началу интервалы событий одного участника.
+
+    Интервалы хранятся одним списком кортежей (начало, конец, ID), как в
+    SortedIndex: читатели без блокировок берут срез списка целиком и не
+    могут сопоставить начало одного события с концом или ID другого.
+    """
+
+    __slots__ = ('entries', 'durations', 'max_duration')
+
+    def __init__(self):
+        self.entries: List[Tuple[int, int, str]] = []
+        # Счетчик длительностей позволяет уменьшать max_duration при удалении
+        self.durations: Dict[int, int] = {}
+        self.max_duration = 0
+
+    def add(self, event_id: str, start: int, end: int):
+        insort(self.entries, (start, end, event_id))
+
+        duration = end - start
+        self.durations[duration] = self.durations.get(duration, 0) + 1
+        if duration > self.max_duration:
+            self.max_duration = duration
+
+    def finish_load(self):
+        """Пересчитывает длительности после заполнения списка по порядку"""
+        self.durations = dict(Counter(end - start for start, end, _ in self.entries))
+        self.max_duration = max(self.durations, default=0)
+
+    def remove(self, event_id: str, start: int, end: int) -> bool:
+        entry = (start, end, event_id)
+        pos = bisect_left(self.entries, entry)
+        if pos == len(self.entries) or self.entries[pos] != entry:
+            return False
+        del self.entries[pos]
+
+        duration = end - start
+        left = self.durations[duration] - 1
+        if left:
+            self.durations[duration] = left
+        else:
+            del self.durations[duration]
+            if duration == self.max_duration:
+                self.max_duration = max(self.durations, default=0)
+        return True
+
+    def _window(self, start: int, end: int) -> List[Tuple[int, int, str]]:
+        """Срез интервалов, начавшихся в [start - max_duration, end)"""
+        # Любое событие длится не дольше max_duration, поэтому события,
+        # начавшиеся раньше start - max_duration, закончились до start
+        entries = self.entries
+        lo = bisect_left(entries, (start - self.max_duration,))
+        hi = bisect_left(entries, (end,))
+        return entries[lo:hi]
+
+    def overlapping(self, start: int, end: int) -> Iterable[Tuple[int, str]]:
+        """Возвращает (начало, ID) событий, пересекающихся с [start, end)"""
+        return [(s, event_id) for s, e, event_id in self._window(start, end) if e > start]
+
+    def intervals(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """(начало, конец) событий, пересекающихся с [start, end), в порядке начала"""
+        return [(s, e) for s, e, _ in self._window(start, end) if e > start]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class AttendeeIntervalIndex:
+    """Индекс интервалов запланированных событий по участникам.
+
+    Для каждого участника хранится отсортированная по времени начала
+    временная шкала, поэтому проверка конфликтов затрагивает только события
+    с общими участниками, пересекающиеся с запрошенным интервалом.
+    """
+
+    def __init__(self):
+        self._timelines: Dict[str, _Timeline] = {}
+
+    def add(self, event_id: str, start: int, end: int, attendees: Iterable[str]):
+        """Добавляет событие в шкалы всех его участников"""
+        for attendee in set(attendees):
+            timeline = self._timelines.get(attendee)
+            if timeline is None:
+                timeline = self._timelines[attendee] = _Timeline()
+            timeline.add(event_id, start, end)
+
+    def load(self, events: Iterable[Tuple[str, int, int, Iterable[str]]]):
+        """Строит индекс заново по (ID, начало, конец, участники).
+
+        События один раз сортируются по началу и дописываются в конец шкал,
+        поэтому шкалы не приходится сортировать или вставлять в середину.
+        """
+        timelines: Dict[str, _Timeline] = {}
+        for event_id, start, end, attendees in sorted(events, key=itemgetter(1, 2, 0)):
+            for attendee in set(attendees):
+                timeline = timelines.get(attendee)
+                if timeline is None:
+                    timeline = timelines[attendee] = _Timeline()
+                timeline.entries.append((start, end, event_id))
+        for timeline in timelines.values():
+            timeline.finish_load()
+        self._timelines = timelines
+
+    def intervals(self, attendee: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """(начало, конец) событий участника, пересекающихся с [start, end), в порядке начала"""
+        timeline = self._timelines.get(attendee)
+        if timeline is None:
+            return []
+        return timeline.intervals(start, end)
+
+    def remove(self, event_id: str, start: int, end: int, attendees: Iterable[str]):
+        """Удаляет событие из шкал всех его участников"""
+        for attendee in set(attendees):
+            timeline = self._timelines.get(attendee)
+            if timeline is None:
+                continue
+            timeline.remove(event_id, start, end)
+            if not timeline:
+                del self._timelines[attendee]
+
+    def find_overlaps(self, start: int, end: int, attendees: Iterable[str],
+                      exclude_id: Optional[str] = None) -> List[Tuple[str, List[str]]]:
+        """Находит события, пересекающиеся с [start, end) по общим участникам.
+
+        Возвращает пары (ID события, общие участники) в порядке начала событий.
+        """
+        found: Dict[str, Tuple[int, List[str]]] = {}
+        for attendee in dict.fromkeys(attendees):
+            timeline = self._timelines.get(attendee)
+            if timeline is None:
+                continue
+            for existing_start, existing_id in timeline.overlapping(start, end):
+                if existing_id == exclude_id:
+                    continue
+                entry = found.get(existing_id)
+                if entry is None:
+                    found[existing_id] = (existing_start, [attendee])
+                else:
+                    entry[1].append(attendee)
+
+        ordered = sorted(found.items(), key=lambda item: (item[1][0], item[0]))
+        return [(existing_id, common) for existing_id, (_, common) in ordered]
+
+    def clear(self):
+        self._timelines.clear()
+
+
+class SortedIndex:
+    """Упорядоченный индекс событий по целочисленному ключу (например, времени начала).
+
+    Элементы хранятся одним списком пар (ключ, ID события): вставка, удаление,
+    бинарный поиск и срез списка выполняются атомарно относительно GIL, поэтому
+    читатели могут обходить индекс без блокировок, пока писатель его меняет.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[int, str]] = []
+
+    def add(self, key: int, event_id: str):
+        insort(self._entries, (key, event_id))
+
+    def load(self, entries: Iterable[Tuple[int, str]]):
+        """Заменяет содержимое индекса парами (ключ, ID) с одной сортировкой"""
+        self._entries = sorted(entries)
+
+    def remove(self, key: int, event_id: str) -> bool:
+        entry = (key, event_id)
+        pos = bisect_left(self._entries, entry)
+        if pos < len(self._entries) and self._entries[pos] == entry:
+            del self._entries[pos]
+            return True
+        return False
+
+    def _bounds(self, lower: Optional[int], upper: Optional[int]) -> Tuple[int, int]:
+        lo = 0 if lower is None else bisect_left(self._entries, (lower,))
+        hi = len(self._entries) if upper is None else bisect_left(self._entries, (upper,))
+        return lo, max(lo, hi)
+
+    def scan(self, lower: Optional[int] = None, upper: Optional[int] = None,
+             after: Optional[Tuple[int, str]] = None,
+             chunk_size: int = 256) -> Iterator[Tuple[int, str]]:
+        """Лениво перебирает пары (ключ, ID) с ключом в [lower, upper) по возрастанию.
+
+        after = (ключ, ID) продолжает перебор строго после этой позиции.
+        Позиция пересчитывается бинарным поиском для каждой порции, поэтому
+        изменения индекса во время перебора не сбивают его.
+        """
+        position = after
+        if lower is not None and (position is None or position < (lower,)):
+            pos = bisect_left(self._entries, (lower,))
+        elif position is not None:
+            pos = bisect_right(self._entries, position)
+        else:
+            pos = 0
+
+        while True:
+            chunk = self._entries[pos:pos + chunk_size]
+            for entry in chunk:
+                if upper is not None and entry[0] >= upper:
+                    return
+                yield entry
+            if len(chunk) < chunk_size:
+                return
+            # Продолжаем с позиции после последнего выданного элемента
+            pos = bisect_right(self._entries, chunk[-1])
+
+    def count(self, lower: Optional[int] = None, upper: Optional[int] = None) -> int:
+        """Число событий с ключом в [lower, upper)"""
+        lo, hi = self._bounds(lower, upper)
+        return hi - lo
+
+    def range(self, lower: Optional[int] = None, upper: Optional[int] = None) -> List[str]:
+        """ID событий с ключом в [lower, upper) в порядке возрастания ключа"""
+        lo, hi = self._bounds(lower, upper)
+        return [event_id for _, event_id in self._entries[lo:hi]]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class HashIndex:
+    """Индекс событий по точному значению поля (организатор, статус)"""
+
+    def __init__(self):
+        self._buckets: Dict[str, set] = {}
+
+    def add(self, value: str, event_id: str):
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            bucket = self._buckets[value] = set()
+        bucket.add(event_id)
+
+    def load(self, entries: Iterable[Tuple[str, str]]):
+        """Заменяет содержимое индекса парами (значение, ID)"""
+        self._buckets = {}
+        for value, event_id in entries:
+            bucket = self._buckets.get(value)
+            if bucket is None:
+                bucket = self._buckets[value] = set()
+            bucket.add(event_id)
+
+    def remove(self, value: str, event_id: str):
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            return
+        bucket.discard(event_id)
+        if not bucket:
+            del self._buckets[value]
+
+    def count(self, value: str) -> int:
+        bucket = self._buckets.get(value)
+        return 0 if bucket is None else len(bucket)
+
+    def get(self, value: str) -> set:
+        return self._buckets.get(value, set())
+
+    def clear(self):
+        self._buckets.clear()
@@ -0,0 +1,226 @@
+"""Структурный журнал запросов сервера.
+
+print в обработчиках пишет в stdout под его блокировкой, поэтому под
+нагрузкой все потоки сервера выстраиваются в очередь за выводом, и для
+дешевых вызовов вроде GetEvent вывод стоит дороже самого запроса.
+
+RequestLog не пишет на пути запроса: вызов log.info(...) проверяет уровень,
+выборку и ограничение частоты и кладет запись в ограниченную очередь, а
+форматирует и выводит записи фоновый поток, пачками. Если очередь полна,
+запись отбрасывается, а не ждет места: журнал никогда не задерживает ответ.
+
+Записи - строки JSON (или текст для чтения глазами) с временем, уровнем,
+методом, сообщением и полями. Настраиваются:
+- level - наименьший уровень записей (debug, info, warning, error, off);
+- methods - уровень отдельных методов, например {"GetEvent": "off"};
+- sample - доля записей уровня, которая выводится, например {"info": 0.01};
+- rate_limit - не больше стольких записей в секунду на метод для уровней
+  ниже warning (0 - без ограничения);
+- format - json или text.
+
+Настройки меняются на ходу (configure), а setup перечитывает файл
+настроек по SIGHUP. Счетчики выведенных и отброшенных записей
+приблизительны: их не защищает блокировка, чтобы не замедлять запись.
+"""
+import atexit
+import json
+import random
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, TextIO
+
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'off': 100}
+LEVEL_NAMES = {number: name for name, number in LEVELS.items()}
+DEBUG, INFO, WARNING, ERROR = LEVELS['debug'], LEVELS['info'], LEVELS['warning'], LEVELS['error']
+
+# Сколько записей ждут вывода, прежде чем новые начнут отбрасываться
+DEFAULT_QUEUE_SIZE = 10_000
+
+# Как часто фоновый поток выводит накопившиеся записи, секунды
+FLUSH_INTERVAL = 0.05
+
+
+def parse_level(name: str) -> int:
+    try:
+        return LEVELS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный уровень журнала: {name} (допустимы {', '.join(LEVELS)})") from None
+
+
+def parse_sampling(text: str) -> Dict[str, float]:
+    """'info=0.01,debug=0' -> {'info': 0.01, 'debug': 0.0}"""
+    sample = {}
+    for part in filter(None, text.split(',')):
+        name, _, rate = part.partition('=')
+        parse_level(name)
+        try:
+            sample[name] = float(rate)
+        except ValueError:
+            raise ValueError(f"Некорректная доля записей: {part}") from None
+        if not 0 <= sample[name] <= 1:
+            raise ValueError(f"Доля записей должна быть от 0 до 1: {part}")
+    return sample
+
+
+class RequestLog:
+    """Журнал с выводом в фоновом потоке, выборкой и ограничением частоты по методам"""
+
+    def __init__(self, stream: Optional[TextIO] = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+        # None - текущий sys.stdout (в том числе подмененный redirect_stdout)
+        self.stream = stream
+        self.queue_size = queue_size
+        self.written = 0
+        self.dropped = 0
+        self.sampled = 0
+        self.limited = 0
+        # (время, уровень, метод, сообщение, поля)
+        self._records = deque()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.configure({})
+
+    def configure(self, config: dict):
+        """Применяет настройки (ключи - как в файле настроек), ValueError - настройки некорректны"""
+        level = parse_level(config.get('level', 'info'))
+        methods = {method: parse_level(name) for method, name in config.get('methods', {}).items()}
+        sample = {parse_level(name): float(rate) for name, rate in config.get('sample', {}).items()}
+        rate_limit = float(config.get('rate_limit', 0))
+        output = config.get('format', 'json')
+        if output not in ('json', 'text'):
+            raise ValueError(f"Неизвестный формат журнала: {output}")
+        # Корзины ограничения частоты заводятся заново под новый предел
+        self._buckets: Dict[str, list] = {}
+        self.level, self.methods, self.sample = level, methods, sample
+        self.rate_limit, self.format = rate_limit, output
+
+    def set_method_level(self, method: str, name: str):
+        """Меняет уровень записей одного метода ('off' - выключает их)"""
+        self.methods = {**self.methods, method: parse_level(name)}
+
+    def enabled(self, method: str, level: int) -> bool:
+        return level >= self.methods.get(method, self.level)
+
+    def log(self, level: int, method: str, message: str, **fields):
+        """Ставит запись в очередь вывода, если она проходит уровень, выборку и ограничение частоты"""
+        if level < self.methods.get(method, self.level):
+            return
+        rate = self.sample.get(level)
+        if rate is not None and random.random() >= rate:
+            self.sampled += 1
+            return
+        if self.rate_limit and level < WARNING and not self._take(method):
+            self.limited += 1
+            return
+        if len(self._records) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._records.append((time.time(), level, method, message, fields))
+        if self._writer is None:
+            self._start()
+
+    def debug(self, method: str, message: str, **fields):
+        self.log(DEBUG, method, message, **fields)
+
+    def info(self, method: str, message: str, **fields):
+        self.log(INFO, method, message, **fields)
+
+    def warning(self, method: str, message: str, **fields):
+        self.log(WARNING, method, message, **fields)
+
+    def error(self, method: str, message: str, **fields):
+        self.log(ERROR, method, message, **fields)
+
+    def _take(self, method: str) -> bool:
+        """Корзина маркеров метода: до rate_limit записей в секунду со всплеском в секунду записей"""
+        now = time.monotonic()
+        bucket = self._buckets.get(method)
+        if bucket is None:
+            bucket = self._buckets[method] = [self.rate_limit, now]
+        tokens = min(self.rate_limit, bucket[0] + (now - bucket[1]) * self.rate_limit)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, daemon=True)
+                self._writer.start()
+                # Записи, поставленные перед выходом, выводятся
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Выводит все записи, ожидающие в очереди"""
+        with self._lock:
+            lines = []
+            while self._records:
+                lines.append(self._format(*self._records.popleft()))
+            if not lines:
+                return
+            stream = self.stream or sys.stdout
+            try:
+                stream.write(''.join(lines))
+                stream.flush()
+            except (OSError, ValueError):
+                # Вывод закрыт - записи теряются, сервер продолжает работу
+                self.dropped += len(lines)
+                return
+            self.written += len(lines)
+
+    def _format(self, timestamp: float, level: int, method: str, message: str, fields: dict) -> str:
+        moment = datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds')
+        if self.format == 'text':
+            details = ''.join(f' {name}={value}' for name, value in fields.items())
+            return f"{moment} {LEVEL_NAMES[level].upper()} {method}: {message}{details}\n"
+        record = {'time': moment, 'level': LEVEL_NAMES[level], 'method': method, 'message': message}
+        record.update(fields)
+        return json.dumps(record, ensure_ascii=False, default=str) + '\n'
+
+    def stats(self) -> Dict[str, int]:
+        """Выведенные записи и записи, отброшенные выборкой, ограничением частоты и переполнением"""
+        return {'written': self.written, 'sampled': self.sampled, 'limited': self.limited,
+                'dropped': self.dropped, 'queued': len(self._records)}
+
+
+def read_config(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def setup(config: dict, path: Optional[str] = None):
+    """Настраивает журнал процесса: config, поверх него - файл path.
+
+    С path файл перечитывается по SIGHUP, так что уровни методов, выборку
+    и ограничение частоты можно менять, не перезапуская сервер.
+    """
+    def apply():
+        log.configure({**config, **(read_config(path) if path else {})})
+
+    apply()
+    if path and hasattr(signal, 'SIGHUP'):
+        def reload(signum, frame):
+            try:
+                apply()
+            except (OSError, ValueError) as e:
+                log.error('server', "Настройки журнала не применены", path=path, error=str(e))
+            else:
+                log.warning('server', "Настройки журнала перечитаны", path=path)
+
+        signal.signal(signal.SIGHUP, reload)
+
+
+# Журнал запросов процесса
+log = RequestLog()
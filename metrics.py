@@ -0,0 +1,431 @@
+"""Метрики сервера в формате Prometheus и время внутренних этапов запросов.
+
+ServerMetrics собирает по каждому методу gRPC:
+- гистограмму задержки вызова (calendar_rpc_duration_seconds);
+- число выполняющихся вызовов (calendar_rpc_in_flight);
+- число завершенных вызовов по коду ответа (calendar_rpc_total);
+- число и суммарный размер принятых и отправленных сообщений.
+
+Данные собирают перехватчики сервера (MetricsInterceptor для пула потоков,
+AsyncMetricsInterceptor для grpc.aio), обработчики сервиса о них не знают.
+Размеры сообщений берутся из байтов, которые и так проходят через сеть:
+перехватчик оборачивает разбор запроса и сериализацию ответа.
+
+Состояние хранилища и кеша ответов (число событий, ревизия, попадания и
+промахи кеша) снимается в момент запроса метрик. Текст метрик отдает
+HTTP-сервер на локальном порту (start_http_server, путь /metrics).
+
+Время внутренних этапов - проверки запроса, проверки конфликтов, записи в
+хранилище, ожидания журнала и сериализации - замеряется блоками
+`with phase('...')` и копится в гистограмме calendar_phase_duration_seconds,
+только если этапы включены (PHASES.enable()). Выключенный этап стоит
+одного вызова функции.
+"""
+import asyncio
+import bisect
+import contextlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import grpc
+import grpc.aio
+
+
+# Границы корзин гистограмм задержки, секунды
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Метки метрики: ((имя, значение), ...)
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как histogram в Prometheus)"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+
+    def samples(self, name: str, labels: Labels) -> List[str]:
+        """Строки текстового формата: накопленные корзины, сумма и число наблюдений"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.total
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            bucket_labels = labels + (('le', format_value(bound)),)
+            lines.append(f'{name}_bucket{format_labels(bucket_labels)} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {total!r}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MethodStats:
+    """Счетчики одного метода gRPC"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.in_flight = 0
+        self.codes: Dict[str, int] = {}
+        self.received_messages = 0
+        self.received_bytes = 0
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, code: str, elapsed: float):
+        self.latency.observe(elapsed)
+        with self._lock:
+            self.in_flight -= 1
+            self.codes[code] = self.codes.get(code, 0) + 1
+
+    def received(self, size: int):
+        with self._lock:
+            self.received_messages += 1
+            self.received_bytes += size
+
+    def sent(self, size: int):
+        with self._lock:
+            self.sent_messages += 1
+            self.sent_bytes += size
+
+
+class Phases:
+    """Время внутренних этапов обработки запросов; по умолчанию не замеряется"""
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def __call__(self, name: str):
+        """Контекстный менеджер, замеряющий этап name"""
+        if not self.enabled:
+            return _NO_SPAN
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return _Span(histogram)
+
+
+class _Span:
+    __slots__ = ('histogram', 'begin')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.begin)
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+# Этапы процесса: with phase('conflict_check'): ...
+PHASES = phase = Phases()
+
+
+class ServerMetrics:
+    """Метрики сервера: вызовы методов, состояние сервиса и этапы запросов"""
+
+    def __init__(self, phases: Phases = PHASES):
+        self.phases = phases
+        self.methods: Dict[str, MethodStats] = {}
+        # (имя, справка, тип, функция -> [(метки, значение)]), вызываются при запросе метрик
+        self.collectors: List[Tuple[str, str, str, Callable[[], List[Tuple[Labels, float]]]]] = []
+        self._lock = threading.Lock()
+
+    def method(self, name: str) -> MethodStats:
+        stats = self.methods.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self.methods.setdefault(name, MethodStats())
+        return stats
+
+    def add_collector(self, name: str, help_text: str, kind: str,
+                      collect: Callable[[], List[Tuple[Labels, float]]]):
+        """Регистрирует метрику, значения которой вычисляются при каждом запросе метрик"""
+        self.collectors.append((name, help_text, kind, collect))
+
+    def watch_servicer(self, servicer):
+        """Экспортирует размер и ревизию хранилища, счетчики его планировщика запросов и кеша ответов сервиса"""
+        store, cache = servicer.store, servicer.cache
+        self.add_collector('calendar_store_events', "Число событий в хранилище", 'gauge',
+                           lambda: [((), len(store))])
+        self.add_collector('calendar_store_revision', "Номер последнего изменения хранилища", 'gauge',
+                           lambda: [((), store.revision)])
+        for counter, kind, help_text in (
+            ('entries', 'gauge', "Число ответов в кеше"),
+            ('bytes', 'gauge', "Суммарный размер ответов в кеше"),
+            ('hits', 'counter', "Попадания в кеш ответов"),
+            ('misses', 'counter', "Промахи кеша ответов"),
+            ('evictions', 'counter', "Ответы, вытесненные из кеша по размеру или времени"),
+            ('invalidations', 'counter', "Ответы, вытесненные из кеша изменениями хранилища"),
+        ):
+            suffix = '_total' if kind == 'counter' else ''
+            self.add_collector(
+                f'calendar_cache_{counter}{suffix}', help_text, kind,
+                lambda counter=counter: [((('cache', name),), stats[counter])
+                                         for name, stats in cache.stats().items()]
+            )
+        for counter, help_text in (
+            ('queries', "Запросы событий по индексу, выбранному планировщиком"),
+            ('scanned', "Кандидаты, перебранные по выбранному индексу"),
+            ('returned', "Кандидаты, подошедшие под все условия запроса"),
+        ):
+            self.add_collector(
+                f'calendar_planner_{counter}_total', help_text, 'counter',
+                lambda counter=counter: [((('index', plan),), stats[counter])
+                                         for plan, stats in store.planner_stats().items()]
+            )
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        methods = sorted(self.methods.items())
+        lines = []
+
+        def family(name: str, help_text: str, kind: str):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        family('calendar_rpc_duration_seconds', "Задержка вызовов gRPC", 'histogram')
+        for method, stats in methods:
+            lines.extend(stats.latency.samples('calendar_rpc_duration_seconds', (('method', method),)))
+        family('calendar_rpc_in_flight', "Выполняющиеся вызовы gRPC", 'gauge')
+        for method, stats in methods:
+            lines.append(f'calendar_rpc_in_flight{format_labels((("method", method),))} {stats.in_flight}')
+        family('calendar_rpc_total', "Завершенные вызовы gRPC по коду ответа", 'counter')
+        for method, stats in methods:
+            for code, count in sorted(stats.codes.items()):
+                lines.append(f'calendar_rpc_total{format_labels((("method", method), ("code", code)))} {count}')
+        for name, attribute, help_text in (
+            ('calendar_rpc_received_messages_total', 'received_messages', "Принятые сообщения"),
+            ('calendar_rpc_received_bytes_total', 'received_bytes', "Размер принятых сообщений"),
+            ('calendar_rpc_sent_messages_total', 'sent_messages', "Отправленные сообщения"),
+            ('calendar_rpc_sent_bytes_total', 'sent_bytes', "Размер отправленных сообщений"),
+        ):
+            family(name, help_text, 'counter')
+            for method, stats in methods:
+                lines.append(f'{name}{format_labels((("method", method),))} {getattr(stats, attribute)}')
+
+        for name, help_text, kind, collect in self.collectors:
+            family(name, help_text, kind)
+            for labels, value in collect():
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        if self.phases.histograms:
+            family('calendar_phase_duration_seconds', "Время внутренних этапов обработки запросов", 'histogram')
+            for name, histogram in sorted(self.phases.histograms.items()):
+                lines.extend(histogram.samples('calendar_phase_duration_seconds', (('phase', name),)))
+        return '\n'.join(lines) + '\n'
+
+    def wrap_codecs(self, stats: MethodStats, handler: grpc.RpcMethodHandler) -> Dict[str, Callable]:
+        """Разбор запроса и сериализация ответа обработчика со счетом байтов"""
+        deserialize = handler.request_deserializer
+        serialize = handler.response_serializer
+        phases = self.phases
+
+        def request_deserializer(data: bytes):
+            stats.received(len(data))
+            return deserialize(data) if deserialize is not None else data
+
+        def response_serializer(response) -> bytes:
+            with phases('serialization'):
+                data = serialize(response) if serialize is not None else response
+            stats.sent(len(data))
+            return data
+
+        return {'request_deserializer': request_deserializer, 'response_serializer': response_serializer}
+
+
+def status_name(context, default: grpc.StatusCode) -> str:
+    """Код ответа, выставленный обработчиком (abort, set_code), иначе default"""
+    code = context.code()
+    if code is None:
+        code = default
+    return code.name if isinstance(code, grpc.StatusCode) else str(code)
+
+
+def method_name(handler_call_details) -> str:
+    """'/calendar.CalendarService/GetEvent' -> 'GetEvent'"""
+    return handler_call_details.method.rsplit('/', 1)[-1]
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Перехватчик синхронного сервера: задержка, коды ответа и размеры сообщений"""
+
+    def __init__(self, metrics: ServerMetrics):
+        self.metrics = metrics
+        # Обернутые обработчики по методу: обработчик метода не меняется между вызовами
+        self._handlers: Dict[str, Tuple[grpc.RpcMethodHandler, grpc.RpcMethodHandler]] = {}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        cached = self._handlers.get(handler_call_details.method)
+        if cached is not None and cached[0] is handler:
+            return cached[1]
+        wrapped = self.wrap(self.metrics.method(method_name(handler_call_details)), handler)
+        self._handlers[handler_call_details.method] = (handler, wrapped)
+        return wrapped
+
+    def wrap(self, stats: MethodStats, handler: grpc.RpcMethodHandler) -> grpc.RpcMethodHandler:
+        codecs = self.metrics.wrap_codecs(stats, handler)
+        if handler.unary_unary is not None:
+            return handler._replace(unary_unary=self.unary(stats, handler.unary_unary), **codecs)
+        if handler.stream_unary is not None:
+            return handler._replace(stream_unary=self.unary(stats, handler.stream_unary), **codecs)
+        if handler.unary_stream is not None:
+            return handler._replace(unary_stream=self.streaming(stats, handler.unary_stream), **codecs)
+        return handler._replace(stream_stream=self.streaming(stats, handler.stream_stream), **codecs)
+
+    @staticmethod
+    def unary(stats: MethodStats, behavior):
+        def wrapper(request, context):
+            stats.start()
+            begin = time.perf_counter()
+            code = grpc.StatusCode.UNKNOWN
+            try:
+                response = behavior(request, context)
+                code = grpc.StatusCode.OK
+                return response
+            finally:
+                stats.finish(status_name(context, code), time.perf_counter() - begin)
+        return wrapper
+
+    @staticmethod
+    def streaming(stats: MethodStats, behavior):
+        def wrapper(request, context):
+            stats.start()
+            begin = time.perf_counter()
+            code = grpc.StatusCode.UNKNOWN
+            try:
+                yield from behavior(request, context)
+                code = grpc.StatusCode.OK
+            except GeneratorExit:
+                # Клиент отменил вызов или отключился
+                code = grpc.StatusCode.CANCELLED
+                raise
+            finally:
+                stats.finish(status_name(context, code), time.perf_counter() - begin)
+        return wrapper
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Перехватчик сервера grpc.aio с теми же метриками, что MetricsInterceptor"""
+
+    def __init__(self, metrics: ServerMetrics):
+        self.metrics = metrics
+        self._handlers: Dict[str, Tuple[grpc.RpcMethodHandler, grpc.RpcMethodHandler]] = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        cached = self._handlers.get(handler_call_details.method)
+        if cached is not None and cached[0] is handler:
+            return cached[1]
+        wrapped = self.wrap(self.metrics.method(method_name(handler_call_details)), handler)
+        self._handlers[handler_call_details.method] = (handler, wrapped)
+        return wrapped
+
+    def wrap(self, stats: MethodStats, handler: grpc.RpcMethodHandler) -> grpc.RpcMethodHandler:
+        codecs = self.metrics.wrap_codecs(stats, handler)
+        if handler.unary_unary is not None:
+            return handler._replace(unary_unary=self.unary(stats, handler.unary_unary), **codecs)
+        if handler.stream_unary is not None:
+            return handler._replace(stream_unary=self.unary(stats, handler.stream_unary), **codecs)
+        if handler.unary_stream is not None:
+            return handler._replace(unary_stream=self.streaming(stats, handler.unary_stream), **codecs)
+        return handler._replace(stream_stream=self.streaming(stats, handler.stream_stream), **codecs)
+
+    @staticmethod
+    def unary(stats: MethodStats, behavior):
+        async def wrapper(request, context):
+            stats.start()
+            begin = time.perf_counter()
+            code = grpc.StatusCode.UNKNOWN
+            try:
+                response = await behavior(request, context)
+                code = grpc.StatusCode.OK
+                return response
+            finally:
+                stats.finish(status_name(context, code), time.perf_counter() - begin)
+        return wrapper
+
+    @staticmethod
+    def streaming(stats: MethodStats, behavior):
+        async def wrapper(request, context):
+            stats.start()
+            begin = time.perf_counter()
+            code = grpc.StatusCode.UNKNOWN
+            try:
+                async for response in behavior(request, context):
+                    yield response
+                code = grpc.StatusCode.OK
+            except (GeneratorExit, asyncio.CancelledError):
+                code = grpc.StatusCode.CANCELLED
+                raise
+            finally:
+                stats.finish(status_name(context, code), time.perf_counter() - begin)
+        return wrapper
+
+
+def start_http_server(metrics: ServerMetrics, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Отдает метрики по HTTP (GET /metrics) в фоновом потоке"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Запросы метрик не засоряют вывод сервера
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
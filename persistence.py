@@ -0,0 +1,344 @@
+"""Сохранение событий на диск: журнал упреждающей записи и снимки.
+
+Каталог данных содержит:
+- snapshot.col - колоночный снимок всех записей на момент некоторой
+  ревизии (см. columnar.py);
+- wal-<ревизия>.log - сегменты журнала изменений, имя - первая ревизия,
+  которая могла попасть в сегмент.
+
+Каждое изменение хранилища дописывается в текущий сегмент журнала кадром
+(длина, CRC32, данные). Записи накапливаются в буфере, а отдельный поток
+сбрасывает их на диск одним write и одним fsync (групповая фиксация):
+пока идет fsync, следующие изменения собираются в новую группу. Ответ на
+запись возвращается только после fsync ее группы.
+
+Периодически журнал переключается на новый сегмент, в фоне пишется снимок,
+после чего хранилище переходит на него (записи, попавшие в снимок,
+освобождаются из памяти) и старые сегменты удаляются. При запуске снимок открывается через
+mmap без загрузки в память, а кадры журнала с большей ревизией становятся
+изменениями поверх него, индексы которых строятся за один проход. Поэтому
+время запуска зависит от длины журнала, а не от числа событий. Оборванный
+при сбое хвост журнала отбрасывается, и восстановление на нем
+останавливается: более поздние сегменты уже не продолжают восстановленное
+состояние и откладываются с расширением .orphaned.
+"""
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from columnar import ColumnarSnapshot, write_columnar
+from records import EventRecord
+from storage import EventStore, InMemoryEventStore
+
+
+SNAPSHOT_FILE = 'snapshot.col'
+
+# Расширение сегментов после оборванного кадра, которые не применяются
+ORPHANED_SUFFIX = '.orphaned'
+
+# Снимок делается после стольких изменений с момента предыдущего снимка
+SNAPSHOT_EVERY = 100_000
+
+_FRAME_HEADER = struct.Struct('<II')
+
+
+def encode_frame(payload: bytes) -> bytes:
+    return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path: str) -> Iterator[Tuple[int, bytes]]:
+    """Выдает (смещение конца кадра, данные) для целых кадров файла.
+
+    Чтение останавливается на первом оборванном или поврежденном кадре.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    while pos + _FRAME_HEADER.size <= len(data):
+        length, crc = _FRAME_HEADER.unpack_from(data, pos)
+        start = pos + _FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        pos = start + length
+        yield pos, payload
+
+
+def encode_change(revision: int, current: Optional[EventRecord], event: Optional[EventRecord]) -> bytes:
+    """Кадр журнала для замены current на event (None - нет записи)"""
+    if event is None:
+        change = (revision, 'delete', current.event_id)
+    else:
+        change = (revision, 'put', event.to_row())
+    return encode_frame(pickle.dumps(change, pickle.HIGHEST_PROTOCOL))
+
+
+def segment_name(revision: int) -> str:
+    return f'wal-{revision:020d}.log'
+
+
+def list_segments(data_dir: str) -> List[Tuple[int, str]]:
+    """Сегменты журнала в порядке ревизий: [(первая ревизия, путь)]"""
+    segments = []
+    for name in os.listdir(data_dir):
+        if name.startswith('wal-') and name.endswith('.log'):
+            segments.append((int(name[4:-4]), os.path.join(data_dir, name)))
+    return sorted(segments)
+
+
+def fsync_dir(path: str):
+    """Фиксирует на диске создание и переименование файлов каталога"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(data_dir: str, revision: int, records: Iterable[EventRecord]):
+    """Атомарно записывает снимок: во временный файл, fsync, переименование.
+
+    records должны идти в порядке (local_start, event_id), как их выдает
+    InMemoryEventStore.dump. Открытый через mmap прежний снимок остается доступен
+    до закрытия, даже когда файл заменен.
+    """
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    tmp_path = path + '.tmp'
+    write_columnar(tmp_path, revision, records)
+    os.replace(tmp_path, path)
+    fsync_dir(data_dir)
+
+
+def read_snapshot(data_dir: str) -> Optional[ColumnarSnapshot]:
+    """Открывает снимок каталога, None если снимка еще нет"""
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None
+    return ColumnarSnapshot(path)
+
+
+class WriteAheadLog:
+    """Журнал изменений с групповой фиксацией.
+
+    append только кладет кадр в буфер, запись и fsync выполняет фоновый
+    поток; wait(ревизия) ждет, пока кадр этой ревизии окажется на диске.
+    rotate переключает запись на новый сегмент.
+    """
+
+    def __init__(self, data_dir: str, revision: int):
+        self.data_dir = data_dir
+        self._written = self.durable = revision
+        self._pending: List[bytes] = []
+        self._closed = False
+        self._changed = threading.Condition()
+        # Запись в файл и переключение сегмента не должны пересекаться
+        self._io_lock = threading.Lock()
+        self.path = ''
+        self._file = None
+        self._open_segment(revision + 1)
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _open_segment(self, first_revision: int):
+        self.path = os.path.join(self.data_dir, segment_name(first_revision))
+        self._file = open(self.path, 'ab')
+        fsync_dir(self.data_dir)
+
+    def append(self, revision: int, frame: bytes):
+        with self._changed:
+            self._pending.append(frame)
+            self._written = revision
+            self._changed.notify_all()
+
+    def wait(self, revision: int):
+        with self._changed:
+            while self.durable < revision and not self._closed:
+                self._changed.wait()
+
+    def _take_batch(self) -> Tuple[List[bytes], int]:
+        batch, self._pending = self._pending, []
+        return batch, self._written
+
+    def _write(self, batch: List[bytes], revision: int):
+        if batch:
+            self._file.write(b''.join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        with self._changed:
+            self.durable = max(self.durable, revision)
+            self._changed.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self._changed:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if not self._pending:
+                    return
+            with self._io_lock:
+                with self._changed:
+                    batch, revision = self._take_batch()
+                self._write(batch, revision)
+
+    def rotate(self):
+        """Дописывает накопленные кадры и начинает новый сегмент.
+
+        Все кадры, добавленные до вызова, остаются в прежних сегментах.
+        """
+        with self._io_lock:
+            with self._changed:
+                batch, revision = self._take_batch()
+            self._write(batch, revision)
+            self._file.close()
+            self._open_segment(revision + 1)
+
+    def close(self):
+        """Сбрасывает оставшиеся кадры на диск и закрывает журнал"""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+
+class Journal:
+    """Журнал хранилища событий: сегменты WAL, снимки и восстановление.
+
+    Подключается к InMemoryEventStore через атрибут journal: хранилище вызывает
+    append под блокировкой фиксации и wait после снятия блокировок.
+    """
+
+    def __init__(self, data_dir: str, snapshot_every: int = SNAPSHOT_EVERY):
+        self.data_dir = data_dir
+        self.snapshot_every = snapshot_every
+        self.store: Optional[InMemoryEventStore] = None
+        self._wal: Optional[WriteAheadLog] = None
+        self._since_snapshot = 0
+        # ID событий, измененных с начала записи снимка (None - снимок не пишется)
+        self._changed: Optional[Set[str]] = None
+        # Снимки пишутся по одному: фоновым потоком и явным вызовом snapshot
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._snapshotter: Optional[threading.Thread] = None
+
+    def open(self, store: InMemoryEventStore):
+        """Восстанавливает содержимое хранилища с диска и начинает журналирование"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        base = read_snapshot(self.data_dir)
+        revision = 0 if base is None else base.revision
+        # Изменения после снимка: ID -> строка записи, None - событие удалено
+        rows: Dict[str, Optional[tuple]] = {}
+        replayed = 0
+        broken = False
+        for _, path in list_segments(self.data_dir):
+            if broken:
+                # После потерянного кадра изменения применять нельзя; новый
+                # сегмент не должен дописываться в старый с тем же именем
+                os.replace(path, path + ORPHANED_SUFFIX)
+                print(f"Сегмент журнала после обрыва отложен: {path}{ORPHANED_SUFFIX}")
+                continue
+            valid_size = 0
+            for frame_end, payload in read_frames(path):
+                frame_revision, kind, value = pickle.loads(payload)
+                if frame_revision > revision + 1:
+                    break  # Пропуск ревизий - кадры дальше не продолжают состояние
+                valid_size = frame_end
+                if frame_revision <= revision:
+                    continue
+                if kind == 'put':
+                    rows[value[0]] = value
+                else:
+                    rows[value] = None
+                revision = frame_revision
+                replayed += 1
+            if valid_size < os.path.getsize(path):
+                # Хвост, оборванный при сбое, не был подтвержден клиенту
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_size)
+                broken = True
+
+        store.load(
+            (EventRecord.from_row(row) for row in rows.values() if row is not None), revision,
+            base=base, deleted=[event_id for event_id, row in rows.items() if row is None]
+        )
+        self.store = store
+        self._since_snapshot = replayed
+        self._wal = WriteAheadLog(self.data_dir, revision)
+        store.journal = self
+
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, daemon=True)
+        self._snapshotter.start()
+        print(f"Восстановлено событий: {len(store)} (ревизия {revision}, "
+              f"в снимке {0 if base is None else len(base)}, из журнала {replayed})")
+
+    def append(self, revision: int, current: Optional[EventRecord], event: Optional[EventRecord]):
+        self._wal.append(revision, encode_change(revision, current, event))
+        changed = self._changed
+        if changed is not None:
+            changed.add((current if event is None else event).event_id)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self._snapshot_requested.set()
+
+    def wait(self, revision: int):
+        if self._wal.durable < revision:
+            self._wal.wait(revision)
+
+    def _snapshot_loop(self):
+        while True:
+            self._snapshot_requested.wait()
+            if self._stopped.is_set():
+                return
+            self._snapshot_requested.clear()
+            self.snapshot()
+
+    def snapshot(self):
+        """Переключает журнал на новый сегмент, пишет снимок и удаляет старые сегменты.
+
+        Хранилище переходит на новый снимок: в памяти остаются только
+        события, измененные с начала записи снимка, и серии.
+        """
+        with self._snapshot_lock:
+            self._since_snapshot = 0
+            # Изменения начинают отмечаться до среза, поэтому ни одно не пропадет
+            changed = self._changed = set()
+            self._wal.rotate()
+
+            # Все кадры старых сегментов не новее снимка, снятого после переключения
+            revision, records = self.store.dump()
+            write_snapshot(self.data_dir, revision, records)
+            self.store.rebase(read_snapshot(self.data_dir), changed)
+            self._changed = None
+            for _, path in list_segments(self.data_dir):
+                if path != self._wal.path:
+                    os.remove(path)
+        print(f"Сохранен снимок событий (ревизия {revision})")
+
+    def close(self):
+        """Сбрасывает журнал на диск; следующий запуск восстановится по нему"""
+        self._stopped.set()
+        self._snapshot_requested.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self._wal.close()
+
+
+def open_store(data_dir: Optional[str], storage: str = 'memory') -> EventStore:
+    """Создает хранилище; с data_dir - восстановленное с диска и журналируемое.
+
+    storage='sqlite' - база SQLite в data_dir вместо индексов в памяти.
+    """
+    if storage == 'sqlite':
+        if not data_dir:
+            raise ValueError("Для хранилища SQLite нужен каталог данных")
+        from sqlite_storage import SQLITE_FILE, SqliteEventStore
+        os.makedirs(data_dir, exist_ok=True)
+        return SqliteEventStore(os.path.join(data_dir, SQLITE_FILE))
+    store = InMemoryEventStore()
+    if data_dir:
+        Journal(data_dir).open(store)
+    return store
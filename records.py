@@ -0,0 +1,195 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import calendar_pb2
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def datetime_to_timestamp(dt: datetime) -> int:
+    """Переводит datetime в микросекунды от начала эпохи"""
+    if dt.tzinfo is not None:
+        # Время с часовым поясом приводим к UTC, чтобы интервалы были сравнимы
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def parse_time(value: str) -> Tuple[int, Optional[int]]:
+    """Разбирает время ISO в (микросекунды от эпохи, смещение пояса в секундах)"""
+    dt = datetime.fromisoformat(value)
+    offset = dt.utcoffset()
+    return datetime_to_timestamp(dt), (None if offset is None else int(offset.total_seconds()))
+
+
+def parse_timestamp(value: str) -> int:
+    """Переводит время в формате ISO в микросекунды от начала эпохи"""
+    return datetime_to_timestamp(datetime.fromisoformat(value))
+
+
+def format_time(timestamp: int, offset: Optional[int] = None) -> str:
+    """Переводит микросекунды от эпохи обратно в строку ISO"""
+    if offset is None:
+        return (_EPOCH + timestamp * _MICROSECOND).isoformat()
+    shift = timedelta(seconds=offset)
+    local = _EPOCH + timestamp * _MICROSECOND + shift
+    return local.replace(tzinfo=timezone(shift)).isoformat()
+
+
+DAY = 86400 * 1_000_000
+
+
+def day_start(value: str) -> int:
+    """Начало календарного дня из строки ISO в микросекундах от эпохи"""
+    day = datetime.fromisoformat(value).date()
+    return (datetime.combine(day, datetime.min.time()) - _EPOCH) // _MICROSECOND
+
+
+def current_timestamp() -> int:
+    """Текущее локальное время в микросекундах от эпохи"""
+    return datetime_to_timestamp(datetime.now())
+
+
+def intern_all(values: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(map(sys.intern, values))
+
+
+class EventRecord:
+    """Компактная запись о событии во внутреннем хранилище.
+
+    Время начала и окончания разбирается один раз при записи и хранится
+    в микросекундах от эпохи; в строки ISO оно переводится только при
+    сериализации ответа. Часто повторяющиеся строки (статус, организатор,
+    участники, место) интернируются.
+
+    Повторяющееся событие (серия) хранится одной записью: start и end -
+    первое вхождение, recurrence - правило повторения (recurrence.Recurrence),
+    для обычного события None.
+
+    version - номер версии события: 1 при создании, каждое изменение
+    увеличивает его на единицу. По нему работают условные запросы
+    (if_match, if_none_match); номер хранится в самой записи, поэтому
+    совпадает в основном процессе и репликах.
+    """
+
+    __slots__ = (
+        'event_id', 'title', 'description', 'start', 'end', 'location',
+        'attendees', 'organizer', 'status', 'created_at', 'updated_at',
+        'start_offset', 'end_offset', 'recurrence', 'version'
+    )
+
+    def __init__(self, event_id: str, title: str, description: str, start: int, end: int,
+                 location: str, attendees: Iterable[str], organizer: str, status: str,
+                 created_at: int, updated_at: int,
+                 start_offset: Optional[int] = None, end_offset: Optional[int] = None,
+                 recurrence=None, version: int = 1):
+        self.event_id = event_id
+        self.title = title
+        self.description = description
+        self.start = start
+        self.end = end
+        self.location = sys.intern(location)
+        self.attendees = intern_all(attendees)
+        self.organizer = sys.intern(organizer)
+        self.status = sys.intern(status)
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.recurrence = recurrence
+        self.version = version
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'EventRecord':
+        """Создает запись из словаря со временем в формате ISO"""
+        start, start_offset = parse_time(data['start_time'])
+        end, end_offset = parse_time(data['end_time'])
+        return cls(
+            event_id=data['event_id'],
+            title=data['title'],
+            description=data['description'],
+            start=start,
+            end=end,
+            location=data['location'],
+            attendees=data['attendees'],
+            organizer=data['organizer'],
+            status=data['status'],
+            created_at=parse_timestamp(data['created_at']),
+            updated_at=parse_timestamp(data['updated_at']),
+            start_offset=start_offset,
+            end_offset=end_offset
+        )
+
+    def replace(self, **changes) -> 'EventRecord':
+        """Возвращает копию записи с измененными полями"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return EventRecord(**values)
+
+    def same_schedule(self, other: 'EventRecord') -> bool:
+        """Совпадает ли все, от чего зависят конфликты: время, участники, повторение и статус"""
+        return (self.start == other.start and self.end == other.end
+                and self.start_offset == other.start_offset and self.attendees == other.attendees
+                and self.recurrence == other.recurrence and self.status == other.status)
+
+    def moved(self, start: int, end: int) -> 'EventRecord':
+        """Копия записи с другим временем (вхождение серии) без повторного разбора полей"""
+        event = object.__new__(EventRecord)
+        event.event_id = self.event_id
+        event.title = self.title
+        event.description = self.description
+        event.start = start
+        event.end = end
+        event.location = self.location
+        event.attendees = self.attendees
+        event.organizer = self.organizer
+        event.status = self.status
+        event.created_at = self.created_at
+        event.updated_at = self.updated_at
+        event.start_offset = self.start_offset
+        event.end_offset = self.end_offset
+        event.recurrence = self.recurrence
+        event.version = self.version
+        return event
+
+    def to_row(self) -> tuple:
+        """Кортеж полей записи для передачи между процессами и хранения на диске"""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_row(cls, row) -> 'EventRecord':
+        return cls(*row)
+
+    @property
+    def start_time(self) -> str:
+        return format_time(self.start, self.start_offset)
+
+    @property
+    def end_time(self) -> str:
+        return format_time(self.end, self.end_offset)
+
+    @property
+    def local_start(self) -> int:
+        """Время начала по часам пояса события (для фильтрации по датам)"""
+        if self.start_offset is None:
+            return self.start
+        return self.start + self.start_offset * 1_000_000
+
+    def to_proto(self) -> calendar_pb2.EventDetails:
+        """Сериализует запись в сообщение EventDetails"""
+        return calendar_pb2.EventDetails(
+            event_id=self.event_id,
+            title=self.title,
+            description=self.description,
+            start_time=format_time(self.start, self.start_offset),
+            end_time=format_time(self.end, self.end_offset),
+            location=self.location,
+            attendees=self.attendees,
+            organizer=self.organizer,
+            status=self.status,
+            created_at=format_time(self.created_at),
+            updated_at=format_time(self.updated_at),
+            recurrence=None if self.recurrence is None else self.recurrence.to_proto(self.start_offset),
+            version=self.version
+        )
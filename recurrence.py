@@ -0,0 +1,492 @@
+"""Повторяющиеся события (серии).
+
+Серия хранится одной записью EventRecord: start и end - первое вхождение,
+recurrence - правило по образцу RRULE (daily/weekly/monthly, интервал,
+count или until, дни недели и исключенные вхождения). Вхождения нигде не
+хранятся: SeriesIndex раскрывает их только внутри запрошенного окна - для
+ListEvents, проверки конфликтов и занятости, - поэтому объем хранилища
+пропорционален числу серий, а не вхождений.
+
+Для ежедневных и еженедельных правил первое вхождение окна вычисляется
+арифметически, для ежемесячных - по номеру месяца, так что стоимость
+раскрытия зависит от числа вхождений в окне, а не от возраста серии.
+Дни недели и месяцы считаются по местному времени серии. Окончание
+конечной серии тоже вычисляется арифметически (кроме ежемесячных, число
+вхождений которых ограничено MAX_COUNT и MAX_UNTIL).
+"""
+import heapq
+from calendar import monthrange
+from datetime import date
+from functools import lru_cache
+from itertools import chain, count, islice
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import calendar_pb2
+from records import DAY, EventRecord, current_timestamp, format_time, parse_timestamp
+
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+WEEK = 7 * DAY
+
+# До какого времени после начала запроса (или текущего времени) раскрываются
+# бессрочные серии, если у запроса нет верхней границы, и на каком отрезке
+# ищутся пересечения двух серий
+HORIZON = 366 * DAY
+
+# Верхняя граница времени для поиска событий, пересекающихся с бессрочной серией
+MAX_TIMESTAMP = 2 ** 62
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Наибольшее число вхождений и наибольшая дата until в правиле
+MAX_COUNT = 10_000
+MAX_UNTIL = (date(2200, 1, 1).toordinal() - _EPOCH_ORDINAL) * DAY
+
+Conflicts = List[Tuple[EventRecord, List[str]]]
+
+
+class Recurrence(NamedTuple):
+    """Правило повторения серии; время - в микросекундах от эпохи (UTC)"""
+
+    frequency: str
+    interval: int = 1
+    # Число вхождений, 0 - без ограничения
+    count: int = 0
+    # Начало последнего вхождения не позже until
+    until: Optional[int] = None
+    # Дни недели для weekly, 0 - понедельник; пусто - день недели начала
+    weekdays: Tuple[int, ...] = ()
+    # Начала исключенных вхождений
+    exceptions: FrozenSet[int] = frozenset()
+
+    @classmethod
+    def from_proto(cls, message: calendar_pb2.Recurrence) -> 'Recurrence':
+        """Разбирает правило из сообщения, ValueError - правило некорректно"""
+        if message.frequency not in FREQUENCIES:
+            raise ValueError(f"Неизвестная частота повторения: {message.frequency}")
+        if message.interval < 0 or message.count < 0:
+            raise ValueError("Интервал и число повторений не могут быть отрицательными")
+        if any(not 0 <= day <= 6 for day in message.weekdays):
+            raise ValueError("Дни недели задаются числами от 0 (понедельник) до 6")
+        if message.weekdays and message.frequency != 'weekly':
+            raise ValueError("Дни недели задаются только для еженедельного повторения")
+        if message.count > MAX_COUNT:
+            raise ValueError(f"Число повторений не может быть больше {MAX_COUNT}")
+        until = parse_timestamp(message.until) if message.until else None
+        if until is not None and until >= MAX_UNTIL:
+            raise ValueError(f"Дата окончания повторений должна быть раньше {format_time(MAX_UNTIL)}")
+        return cls(
+            frequency=message.frequency,
+            interval=message.interval or 1,
+            count=message.count,
+            until=until,
+            weekdays=tuple(sorted(set(message.weekdays))),
+            exceptions=frozenset(map(parse_timestamp, message.exceptions))
+        )
+
+    def to_proto(self, offset: Optional[int] = None) -> calendar_pb2.Recurrence:
+        """Сообщение Recurrence; время выводится в поясе серии offset (в секундах).
+
+        Все вхождения серии выдаются с одним правилом, поэтому сообщение
+        кешируется и не должно изменяться вызывающим кодом.
+        """
+        return _recurrence_proto(self, offset)
+
+    def _build_proto(self, offset: Optional[int]) -> calendar_pb2.Recurrence:
+        return calendar_pb2.Recurrence(
+            frequency=self.frequency,
+            interval=self.interval,
+            count=self.count,
+            until='' if self.until is None else format_time(self.until, offset),
+            weekdays=self.weekdays,
+            exceptions=[format_time(start, offset) for start in sorted(self.exceptions)]
+        )
+
+    def to_text(self) -> str:
+        """Компактная строка правила для хранения в базе"""
+        return ';'.join((
+            self.frequency, str(self.interval), str(self.count),
+            '' if self.until is None else str(self.until),
+            ','.join(map(str, self.weekdays)),
+            ','.join(map(str, sorted(self.exceptions)))
+        ))
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Recurrence':
+        frequency, interval, count, until, weekdays, exceptions = text.split(';')
+        return cls(
+            frequency=frequency,
+            interval=int(interval),
+            count=int(count),
+            until=int(until) if until else None,
+            weekdays=tuple(int(day) for day in weekdays.split(',') if day),
+            exceptions=frozenset(int(start) for start in exceptions.split(',') if start)
+        )
+
+    @property
+    def endless(self) -> bool:
+        return not self.count and self.until is None
+
+    def validate(self, first: int, offset: int, duration: int):
+        """Проверяет правило для серии с первым вхождением [first, first + duration)"""
+        if self.weekdays and _weekday(first, offset) not in self.weekdays:
+            raise ValueError("День недели начала серии должен входить в дни повторения")
+        if duration > self.min_gap():
+            raise ValueError("Вхождение серии должно заканчиваться до начала следующего")
+
+    def min_gap(self) -> int:
+        """Наименьшее расстояние между началами соседних вхождений"""
+        if self.frequency == 'monthly':
+            return 28 * DAY * self.interval
+        if self.frequency == 'daily':
+            return self.interval * DAY
+        if len(self.weekdays) < 2:
+            return self.interval * WEEK
+        gaps = [(b - a) * DAY for a, b in zip(self.weekdays, self.weekdays[1:])]
+        gaps.append(self.interval * WEEK - (self.weekdays[-1] - self.weekdays[0]) * DAY)
+        return min(gaps)
+
+    def starts(self, first: int, offset: int, after: Optional[int] = None) -> Iterator[int]:
+        """Начала вхождений серии позже after по порядку (для бессрочной - бесконечно).
+
+        first - начало первого вхождения, offset - смещение пояса серии
+        в микросекундах.
+        """
+        until = self.until
+        exceptions = self.exceptions
+        for start in self._candidates(first, offset, after):
+            if until is not None and start > until:
+                return
+            if (after is not None and start <= after) or start in exceptions:
+                continue
+            yield start
+
+    def _candidates(self, first: int, offset: int, after: Optional[int]) -> Iterator[int]:
+        """Начала по правилу с учетом count, но без until и исключений.
+
+        Вхождения раньше периода, в который попадает after, пропускаются
+        без перебора; номер вхождения для count при этом вычисляется.
+        """
+        if self.frequency == 'monthly':
+            yield from self._monthly(first, offset, after)
+            return
+
+        base, period, shifts = self._periods(first, offset)
+        number = 0 if after is None else max(0, (after - base) // period)
+        if len(shifts) == 1:
+            # Одно вхождение за период: арифметическая прогрессия
+            starts = count(first + number * period, period)
+            yield from islice(starts, max(0, self.count - number)) if self.count else starts
+            return
+
+        skipped = sum(1 for shift in shifts if base + shift < first)
+        index = max(0, number * len(shifts) - skipped)
+        while True:
+            for shift in shifts:
+                start = base + number * period + shift
+                if start < first:
+                    continue
+                if self.count and index >= self.count:
+                    return
+                yield start
+                index += 1
+            number += 1
+
+    def _periods(self, first: int, offset: int) -> Tuple[int, int, Tuple[int, ...]]:
+        """Начало отсчета, длина периода и сдвиги вхождений внутри периода (daily и weekly)"""
+        if self.frequency == 'daily':
+            return first, self.interval * DAY, (0,)
+        if not self.weekdays:
+            return first, self.interval * WEEK, (0,)
+        # Период - неделя (или несколько), отсчитываемая от понедельника недели начала
+        base = first - _weekday(first, offset) * DAY
+        return base, self.interval * WEEK, tuple(day * DAY for day in self.weekdays)
+
+    def tail_after(self, first: int, offset: int) -> Optional[int]:
+        """Момент, после которого у конечной серии остаются только последние вхождения.
+
+        Последний период с вхождениями вычисляется по count и until
+        арифметически; от него отступается по периоду на каждое исключение
+        и еще на один, так что среди оставшихся вхождений последнее не
+        исключено. None - перебирать с начала (ежемесячные серии и короткие
+        серии).
+        """
+        if self.frequency == 'monthly' or self.endless:
+            return None
+        base, period, shifts = self._periods(first, offset)
+        last = []
+        if self.count:
+            skipped = sum(1 for shift in shifts if base + shift < first)
+            last.append((self.count - 1 + skipped) // len(shifts))
+        if self.until is not None:
+            last.append((self.until - base) // period)
+        number = min(last) - len(self.exceptions) - 1
+        return base + number * period - 1 if number > 0 else None
+
+    def _monthly(self, first: int, offset: int, after: Optional[int]) -> Iterator[int]:
+        # Месяцы без нужного числа (31-е, 29-30 февраля) пропускаются, как в RRULE
+        days, time_of_day = divmod(first + offset, DAY)
+        origin = date.fromordinal(_EPOCH_ORDINAL + days)
+        month = origin.year * 12 + origin.month - 1
+        step = 0
+        if after is not None and not self.count:
+            # Без count номер вхождения не нужен - начинаем сразу с месяца after
+            reached = date.fromordinal(_EPOCH_ORDINAL + (after + offset) // DAY)
+            step = max(0, (reached.year * 12 + reached.month - 1 - month) // self.interval)
+        index = 0
+        while not self.count or index < self.count:
+            year, month_of_year = divmod(month + step * self.interval, 12)
+            if year > 9999:
+                return
+            if origin.day <= monthrange(year, month_of_year + 1)[1]:
+                day = date(year, month_of_year + 1, origin.day).toordinal() - _EPOCH_ORDINAL
+                yield day * DAY + time_of_day - offset
+                index += 1
+            step += 1
+
+
+@lru_cache(maxsize=1024)
+def _recurrence_proto(recurrence: Recurrence, offset: Optional[int]) -> calendar_pb2.Recurrence:
+    return recurrence._build_proto(offset)
+
+
+def _weekday(timestamp: int, offset: int) -> int:
+    """День недели по местному времени, 0 - понедельник (1 января 1970 - четверг)"""
+    return ((timestamp + offset) // DAY + 3) % 7
+
+
+def _offset(event: EventRecord) -> int:
+    return (event.start_offset or 0) * 1_000_000
+
+
+def occurrence_starts(event: EventRecord, start: int, end: int) -> Iterator[int]:
+    """Начала вхождений серии, пересекающихся с [start, end)"""
+    duration = event.end - event.start
+    for occurrence in event.recurrence.starts(event.start, _offset(event), start - duration):
+        if occurrence >= end:
+            return
+        yield occurrence
+
+
+def occurrence(event: EventRecord, start: int) -> EventRecord:
+    """Запись вхождения серии, начинающегося в start"""
+    return event.moved(start, start + event.end - event.start)
+
+
+def series_end(event: EventRecord) -> Optional[int]:
+    """Окончание последнего вхождения серии, None - серия бессрочная"""
+    recurrence = event.recurrence
+    if recurrence.endless:
+        return None
+    offset = _offset(event)
+    last = event.start
+    for last in recurrence.starts(event.start, offset, recurrence.tail_after(event.start, offset)):
+        pass
+    return last + event.end - event.start
+
+
+def _sort_conflicts(conflicts: Conflicts) -> Conflicts:
+    conflicts.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+    return conflicts
+
+
+class SeriesIndex:
+    """Серии хранилища, раскрываемые во вхождения по запросу.
+
+    Серий немного по сравнению с обычными событиями, поэтому запросы
+    перебирают серии нужных участников (для ListEvents - все серии) и
+    раскрывают каждую только внутри окна. Словари заменяются целиком при
+    каждом изменении, поэтому читатели обходят их без блокировок, как и
+    остальные индексы хранилища.
+    """
+
+    def __init__(self):
+        # ID -> (серия, окончание последнего вхождения или None)
+        self._series: Dict[str, Tuple[EventRecord, Optional[int]]] = {}
+        # Участник -> ID запланированных серий
+        self._by_attendee: Dict[str, FrozenSet[str]] = {}
+
+    def __len__(self):
+        return len(self._series)
+
+    def add(self, event: EventRecord):
+        series = dict(self._series)
+        series[event.event_id] = (event, series_end(event))
+        if event.status == 'scheduled':
+            by_attendee = dict(self._by_attendee)
+            for attendee in set(event.attendees):
+                by_attendee[attendee] = by_attendee.get(attendee, frozenset()) | {event.event_id}
+            self._by_attendee = by_attendee
+        self._series = series
+
+    def remove(self, event: EventRecord):
+        series = dict(self._series)
+        series.pop(event.event_id, None)
+        self._series = series
+        if event.status == 'scheduled':
+            by_attendee = dict(self._by_attendee)
+            for attendee in set(event.attendees):
+                ids = by_attendee.get(attendee, frozenset()) - {event.event_id}
+                if ids:
+                    by_attendee[attendee] = ids
+                else:
+                    by_attendee.pop(attendee, None)
+            self._by_attendee = by_attendee
+
+    def load(self, events: Iterable[EventRecord]):
+        self.clear()
+        for event in events:
+            self.add(event)
+
+    def clear(self):
+        self._series = {}
+        self._by_attendee = {}
+
+    def _scheduled(self, attendees: Iterable[str]) -> Dict[str, List[str]]:
+        """ID запланированных серий участников -> общие участники в порядке attendees"""
+        by_attendee = self._by_attendee
+        found: Dict[str, List[str]] = {}
+        for attendee in dict.fromkeys(attendees):
+            for event_id in by_attendee.get(attendee, ()):
+                found.setdefault(event_id, []).append(attendee)
+        return found
+
+    def find_overlaps(self, start: int, end: int, attendees: Iterable[str],
+                      exclude_id: Optional[str] = None) -> Conflicts:
+        """Вхождения запланированных серий участников, пересекающиеся с [start, end)"""
+        series = self._series
+        conflicts = []
+        for event_id, common in self._scheduled(attendees).items():
+            entry = series.get(event_id)
+            if entry is None or event_id == exclude_id:
+                continue
+            for occurrence_start in occurrence_starts(entry[0], start, end):
+                conflicts.append((occurrence(entry[0], occurrence_start), common))
+        return _sort_conflicts(conflicts)
+
+    def busy_intervals(self, start: int, end: int, attendees: Iterable[str]) -> Dict[str, List[Tuple[int, int]]]:
+        """(начало, конец) вхождений серий участников в [start, end); только участники с сериями"""
+        series = self._series
+        busy: Dict[str, List[Tuple[int, int]]] = {}
+        for attendee in dict.fromkeys(attendees):
+            for event_id in self._by_attendee.get(attendee, ()):
+                entry = series.get(event_id)
+                if entry is None:
+                    continue
+                event = entry[0]
+                duration = event.end - event.start
+                busy.setdefault(attendee, []).extend(
+                    (occurrence_start, occurrence_start + duration)
+                    for occurrence_start in occurrence_starts(event, start, end)
+                )
+        for intervals in busy.values():
+            intervals.sort()
+        return busy
+
+    def series_conflicts(self, event: EventRecord) -> Conflicts:
+        """Первые пересечения серии event с другими сериями ее участников.
+
+        Общий отрезок двух конечных серий проверяется целиком, а если одна из
+        них бесконечна - не дальше HORIZON от начала более поздней. Вхождения
+        event по одному сверяются с другой серией, первое пересечение которой
+        с вхождением ищется арифметически.
+        """
+        series = self._series
+        duration = event.end - event.start
+        end = series_end(event)
+        conflicts = []
+        for event_id, common in self._scheduled(event.attendees).items():
+            entry = series.get(event_id)
+            if entry is None or event_id == event.event_id:
+                continue
+            other, other_end = entry
+            lower = max(event.start, other.start)
+            if end is not None and other_end is not None:
+                upper = min(end, other_end)
+            else:
+                upper = lower + HORIZON
+                if end is not None:
+                    upper = min(upper, end)
+                if other_end is not None:
+                    upper = min(upper, other_end)
+            for occurrence_start in occurrence_starts(event, lower, upper):
+                found = next(occurrence_starts(other, occurrence_start, occurrence_start + duration), None)
+                if found is not None:
+                    conflicts.append((occurrence(other, found), common))
+                    break
+        return _sort_conflicts(conflicts)
+
+    def query(self, lower: Optional[int] = None, upper: Optional[int] = None,
+              organizer: str = '', status: str = '',
+              after: Optional[Tuple[int, str]] = None) -> Iterator[EventRecord]:
+        """Вхождения серий с локальным началом в [lower, upper) в порядке (local_start, ID).
+
+        Без верхней границы бессрочные серии раскрываются на HORIZON вперед
+        от нижней границы (позиции after) или от текущего времени.
+        """
+        horizon = None
+        if upper is None:
+            points = [current_timestamp()] + [point for point in (lower, after and after[0]) if point is not None]
+            horizon = max(points) + HORIZON
+
+        expansions = []
+        for event, _ in self._series.values():
+            if organizer and event.organizer != organizer:
+                continue
+            if status and event.status != status:
+                continue
+            bound = upper if upper is not None or not event.recurrence.endless else horizon
+            expansions.append(self._expand(event, lower, bound, after))
+        if upper is not None:
+            # Окно ограничено: вхождения всех серий собираются и сортируются разом
+            merged = sorted(chain.from_iterable(expansions))
+        else:
+            # Кортежи (local_start, ID, начало, серия) сливаются без функции ключа
+            merged = heapq.merge(*expansions)
+        for _, _, start, event in merged:
+            yield occurrence(event, start)
+
+    @staticmethod
+    def _expand(event: EventRecord, lower: Optional[int], upper: Optional[int],
+                after: Optional[Tuple[int, str]]) -> Iterator[Tuple[int, str, int, EventRecord]]:
+        """(local_start, ID, начало, серия) вхождений с локальным началом в [lower, upper) после after"""
+        offset = _offset(event)
+        event_id = event.event_id
+        first = None
+        if lower is not None:
+            first = lower - offset - 1
+        if after is not None:
+            position = after[0] - offset - (1 if event_id > after[1] else 0)
+            first = position if first is None else max(first, position)
+        for start in event.recurrence.starts(event.start, offset, first):
+            local_start = start + offset
+            if upper is not None and local_start >= upper:
+                return
+            yield local_start, event_id, start, event
+
+
+def candidate_conflicts(event: EventRecord,
+                        find_single: Callable[[int, int, Iterable[str], Optional[str]], Conflicts],
+                        series: SeriesIndex) -> Conflicts:
+    """Конфликты события-кандидата (обычного или серии) с хранилищем.
+
+    find_single ищет пересечения среди обычных событий хранилища
+    (start, end, участники, исключаемый ID). Для серии обычные события
+    ее участников выбираются на всем протяжении серии и проверяются на
+    пересечение с ее вхождениями по одному.
+    """
+    if event.status != 'scheduled':
+        return []
+    if event.recurrence is None:
+        conflicts = find_single(event.start, event.end, event.attendees, event.event_id)
+        overlaps = series.find_overlaps(event.start, event.end, event.attendees, event.event_id)
+        return _sort_conflicts(conflicts + overlaps) if overlaps else conflicts
+
+    end = series_end(event)
+    candidates = find_single(event.start, MAX_TIMESTAMP if end is None else end, event.attendees, event.event_id)
+    conflicts = [
+        (other, common) for other, common in candidates
+        if next(occurrence_starts(event, other.start, other.end), None) is not None
+    ]
+    return _sort_conflicts(conflicts + series.series_conflicts(event))
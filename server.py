@@ -1,16 +1,231 @@
 import grpc
+import grpc.aio
 from concurrent import futures
+import argparse
+import asyncio
+import base64
+import hashlib
+import queue
+import threading
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from functools import lru_cache
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import time
 import calendar_pb2
 import calendar_pb2_grpc
+from cache import ListKey, ResponseCache, list_matches
+from changes import Change, ChangeLog, RevisionCompacted
+from channels import MIN_KEEPALIVE_TIME
+from conflicts import BULK_THRESHOLD, BulkConflictChecker, check_series
+from freebusy import MAX_WINDOW, busy_by_attendee, free_slots, merge_intervals, merged_busy
+from logs import LEVELS, log, parse_sampling, setup
+from metrics import PHASES, AsyncMetricsInterceptor, MetricsInterceptor, ServerMetrics, phase, start_http_server
+from records import DAY, EventRecord, current_timestamp, day_start, format_time, parse_time
+from recurrence import Recurrence
+from persistence import open_store
+from storage import EventStore, InMemoryEventStore, VersionMismatch
+from sync import SyncIndex, SyncReset
+
+DEFAULT_PORT = 50054
+
+# Максимальный размер страницы ListEvents
+MAX_PAGE_SIZE = 1000
+
+# Шаг начала слотов FindSlots по умолчанию и ограничения числа слотов в ответе
+DEFAULT_SLOT_GRANULARITY_MINUTES = 15
+DEFAULT_MAX_SLOTS = 100
+MAX_SLOTS = 1000
+
+# Размер порции потокового импорта и число порций, принимаемых наперед
+IMPORT_CHUNK_SIZE = 500
+IMPORT_PREFETCH_CHUNKS = 4
+
+# Сколько изменений подписка WatchEvents забирает из журнала за раз, как часто
+# проверяет, не отключился ли клиент, и через сколько секунд без сообщений
+# сообщает клиенту текущую ревизию
+WATCH_BATCH = 1000
+WATCH_POLL_INTERVAL = 1.0
+WATCH_PROGRESS_INTERVAL = 10.0
+
+# Подписка синхронного сервера занимает поток пула на все время подписки,
+# поэтому подпискам отдается не больше половины потоков, а остальные всегда
+# остаются обычным запросам
+WATCH_WORKERS_SHARE = 0.5
+
+# Поля EventDetails, которые UpdateEvent меняет (все или перечисленные в update_mask)
+UPDATABLE_FIELDS = frozenset((
+    'title', 'description', 'start_time', 'end_time', 'location', 'attendees', 'organizer', 'recurrence'
+))
+
+# Число ID в ответе SyncEvents по умолчанию и наибольшее
+DEFAULT_SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 10_000
+
+# Сервер принимает пинги keepalive клиентов (channels.ChannelConfig), в том числе
+# без активных вызовов, не чаще раза в MIN_KEEPALIVE_TIME секунд
+KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_ping_interval_without_data_ms', int(MIN_KEEPALIVE_TIME * 1000)),
+]
+
+_END_OF_STREAM = object()
+
+def read_ahead(iterator, chunk_size: int, prefetch: int) -> Iterator[list]:
+    """Читает поток порциями в фоновом потоке, опережая обработку на prefetch порций"""
+    chunks = queue.Queue(maxsize=prefetch)
+    stopped = threading.Event()
+    
+    def put(item):
+        # Проверяем остановку, чтобы не зависнуть, если обработчик завершился
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def reader():
+        try:
+            chunk = []
+            for item in iterator:
+                chunk.append(item)
+                if len(chunk) == chunk_size:
+                    put(chunk)
+                    chunk = []
+                if stopped.is_set():
+                    return
+            if chunk:
+                put(chunk)
+            put(_END_OF_STREAM)
+        except Exception as e:
+            put(e)
+    
+    threading.Thread(target=reader, daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+def encode_page_token(event: EventRecord) -> str:
+    """Кодирует позицию события в непрозрачный токен следующей страницы"""
+    position = f"{event.local_start}:{event.event_id}".encode()
+    return base64.urlsafe_b64encode(position).decode()
+
+def decode_page_token(token: str) -> Tuple[int, str]:
+    """Разбирает токен страницы обратно в (время начала, ID события)"""
+    try:
+        position = base64.urlsafe_b64decode(token.encode()).decode()
+        start, event_id = position.split(':', 1)
+        return int(start), event_id
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Некорректный токен страницы: {token}") from e
+
+def new_event_id() -> str:
+    """Генерирует случайный ID события"""
+    return f"event_{uuid.uuid4().hex[:8]}"
+
+def not_found_event(event_id: str) -> calendar_pb2.EventDetails:
+    """Ответ GetEvent для отсутствующего события"""
+    return calendar_pb2.EventDetails(
+        event_id=event_id,
+        title="",
+        description="Событие не найдено",
+        status="not_found"
+    )
+
+def serialize_response(serialize: Callable[[object], bytes]) -> Callable[[object], bytes]:
+    """Сериализатор ответа, пропускающий уже сериализованные байты (из ResponseCache)"""
+    def serializer(response) -> bytes:
+        if type(response) is bytes:
+            return response
+        return serialize(response)
+    return serializer
+
+def add_servicer(servicer, server):
+    """Регистрирует сервис календаря на сервере (синхронном или grpc.aio).
+    
+    В отличие от сгенерированного add_CalendarServiceServicer_to_server
+    методы могут возвращать готовые байты ответа, которые отправляются
+    без создания и сериализации сообщения.
+    """
+    service = calendar_pb2.DESCRIPTOR.services_by_name['CalendarService']
+    handler_types = {
+        (False, False): grpc.unary_unary_rpc_method_handler,
+        (False, True): grpc.unary_stream_rpc_method_handler,
+        (True, False): grpc.stream_unary_rpc_method_handler,
+        (True, True): grpc.stream_stream_rpc_method_handler,
+    }
+    handlers = {
+        method.name: handler_types[method.client_streaming, method.server_streaming](
+            getattr(servicer, method.name),
+            request_deserializer=getattr(calendar_pb2, method.input_type.name).FromString,
+            response_serializer=serialize_response(getattr(calendar_pb2, method.output_type.name).SerializeToString)
+        )
+        for method in service.methods
+    }
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service.full_name, handlers),))
+    server.add_registered_method_handlers(service.full_name, handlers)
+
+def not_modified_event(event_id: str, version: int) -> calendar_pb2.EventDetails:
+    """Ответ GetEvent, если версия события совпала с if_none_match"""
+    return calendar_pb2.EventDetails(event_id=event_id, version=version, status="not_modified")
+
+def version_mismatch_response(current: EventRecord) -> calendar_pb2.EventResponse:
+    """Ответ на условное изменение, если событие уже изменено другим запросом"""
+    return calendar_pb2.EventResponse(
+        success=False,
+        message=f"Событие изменено другим запросом (текущая версия {current.version})",
+        event=current.to_proto()
+    )
+
+def list_etag(events: List[EventRecord], next_page_token: str) -> str:
+    """Отпечаток страницы ListEvents: ID, версии и время событий и токен следующей страницы"""
+    digest = hashlib.blake2b(next_page_token.encode(), digest_size=12)
+    for event in events:
+        digest.update(f"\x1f{event.event_id}:{event.version}:{event.start}".encode())
+    return digest.hexdigest()
+
+def change_message(change: Change) -> calendar_pb2.EventChange:
+    """Сообщение WatchEvents об изменении события"""
+    revision, current, event = change
+    if event is None:
+        return calendar_pb2.EventChange(revision=revision, type='deleted', event=current.to_proto())
+    change_type = 'created' if current is None else 'updated'
+    return calendar_pb2.EventChange(revision=revision, type=change_type, event=event.to_proto())
+
+@lru_cache(maxsize=4 * WATCH_BATCH)
+def serialized_change(change: Change) -> bytes:
+    """Сообщение об изменении, сериализованное один раз для всех подписчиков"""
+    return change_message(change).SerializeToString()
+
+def progress_message(revision: int) -> calendar_pb2.EventChange:
+    """Сообщение WatchEvents о том, что изменения по фильтру до revision уже переданы"""
+    return calendar_pb2.EventChange(revision=revision, type='progress')
 
 class CalendarServicer(calendar_pb2_grpc.CalendarServiceServicer):
-    def __init__(self):
-        self.events_db = {}
-        self.initialize_sample_data()
+    def __init__(self, store: Optional[EventStore] = None, sample_data: bool = True,
+                 cache: Optional[ResponseCache] = None, max_watchers: Optional[int] = None):
+        self.store = InMemoryEventStore() if store is None else store
+        # Кеш ответов GetEvent и ListEvents вытесняется по изменениям хранилища
+        self.cache = ResponseCache() if cache is None else cache
+        self.store.add_listener(self.cache.invalidate)
+        # Последние изменения для подписок WatchEvents
+        self.changes = ChangeLog(self.store)
+        # Последние изменения каждого события (с удаленными) для SyncEvents
+        self.sync_index = SyncIndex(self.store)
+        # Места для одновременных подписок WatchEvents (None - без ограничения)
+        self.watch_slots = None if max_watchers is None else threading.BoundedSemaphore(max_watchers)
+        # Восстановленное с диска хранилище тестовыми данными не дополняем
+        if sample_data and not len(self.store):
+            self.initialize_sample_data()
     
     def initialize_sample_data(self):
         """Инициализирует тестовые данные"""
@@ -46,301 +261,1010 @@ class CalendarServicer(calendar_pb2_grpc.CalendarServiceServicer):
         ]
         
         for event in sample_events:
-            self.events_db[event['event_id']] = event
+            self.store.put(EventRecord.from_dict(event))
         
         print("Инициализированы тестовые события календаря")
     
-    def validate_event_times(self, start_time: str, end_time: str) -> bool:
-        """Проверяет корректность временных интервалов"""
+    def parse_event_times(self, start_time: str, end_time: str) -> Optional[Tuple[int, Optional[int], int, Optional[int]]]:
+        """Разбирает временной интервал события, None если он некорректен"""
         try:
-            start_dt = datetime.fromisoformat(start_time)
-            end_dt = datetime.fromisoformat(end_time)
-            
-            if end_dt <= start_dt:
-                return False
-                
-            return True
+            start, start_offset = parse_time(start_time)
+            end, end_offset = parse_time(end_time)
         except (ValueError, TypeError):
-            return False
+            return None
+        
+        if end <= start:
+            return None
+        
+        return start, start_offset, end, end_offset
+    
+    def validate_event_times(self, start_time: str, end_time: str) -> bool:
+        """Проверяет корректность временных интервалов"""
+        return self.parse_event_times(start_time, end_time) is not None
     
-    def check_time_conflicts(self, event_id: Optional[str], start_time: str, end_time: str, attendees: List[str]) -> List[str]:
+    def format_conflicts(self, overlaps) -> List[str]:
+        """Формирует сообщения о конфликтах по найденным пересечениям"""
+        return [
+            f"Конфликт с событием '{event.title}' для участников: {', '.join(common_attendees)}"
+            for event, common_attendees in overlaps
+        ]
+    
+    def check_time_conflicts(self, event_id: Optional[str], start: int, end: int, attendees: List[str]) -> List[str]:
         """Проверяет конфликты времени для участников"""
-        conflicts = []
-        start_dt = datetime.fromisoformat(start_time)
-        end_dt = datetime.fromisoformat(end_time)
-        
-        for existing_id, event in self.events_db.items():
-            if event_id and existing_id == event_id:
-                continue  # Пропускаем текущее событие при обновлении
-                
-            if event['status'] != 'scheduled':
-                continue  # Пропускаем отмененные и завершенные события
-                
-            existing_start = datetime.fromisoformat(event['start_time'])
-            existing_end = datetime.fromisoformat(event['end_time'])
-            
-            # Проверяем пересечение временных интервалов
-            if not (end_dt <= existing_start or start_dt >= existing_end):
-                # Проверяем пересечение участников
-                common_attendees = set(attendees) & set(event['attendees'])
-                if common_attendees:
-                    conflicts.append(f"Конфликт с событием '{event['title']}' для участников: {', '.join(common_attendees)}")
-        
-        return conflicts
+        # Индекс содержит только запланированные события и возвращает лишь те,
+        # что пересекаются с интервалом и имеют общих участников
+        return self.format_conflicts(self.store.find_conflicts(start, end, attendees, exclude_id=event_id))
     
-    def CreateEvent(self, request, context):
-        """Создает новое событие в календаре"""
-        print(f"Запрос на создание события: {request.title}")
-        
-        # Генерируем уникальный ID
-        event_id = f"event_{uuid.uuid4().hex[:8]}"
-        
-        # Валидация временных интервалов
-        if not self.validate_event_times(request.start_time, request.end_time):
-            return calendar_pb2.EventResponse(
-                success=False,
-                message="Некорректные временные интервалы. Конечное время должно быть после начального"
-            )
-        
-        # Проверка конфликтов
-        conflicts = self.check_time_conflicts(
-            None, request.start_time, request.end_time, list(request.attendees)
+    def conflict_response(self, overlaps) -> calendar_pb2.EventResponse:
+        conflict_msg = "; ".join(self.format_conflicts(overlaps))
+        return calendar_pb2.EventResponse(
+            success=False,
+            message=f"Обнаружены конфликты расписания: {conflict_msg}"
         )
+    
+    def parse_recurrence(self, request, start: int, start_offset: Optional[int], end: int) -> Optional[Recurrence]:
+        """Правило повторения из запроса (None - обычное событие), ValueError - правило некорректно"""
+        if not request.HasField('recurrence'):
+            return None
+        try:
+            recurrence = Recurrence.from_proto(request.recurrence)
+        except ValueError as e:
+            raise ValueError(f"Некорректное правило повторения: {e}") from e
+        return self.check_recurrence(recurrence, start, start_offset, end)
+    
+    def check_recurrence(self, recurrence: Optional[Recurrence], start: int, start_offset: Optional[int],
+                         end: int) -> Optional[Recurrence]:
+        """Проверяет правило для серии с этим временем первого вхождения, ValueError - правило некорректно"""
+        if recurrence is not None:
+            try:
+                recurrence.validate(start, (start_offset or 0) * 1_000_000, end - start)
+            except ValueError as e:
+                raise ValueError(f"Некорректное правило повторения: {e}") from e
+        return recurrence
+    
+    def build_event(self, request) -> EventRecord:
+        """Запись нового события из запроса, ValueError - запрос некорректен"""
+        times = self.parse_event_times(request.start_time, request.end_time)
+        if times is None:
+            raise ValueError("Некорректные временные интервалы. Конечное время должно быть после начального")
+        start, start_offset, end, end_offset = times
+        recurrence = self.parse_recurrence(request, start, start_offset, end)
         
-        if conflicts:
-            conflict_msg = "; ".join(conflicts)
-            return calendar_pb2.EventResponse(
-                success=False,
-                message=f"Обнаружены конфликты расписания: {conflict_msg}"
-            )
-        
-        # Создаем событие
-        now = datetime.now().isoformat()
-        event_data = {
-            'event_id': event_id,
-            'title': request.title,
-            'description': request.description,
-            'start_time': request.start_time,
-            'end_time': request.end_time,
-            'location': request.location,
-            'attendees': list(request.attendees),
-            'organizer': request.organizer,
-            'status': 'scheduled',
-            'created_at': now,
-            'updated_at': now
-        }
-        
-        # Сохраняем в базу
-        self.events_db[event_id] = event_data
-        
-        print(f"Событие создано: {event_id} - {request.title}")
-        
-        # Создаем ответ
-        event_response = calendar_pb2.EventDetails(
-            event_id=event_id,
+        now = current_timestamp()
+        return EventRecord(
+            event_id=new_event_id(),
             title=request.title,
             description=request.description,
-            start_time=request.start_time,
-            end_time=request.end_time,
+            start=start,
+            end=end,
             location=request.location,
             attendees=request.attendees,
             organizer=request.organizer,
             status='scheduled',
             created_at=now,
-            updated_at=now
+            updated_at=now,
+            start_offset=start_offset,
+            end_offset=end_offset,
+            recurrence=recurrence
         )
+    
+    def create_event(self, request, include_event: bool = True) -> calendar_pb2.EventResponse:
+        """Проверяет и сохраняет новое событие, возвращая результат операции"""
+        return self.create_events([request], include_event)[0]
+    
+    def create_events(self, requests, include_event: bool = True,
+                      bulk: bool = True) -> List[calendar_pb2.EventResponse]:
+        """Проверяет и сохраняет события по порядку, возвращая результат каждого.
         
-        return calendar_pb2.EventResponse(
-            success=True,
-            message="Событие успешно создано",
-            event=event_response
-        )
+        Для крупного пакета конфликты с хранилищем сначала вычисляются сразу
+        для всех событий (BulkConflictChecker), так же проверяются вхождения
+        конечной серии. Хранилище принимает эти конфликты без повторной
+        проверки, если с тех пор его не меняли. bulk=False - каждое событие
+        проверяется только хранилищем (для сравнения в benchmark.py).
+        """
+        events = []
+        for request in requests:
+            try:
+                with phase('validation'):
+                    events.append(self.build_event(request))
+            except ValueError as e:
+                events.append(e)
+        valid = [event for event in events if isinstance(event, EventRecord)]
+        checker = None
+        if bulk and len(valid) >= BULK_THRESHOLD:
+            checker = BulkConflictChecker(self.store, valid)
+            if not checker.bulk:
+                # Проверка по одному все равно повторится в store.create
+                checker = None
+        
+        responses = []
+        position = 0
+        for event in events:
+            # Валидация временных интервалов и правила повторения
+            if isinstance(event, ValueError):
+                responses.append(calendar_pb2.EventResponse(success=False, message=str(event)))
+                continue
+            
+            checked = None
+            if checker is not None:
+                checked = checker.checked(position)
+                position += 1
+            if checked is None and bulk and event.recurrence is not None:
+                with phase('conflict_check'):
+                    checked = check_series(self.store, event)
+            
+            # Проверка конфликтов и сохранение выполняются хранилищем атомарно
+            while True:
+                try:
+                    conflicts = self.store.create(event, checked)
+                    break
+                except KeyError:
+                    # Совпал случайный ID - генерируем новый
+                    event = event.replace(event_id=new_event_id())
+            
+            if conflicts:
+                responses.append(self.conflict_response(conflicts))
+                continue
+            
+            if checker is not None:
+                checker.accept(event)
+            responses.append(calendar_pb2.EventResponse(
+                success=True,
+                message="Событие успешно создано",
+                event=event.to_proto() if include_event else None
+            ))
+        
+        return responses
+    
+    def CreateEvent(self, request, context):
+        """Создает новое событие в календаре"""
+        log.debug('CreateEvent', "Запрос на создание события", title=request.title)
+        
+        response = self.create_event(request)
+        
+        if response.success:
+            log.info('CreateEvent', "Событие создано", event_id=response.event.event_id, title=request.title)
+        
+        return response
     
     def GetEvent(self, request, context):
-        """Получает информацию о событии"""
-        print(f"Запрос на получение события: {request.event_id}")
-        
-        if request.event_id not in self.events_db:
-            return calendar_pb2.EventDetails(
-                event_id=request.event_id,
-                title="",
-                description="Событие не найдено",
-                status="not_found"
-            )
+        """Получает информацию о событии (сериализованный ответ - из кеша).
         
-        event = self.events_db[request.event_id]
-        
-        return calendar_pb2.EventDetails(
-            event_id=event['event_id'],
-            title=event['title'],
-            description=event['description'],
-            start_time=event['start_time'],
-            end_time=event['end_time'],
-            location=event['location'],
-            attendees=event['attendees'],
-            organizer=event['organizer'],
-            status=event['status'],
-            created_at=event['created_at'],
-            updated_at=event['updated_at']
+        Если версия события равна if_none_match, возвращается только ID
+        и версия со статусом not_modified.
+        """
+        log.debug('GetEvent', "Запрос на получение события", event_id=request.event_id)
+        
+        cached = self.cache.get_event(request.event_id)
+        if cached is None:
+            revision = self.cache.revision
+            event = self.store.get(request.event_id)
+            if event is None:
+                return not_found_event(request.event_id)
+            if request.if_none_match and request.if_none_match == event.version:
+                return not_modified_event(request.event_id, event.version)
+            with phase('serialization'):
+                cached = (event.to_proto().SerializeToString(), event.version)
+            self.cache.put_event(request.event_id, *cached, revision)
+        
+        data, version = cached
+        if request.if_none_match and request.if_none_match == version:
+            return not_modified_event(request.event_id, version)
+        return data
+    
+    def updated_fields(self, current: EventRecord, request, fields: frozenset) -> Dict[str, object]:
+        """Новые значения полей fields записи current из запроса, ValueError - запрос некорректен"""
+        changes = {name: getattr(request, name)
+                   for name in ('title', 'description', 'location', 'attendees', 'organizer') if name in fields}
+        if fields.isdisjoint(('start_time', 'end_time', 'recurrence')):
+            return changes
+        
+        # Время и правило повторения проверяются вместе: правило зависит от первого вхождения
+        times = self.parse_event_times(
+            request.start_time if 'start_time' in fields else current.start_time,
+            request.end_time if 'end_time' in fields else current.end_time
         )
+        if times is None:
+            raise ValueError("Некорректные временные интервалы")
+        start, start_offset, end, end_offset = times
+        if 'recurrence' in fields:
+            recurrence = self.parse_recurrence(request, start, start_offset, end)
+        else:
+            recurrence = self.check_recurrence(current.recurrence, start, start_offset, end)
+        changes.update(start=start, end=end, start_offset=start_offset, end_offset=end_offset,
+                       recurrence=recurrence)
+        return changes
     
     def UpdateEvent(self, request, context):
-        """Обновляет существующее событие"""
-        print(f"Запрос на обновление события: {request.event_id}")
+        """Обновляет существующее событие.
         
-        if request.event_id not in self.events_db:
+        С update_mask меняются только перечисленные поля, остальные берутся
+        из текущей версии события, поэтому клиенту не нужно сначала получать
+        событие целиком. Конфликты проверяются, только если изменилось время
+        или участники.
+        """
+        log.debug('UpdateEvent', "Запрос на обновление события", event_id=request.event_id)
+        
+        fields = frozenset(request.update_mask.paths) or UPDATABLE_FIELDS
+        if not fields <= UPDATABLE_FIELDS:
             return calendar_pb2.EventResponse(
                 success=False,
-                message="Событие не найдено"
+                message=f"Нельзя изменить поля: {', '.join(sorted(fields - UPDATABLE_FIELDS))}"
             )
         
-        # Валидация временных интервалов
-        if not self.validate_event_times(request.start_time, request.end_time):
-            return calendar_pb2.EventResponse(
-                success=False,
-                message="Некорректные временные интервалы"
+        def updated(current: EventRecord) -> EventRecord:
+            # Условие if_match проверяется на той версии, которую заменяем
+            if request.version and current.version != request.version:
+                raise VersionMismatch(current)
+            with phase('validation'):
+                changes = self.updated_fields(current, request, fields)
+            return current.replace(
+                **changes,
+                updated_at=current_timestamp(),
+                version=current.version + 1
             )
         
-        # Проверка конфликтов (исключая текущее событие)
-        conflicts = self.check_time_conflicts(
-            request.event_id, request.start_time, request.end_time, list(request.attendees)
-        )
+        # Проверка конфликтов (исключая текущее событие) и замена записи атомарны
+        try:
+            event, conflicts = self.store.update(request.event_id, updated)
+        except VersionMismatch as e:
+            return version_mismatch_response(e.current)
+        except ValueError as e:
+            return calendar_pb2.EventResponse(success=False, message=str(e))
         
         if conflicts:
-            conflict_msg = "; ".join(conflicts)
+            return self.conflict_response(conflicts)
+        
+        if event is None:
             return calendar_pb2.EventResponse(
                 success=False,
-                message=f"Обнаружены конфликты расписания: {conflict_msg}"
+                message="Событие не найдено"
             )
         
-        # Обновляем событие
-        event = self.events_db[request.event_id]
-        event.update({
-            'title': request.title,
-            'description': request.description,
-            'start_time': request.start_time,
-            'end_time': request.end_time,
-            'location': request.location,
-            'attendees': list(request.attendees),
-            'organizer': request.organizer,
-            'updated_at': datetime.now().isoformat()
-        })
-        
-        print(f"Событие обновлено: {request.event_id} - {request.title}")
-        
-        # Создаем ответ
-        event_response = calendar_pb2.EventDetails(
-            event_id=event['event_id'],
-            title=event['title'],
-            description=event['description'],
-            start_time=event['start_time'],
-            end_time=event['end_time'],
-            location=event['location'],
-            attendees=event['attendees'],
-            organizer=event['organizer'],
-            status=event['status'],
-            created_at=event['created_at'],
-            updated_at=event['updated_at']
-        )
+        log.info('UpdateEvent', "Событие обновлено", event_id=request.event_id, title=event.title)
         
         return calendar_pb2.EventResponse(
             success=True,
             message="Событие успешно обновлено",
-            event=event_response
+            event=event.to_proto()
         )
     
-    def DeleteEvent(self, request, context):
-        """Удаляет событие"""
-        print(f"Запрос на удаление события: {request.event_id}")
-        
-        if request.event_id not in self.events_db:
+    def delete_event(self, event_id: str, version: Optional[int] = None) -> calendar_pb2.EventResponse:
+        """Удаляет событие (с version - только эту версию), возвращая результат операции"""
+        try:
+            event = self.store.delete(event_id, version)
+        except VersionMismatch as e:
+            return version_mismatch_response(e.current)
+        if event is None:
             return calendar_pb2.EventResponse(
                 success=False,
                 message="Событие не найдено"
             )
         
-        event_title = self.events_db[request.event_id]['title']
-        del self.events_db[request.event_id]
-        
-        print(f"Событие удалено: {request.event_id} - {event_title}")
-        
         return calendar_pb2.EventResponse(
             success=True,
-            message=f"Событие '{event_title}' успешно удалено"
+            message=f"Событие '{event.title}' успешно удалено"
         )
     
-    def ListEvents(self, request, context):
-        """Возвращает список событий по фильтру"""
-        print("Запрос на список событий с фильтром")
+    def DeleteEvent(self, request, context):
+        """Удаляет событие"""
+        log.debug('DeleteEvent', "Запрос на удаление события", event_id=request.event_id)
+        
+        response = self.delete_event(request.event_id, request.if_match or None)
+        
+        if response.success:
+            log.info('DeleteEvent', "Событие удалено", event_id=request.event_id)
+        
+        return response
+    
+    def BatchCreateEvents(self, request, context):
+        """Создает пакет событий за один проход.
+        
+        События проверяются и сохраняются по порядку, поэтому каждое следующее
+        событие проверяется на конфликты и с уже принятыми событиями пакета.
+        """
+        log.debug('BatchCreateEvents', "Запрос на пакетное создание событий", count=len(request.events))
+        
+        results = self.create_events(request.events)
+        success_count = sum(1 for result in results if result.success)
+        
+        log.info('BatchCreateEvents', "Созданы события", created=success_count, count=len(results))
+        
+        return calendar_pb2.BatchEventResponse(results=results, success_count=success_count)
+    
+    def import_chunk(self, chunk: list, offset: int) -> Tuple[int, list]:
+        """Сохраняет порцию импорта, возвращая число принятых событий и ошибки"""
+        imported = 0
+        errors = []
+        responses = self.create_events(chunk, include_event=False)
+        for index, (request, response) in enumerate(zip(chunk, responses), offset):
+            if response.success:
+                imported += 1
+            else:
+                errors.append(calendar_pb2.ImportError(
+                    index=index, title=request.title, message=response.message
+                ))
+        return imported, errors
+    
+    def ImportEvents(self, request_iterator, context):
+        """Импортирует поток событий порциями, подтверждая прогресс после каждой.
         
-        filtered_events = []
+        Прием и разбор следующих порций идет в фоновом потоке параллельно
+        с проверкой и сохранением текущей, а ограниченная очередь порций
+        сохраняет управление потоком HTTP/2 для отправителя.
+        """
+        log.debug('ImportEvents', "Запрос на потоковый импорт событий")
         
-        for event in self.events_db.values():
-            # Применяем фильтры
-            matches = True
+        processed = imported = 0
+        for chunk in read_ahead(request_iterator, IMPORT_CHUNK_SIZE, IMPORT_PREFETCH_CHUNKS):
+            chunk_imported, errors = self.import_chunk(chunk, processed)
+            processed += len(chunk)
+            imported += chunk_imported
             
+            yield calendar_pb2.ImportResult(
+                processed=processed,
+                imported=imported,
+                failed=processed - imported,
+                errors=errors
+            )
+        
+        log.info('ImportEvents', "Импорт завершен", imported=imported, processed=processed)
+    
+    def BatchGetEvents(self, request, context):
+        """Возвращает события по списку ID в порядке запроса"""
+        log.debug('BatchGetEvents', "Запрос на получение событий", count=len(request.event_ids))
+        
+        events = []
+        for event_id in request.event_ids:
+            event = self.store.get(event_id)
+            if event is None:
+                events.append(not_found_event(event_id))
+            else:
+                events.append(event.to_proto())
+        
+        return calendar_pb2.EventList(events=events, total_count=len(events))
+    
+    def BatchDeleteEvents(self, request, context):
+        """Удаляет события по списку ID"""
+        log.debug('BatchDeleteEvents', "Запрос на пакетное удаление событий", count=len(request.event_ids))
+        
+        results = [self.delete_event(event_id) for event_id in request.event_ids]
+        success_count = sum(1 for result in results if result.success)
+        
+        log.info('BatchDeleteEvents', "Удалены события", deleted=success_count, count=len(results))
+        
+        return calendar_pb2.BatchEventResponse(results=results, success_count=success_count)
+    
+    def parse_filter(self, request) -> ListKey:
+        """Нормализованный фильтр EventsFilter (он же ключ кеша ListEvents).
+        
+        ValueError означает некорректный запрос.
+        """
+        # Границы дат разбираем один раз на запрос, а не на каждое событие
+        lower = upper = None
+        try:
             if request.start_date:
-                event_start = datetime.fromisoformat(event['start_time']).date()
-                filter_start = datetime.fromisoformat(request.start_date).date()
-                if event_start < filter_start:
-                    matches = False
-            
-            if matches and request.end_date:
-                event_start = datetime.fromisoformat(event['start_time']).date()
-                filter_end = datetime.fromisoformat(request.end_date).date()
-                if event_start > filter_end:
-                    matches = False
-            
-            if matches and request.organizer and event['organizer'] != request.organizer:
-                matches = False
-            
-            if matches and request.status and event['status'] != request.status:
-                matches = False
-            
-            if matches:
-                filtered_events.append(calendar_pb2.EventDetails(
-                    event_id=event['event_id'],
-                    title=event['title'],
-                    description=event['description'],
-                    start_time=event['start_time'],
-                    end_time=event['end_time'],
-                    location=event['location'],
-                    attendees=event['attendees'],
-                    organizer=event['organizer'],
-                    status=event['status'],
-                    created_at=event['created_at'],
-                    updated_at=event['updated_at']
-                ))
+                lower = day_start(request.start_date)
+            if request.end_date:
+                upper = day_start(request.end_date) + DAY
+        except ValueError as e:
+            raise ValueError("Некорректная дата в фильтре") from e
+        
+        after = None
+        if request.page_token:
+            after = decode_page_token(request.page_token)
+        
+        page_size = min(request.page_size, MAX_PAGE_SIZE) if request.page_size > 0 else 0
+        return lower, upper, request.organizer, request.status, after, page_size
+    
+    def filter_events(self, request) -> Iterator[EventRecord]:
+        """Лениво выдает события по фильтру EventsFilter в порядке времени начала.
+        
+        Фильтр разбирается сразу, ValueError означает некорректный запрос.
+        """
+        lower, upper, organizer, status, after, _ = self.parse_filter(request)
+        # Планировщик хранилища выбирает самый избирательный индекс
+        return self.store.iter_query(lower, upper, organizer, status, after)
+    
+    def list_events(self, request) -> calendar_pb2.EventList:
+        """Собирает страницу событий по фильтру (все события, если page_size не задан)"""
+        events, next_page_token = self.query_page(self.parse_filter(request))
+        return self.page_response(events, next_page_token, list_etag(events, next_page_token))
+    
+    def query_page(self, key: ListKey) -> Tuple[List[EventRecord], str]:
+        """Страница событий по нормализованному фильтру и токен следующей страницы"""
+        lower, upper, organizer, status, after, page_size = key
+        events = self.store.iter_query(lower, upper, organizer, status, after)
+        next_page_token = ""
         
-        print(f"Найдено событий: {len(filtered_events)}")
+        if not page_size:
+            return list(events), next_page_token
+        
+        # Берем на одно событие больше, чтобы узнать, есть ли следующая страница
+        page = list(islice(events, page_size + 1))
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_page_token = encode_page_token(page[-1])
+        return page, next_page_token
+    
+    def page_response(self, events: List[EventRecord], next_page_token: str, etag: str) -> calendar_pb2.EventList:
+        filtered_events = [event.to_proto() for event in events]
         
         return calendar_pb2.EventList(
             events=filtered_events,
-            total_count=len(filtered_events)
+            total_count=len(filtered_events),
+            next_page_token=next_page_token,
+            etag=etag
+        )
+    
+    def cached_list(self, request) -> Tuple[bytes, Optional[int]]:
+        """Сериализованный ответ ListEvents и число событий в нем (из кеша, если есть).
+        
+        Если etag страницы равен if_none_match, возвращается короткий ответ
+        not_modified без событий, а число событий - None.
+        """
+        key = self.parse_filter(request)
+        cached = self.cache.get_list(key)
+        if cached is None:
+            revision = self.cache.revision
+            events, next_page_token = self.query_page(key)
+            etag = list_etag(events, next_page_token)
+            if request.if_none_match == etag:
+                # Страница не изменилась - события не сериализуем
+                return calendar_pb2.EventList(etag=etag, not_modified=True).SerializeToString(), None
+            with phase('serialization'):
+                response = self.page_response(events, next_page_token, etag)
+                cached = (response.SerializeToString(), len(events), etag)
+            self.cache.put_list(key, *cached, revision)
+        
+        data, count, etag = cached
+        if request.if_none_match == etag:
+            return calendar_pb2.EventList(etag=etag, not_modified=True).SerializeToString(), None
+        return data, count
+    
+    def ListEvents(self, request, context):
+        """Возвращает список событий по фильтру (постранично, если задан page_size)"""
+        log.debug('ListEvents', "Запрос на список событий с фильтром")
+        
+        try:
+            data, count = self.cached_list(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        if count is None:
+            log.info('ListEvents', "Список событий не изменился")
+        else:
+            log.info('ListEvents', "Найдены события", count=count)
+        
+        return data
+    
+    def StreamEvents(self, request, context):
+        """Потоково выдает события по фильтру, не собирая их в один ответ.
+        
+        page_token позволяет продолжить прерванный поток, page_size игнорируется.
+        """
+        log.debug('StreamEvents', "Запрос на потоковый список событий с фильтром")
+        
+        try:
+            events = self.filter_events(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        count = 0
+        for event in events:
+            yield event.to_proto()
+            count += 1
+        
+        log.info('StreamEvents', "Отправлены события", count=count)
+    
+    def watch_start(self, request) -> Tuple[ListKey, int]:
+        """Фильтр подписки и ревизия, после которой выдаются изменения.
+        
+        ValueError - некорректный запрос, RevisionCompacted - изменения после
+        since_revision уже вытеснены из журнала.
+        """
+        lower, upper, organizer, status, _, _ = self.parse_filter(request.filter)
+        revision = request.since_revision or self.changes.revision
+        # Проверяем, что изменения после revision еще есть в журнале
+        self.changes.read(revision, 0)
+        return (lower, upper, organizer, status, None, 0), revision
+    
+    def watch_batch(self, key: ListKey, revision: int) -> Tuple[List[bytes], int]:
+        """Сериализованные изменения по фильтру после revision и ревизия, до которой журнал прочитан"""
+        changes = self.changes.read(revision, WATCH_BATCH)
+        if not changes:
+            return [], revision
+        messages = [
+            serialized_change(change) for change in changes
+            if any(record is not None and list_matches(key, record) for record in change[1:])
+        ]
+        return messages, changes[-1][0]
+    
+    def WatchEvents(self, request, context):
+        """Потоково выдает изменения событий по фильтру по мере их появления.
+        
+        Первое сообщение - progress с ревизией начала подписки, дальше идут
+        изменения в порядке ревизий, а после WATCH_PROGRESS_INTERVAL секунд
+        без сообщений - снова progress, чтобы клиент мог продолжить подписку
+        с этой ревизии. Изменение выдается, если фильтру соответствует старая
+        или новая версия события. Подписка держит поток пула, поэтому сверх
+        max_watchers одновременных подписок сервер отвечает RESOURCE_EXHAUSTED.
+        """
+        log.debug('WatchEvents', "Запрос на подписку на изменения событий")
+        
+        if self.watch_slots is not None and not self.watch_slots.acquire(blocking=False):
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          "Все места для подписок заняты; для большого числа подписок "
+                          "сервер запускают с --async")
+        try:
+            yield from self.watch_events(request, context)
+        finally:
+            if self.watch_slots is not None:
+                self.watch_slots.release()
+    
+    def watch_events(self, request, context):
+        """Поток сообщений подписки синхронного сервера"""
+        try:
+            key, revision = self.watch_start(request)
+        except RevisionCompacted as e:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        yield progress_message(revision)
+        last_sent = time.monotonic()
+        while context.is_active():
+            try:
+                messages, next_revision = self.watch_batch(key, revision)
+            except RevisionCompacted as e:
+                # Подписчик отстал больше чем на емкость журнала
+                context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+            yield from messages
+            if messages:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= WATCH_PROGRESS_INTERVAL:
+                yield progress_message(next_revision)
+                last_sent = time.monotonic()
+            if next_revision == revision:
+                self.changes.wait(revision, WATCH_POLL_INTERVAL)
+            revision = next_revision
+        
+        log.info('WatchEvents', "Подписка на изменения завершена", revision=revision)
+    
+    def sync_events(self, request) -> calendar_pb2.SyncResponse:
+        """Изменения после токена запроса; ValueError - некорректный запрос"""
+        if request.limit < 0:
+            raise ValueError("Лимит не может быть отрицательным")
+        limit = min(request.limit or DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT)
+        if not request.sync_token:
+            return calendar_pb2.SyncResponse(sync_token=self.sync_index.token(), reset=True)
+        try:
+            changed, deleted, token, has_more = self.sync_index.read(request.sync_token, limit)
+        except SyncReset:
+            return calendar_pb2.SyncResponse(sync_token=self.sync_index.token(), reset=True)
+        return calendar_pb2.SyncResponse(changed_ids=changed, deleted_ids=deleted,
+                                         sync_token=token, has_more=has_more)
+    
+    def SyncEvents(self, request, context):
+        """Возвращает ID событий, измененных и удаленных после токена синхронизации.
+        
+        Ответ с reset означает, что изменения после токена неизвестны:
+        клиент загружает события заново через ListEvents и продолжает
+        синхронизацию с токена из этого ответа.
+        """
+        log.debug('SyncEvents', "Запрос на синхронизацию изменений")
+        
+        try:
+            response = self.sync_events(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        if response.reset:
+            log.info('SyncEvents', "Нужна полная загрузка событий")
+        else:
+            log.info('SyncEvents', "Изменения после токена", changed=len(response.changed_ids), deleted=len(response.deleted_ids))
+        
+        return response
+    
+    def parse_window(self, request) -> Tuple[int, int, Optional[int]]:
+        """Окно поиска свободного времени: (начало, конец, смещение пояса начала в секундах).
+        
+        Время в ответе выводится в поясе начала окна. ValueError означает
+        некорректный запрос.
+        """
+        if not request.attendees:
+            raise ValueError("Не указаны участники")
+        times = self.parse_event_times(request.start_time, request.end_time)
+        if times is None:
+            raise ValueError("Некорректное окно поиска. Конечное время должно быть после начального")
+        start, start_offset, end, _ = times
+        if end - start > MAX_WINDOW:
+            raise ValueError("Окно поиска не может быть длиннее года")
+        return start, end, start_offset
+    
+    def intervals_to_proto(self, intervals, offset: Optional[int],
+                           formatted: Optional[Dict[int, str]] = None) -> List[calendar_pb2.TimeInterval]:
+        """Сообщения TimeInterval; formatted - общий для ответа кеш строк времени"""
+        if formatted is None:
+            formatted = {}
+        
+        def time_string(timestamp: int) -> str:
+            value = formatted.get(timestamp)
+            if value is None:
+                value = formatted[timestamp] = format_time(timestamp, offset)
+            return value
+        
+        return [
+            calendar_pb2.TimeInterval(start_time=time_string(start), end_time=time_string(end))
+            for start, end in intervals
+        ]
+    
+    def free_busy(self, request) -> calendar_pb2.FreeBusyResponse:
+        """Занятое время каждого участника и всех вместе в окне запроса"""
+        start, end, offset = self.parse_window(request)
+        busy = busy_by_attendee(self.store, start, end, request.attendees)
+        # Общие встречи участников дают одни и те же моменты времени
+        formatted: Dict[int, str] = {}
+        return calendar_pb2.FreeBusyResponse(
+            attendees=[
+                calendar_pb2.AttendeeBusy(attendee=attendee,
+                                          busy=self.intervals_to_proto(intervals, offset, formatted))
+                for attendee, intervals in busy.items()
+            ],
+            busy=self.intervals_to_proto(merge_intervals(
+                interval for intervals in busy.values() for interval in intervals
+            ), offset, formatted)
         )
+    
+    def find_slots(self, request) -> calendar_pb2.FindSlotsResponse:
+        """Слоты длиной duration_minutes, в которые свободны все участники запроса"""
+        start, end, offset = self.parse_window(request)
+        if request.duration_minutes <= 0:
+            raise ValueError("Длительность слота должна быть положительной")
+        if request.granularity_minutes < 0 or request.max_slots < 0:
+            raise ValueError("Шаг и число слотов не могут быть отрицательными")
+        minute = 60 * 1_000_000
+        granularity = (request.granularity_minutes or DEFAULT_SLOT_GRANULARITY_MINUTES) * minute
+        max_slots = min(request.max_slots or DEFAULT_MAX_SLOTS, MAX_SLOTS)
+        
+        merged = merged_busy(self.store, start, end, request.attendees)
+        # Слоты выравниваются по часам пояса окна
+        slots = islice(free_slots(merged, start, end, request.duration_minutes * minute, granularity,
+                                  (offset or 0) * 1_000_000), max_slots)
+        return calendar_pb2.FindSlotsResponse(slots=self.intervals_to_proto(slots, offset))
+    
+    def GetFreeBusy(self, request, context):
+        """Возвращает объединенные интервалы занятости участников в окне"""
+        log.debug('GetFreeBusy', "Запрос занятости участников", attendees=len(request.attendees))
+        
+        try:
+            return self.free_busy(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+    
+    def FindSlots(self, request, context):
+        """Находит время, когда свободны все участники"""
+        log.debug('FindSlots', "Запрос свободного времени участников", attendees=len(request.attendees))
+        
+        try:
+            response = self.find_slots(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        log.info('FindSlots', "Найдены слоты", count=len(response.slots))
+        
+        return response
 
-def serve():
-    """Запускает gRPC сервер календаря"""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    calendar_pb2_grpc.add_CalendarServiceServicer_to_server(CalendarServicer(), server)
-    server.add_insecure_port('[::]:50054')
-    server.start()
+class AsyncCalendarServicer(CalendarServicer):
+    """Сервис календаря для асинхронного сервера grpc.aio.
     
-    print("Сервер CalendarService запущен на порту 50054")
+    Хранилище находится в памяти и не ждет ввода-вывода, поэтому обработчики
+    выполняют общую логику прямо в цикле событий, а потоковые методы уступают
+    управление при отправке каждого сообщения. Так один процесс удерживает
+    тысячи одновременных вызовов без пула потоков.
+    """
+    
+    async def write(self, method, *args):
+        """Выполняет запись; если хранилище пишет на диск - в пуле потоков.
+        
+        Запись ждет fsync, и это ожидание не должно останавливать цикл событий.
+        """
+        if not self.store.blocks_on_write:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+    
+    async def CreateEvent(self, request, context):
+        return await self.write(super().CreateEvent, request, context)
+    
+    async def GetEvent(self, request, context):
+        return super().GetEvent(request, context)
+    
+    async def UpdateEvent(self, request, context):
+        return await self.write(super().UpdateEvent, request, context)
+    
+    async def DeleteEvent(self, request, context):
+        return await self.write(super().DeleteEvent, request, context)
+    
+    async def ListEvents(self, request, context):
+        log.debug('ListEvents', "Запрос на список событий с фильтром")
+        
+        try:
+            data, count = self.cached_list(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        if count is None:
+            log.info('ListEvents', "Список событий не изменился")
+        else:
+            log.info('ListEvents', "Найдены события", count=count)
+        
+        return data
+    
+    async def StreamEvents(self, request, context):
+        log.debug('StreamEvents', "Запрос на потоковый список событий с фильтром")
+        
+        try:
+            events = self.filter_events(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        count = 0
+        for event in events:
+            yield event.to_proto()
+            count += 1
+        
+        log.info('StreamEvents', "Отправлены события", count=count)
+    
+    async def GetFreeBusy(self, request, context):
+        log.debug('GetFreeBusy', "Запрос занятости участников", attendees=len(request.attendees))
+        
+        try:
+            return self.free_busy(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+    
+    async def FindSlots(self, request, context):
+        log.debug('FindSlots', "Запрос свободного времени участников", attendees=len(request.attendees))
+        
+        try:
+            response = self.find_slots(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        log.info('FindSlots', "Найдены слоты", count=len(response.slots))
+        
+        return response
+    
+    async def WatchEvents(self, request, context):
+        log.debug('WatchEvents', "Запрос на подписку на изменения событий")
+        
+        try:
+            key, revision = self.watch_start(request)
+        except RevisionCompacted as e:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        yield progress_message(revision)
+        last_sent = time.monotonic()
+        # Отключение клиента отменяет корутину в ожидании
+        while True:
+            try:
+                messages, next_revision = self.watch_batch(key, revision)
+            except RevisionCompacted as e:
+                await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+            for message in messages:
+                yield message
+            if messages:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= WATCH_PROGRESS_INTERVAL:
+                yield progress_message(next_revision)
+                last_sent = time.monotonic()
+            if next_revision == revision:
+                await self.changes.wait_async(revision, WATCH_PROGRESS_INTERVAL)
+            revision = next_revision
+    
+    async def SyncEvents(self, request, context):
+        log.debug('SyncEvents', "Запрос на синхронизацию изменений")
+        
+        try:
+            response = self.sync_events(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        if response.reset:
+            log.info('SyncEvents', "Нужна полная загрузка событий")
+        else:
+            log.info('SyncEvents', "Изменения после токена", changed=len(response.changed_ids), deleted=len(response.deleted_ids))
+        
+        return response
+    
+    async def BatchCreateEvents(self, request, context):
+        return await self.write(super().BatchCreateEvents, request, context)
+    
+    async def BatchGetEvents(self, request, context):
+        return super().BatchGetEvents(request, context)
+    
+    async def BatchDeleteEvents(self, request, context):
+        return await self.write(super().BatchDeleteEvents, request, context)
+    
+    async def ImportEvents(self, request_iterator, context):
+        log.debug('ImportEvents', "Запрос на потоковый импорт событий")
+        
+        processed = imported = 0
+        chunk = []
+        
+        async def flush():
+            nonlocal processed, imported, chunk
+            chunk_imported, errors = await self.write(self.import_chunk, chunk, processed)
+            processed += len(chunk)
+            imported += chunk_imported
+            chunk = []
+            return calendar_pb2.ImportResult(
+                processed=processed,
+                imported=imported,
+                failed=processed - imported,
+                errors=errors
+            )
+        
+        async for request in request_iterator:
+            chunk.append(request)
+            if len(chunk) == IMPORT_CHUNK_SIZE:
+                yield await flush()
+        
+        if chunk:
+            yield await flush()
+        
+        log.info('ImportEvents', "Импорт завершен", imported=imported, processed=processed)
+
+def print_banner(port: int, mode: str):
+    """Выводит сведения о запущенном сервере"""
+    print(f"Сервер CalendarService запущен на порту {port} ({mode})")
     print("Доступные методы:")
     print("  - CreateEvent: создание нового события")
     print("  - GetEvent: получение информации о событии")
     print("  - UpdateEvent: обновление события")
     print("  - DeleteEvent: удаление события")
     print("  - ListEvents: список событий с фильтрацией")
+    print("  - StreamEvents: потоковый список событий")
+    print("  - BatchCreateEvents / BatchGetEvents / BatchDeleteEvents: пакетные операции")
+    print("  - ImportEvents: потоковый импорт событий")
+    print("  - GetFreeBusy / FindSlots: занятое время и поиск свободного времени участников")
+    print("  - WatchEvents: подписка на изменения событий")
+    print("  - SyncEvents: изменения событий после токена синхронизации")
     print("=" * 60)
+
+def start_metrics(servicer, port: int) -> ServerMetrics:
+    """Собирает метрики сервиса и отдает их по HTTP на port (GET /metrics)"""
+    metrics = ServerMetrics()
+    metrics.watch_servicer(servicer)
+    metrics.add_collector('calendar_log_records_total', "Записи журнала запросов по исходу", 'counter',
+                          lambda: [((('outcome', outcome),), count)
+                                   for outcome, count in log.stats().items() if outcome != 'queued'])
+    http_server = start_http_server(metrics, port)
+    print(f"Метрики: http://127.0.0.1:{http_server.server_port}/metrics")
+    return metrics
+
+def close_store(store: EventStore):
+    """Дописывает изменения хранилища на диск перед остановкой"""
+    store.close()
+
+def watcher_limit(max_workers: int) -> int:
+    """Сколько подписок WatchEvents одновременно допускает пул из max_workers потоков.
+
+    Хотя бы одну: иначе при --workers 1 подписки были бы недоступны вовсе.
+    """
+    return max(1, int(max_workers * WATCH_WORKERS_SHARE))
+
+
+def create_server(store: EventStore, port: int = DEFAULT_PORT, max_workers: int = 10,
+                  sample_data: bool = True, metrics_port: Optional[int] = None) -> Tuple[grpc.Server, int]:
+    """Запускает сервер календаря на пуле потоков и возвращает его вместе с портом.
+    
+    port=0 - любой свободный порт. Кроме serve() используется нагрузочным
+    тестом (benchmark.py mixed), который поднимает сервер в своем процессе.
+    С metrics_port сервер собирает метрики и отдает их по HTTP на этом порту.
+    """
+    servicer = CalendarServicer(store, sample_data=sample_data, max_watchers=watcher_limit(max_workers))
+    interceptors = []
+    if metrics_port is not None:
+        interceptors.append(MetricsInterceptor(start_metrics(servicer, metrics_port)))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), interceptors=interceptors,
+                         options=KEEPALIVE_OPTIONS)
+    add_servicer(servicer, server)
+    port = server.add_insecure_port(f'[::]:{port}')
+    server.start()
+    return server, port
+
+def serve(port: int = DEFAULT_PORT, max_workers: int = 10, data_dir: Optional[str] = None,
+          storage: str = 'memory', metrics_port: Optional[int] = None):
+    """Запускает gRPC сервер календаря (с data_dir - с сохранением событий на диск)"""
+    store = open_store(data_dir, storage)
+    server, port = create_server(store, port, max_workers, metrics_port=metrics_port)
+    
+    print_banner(port, f"пул из {max_workers} потоков")
     
     try:
         while True:
             time.sleep(86400)
     except KeyboardInterrupt:
-        server.stop(0)
+        server.stop(0).wait()
+        close_store(store)
         print("Сервер остановлен")
 
+async def serve_async(port: int = DEFAULT_PORT, data_dir: Optional[str] = None, storage: str = 'memory',
+                      metrics_port: Optional[int] = None):
+    """Запускает асинхронный gRPC сервер календаря на grpc.aio"""
+    store = open_store(data_dir, storage)
+    servicer = AsyncCalendarServicer(store)
+    interceptors = []
+    if metrics_port is not None:
+        interceptors.append(AsyncMetricsInterceptor(start_metrics(servicer, metrics_port)))
+    server = grpc.aio.server(interceptors=interceptors, options=KEEPALIVE_OPTIONS)
+    add_servicer(servicer, server)
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+    
+    print_banner(port, "asyncio")
+    
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+        close_store(store)
+
+def main():
+    """Разбирает аргументы командной строки и запускает сервер"""
+    parser = argparse.ArgumentParser(description="Сервер CalendarService")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="порт сервера")
+    parser.add_argument('--async', dest='use_asyncio', action='store_true',
+                        help="асинхронный сервер grpc.aio вместо пула потоков")
+    parser.add_argument('--workers', type=int, default=10, help="число потоков синхронного сервера")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="число процессов на общем порту (0 - по числу ядер)")
+    parser.add_argument('--data-dir', help="каталог для журнала и снимков событий (без него - только в памяти)")
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='memory',
+                        help="хранилище событий: индексы в памяти или база SQLite в --data-dir")
+    parser.add_argument('--metrics-port', type=int,
+                        help="порт HTTP для метрик Prometheus (GET /metrics); в многопроцессном "
+                             "режиме процесс N отдает метрики на порту --metrics-port + N")
+    parser.add_argument('--trace-phases', action='store_true',
+                        help="замерять время этапов запросов: проверки, конфликтов, записи, сериализации")
+    parser.add_argument('--log-level', choices=tuple(LEVELS), default='info', help="наименьший уровень журнала")
+    parser.add_argument('--log-format', choices=('json', 'text'), default='json', help="формат записей журнала")
+    parser.add_argument('--log-sample', type=parse_sampling, default={},
+                        help="доли выводимых записей по уровням, например info=0.01")
+    parser.add_argument('--log-rate', type=float, default=0,
+                        help="не больше стольких записей в секунду на метод ниже warning (0 - без ограничения)")
+    parser.add_argument('--log-config',
+                        help="файл JSON с настройками журнала поверх флагов, перечитывается по SIGHUP")
+    args = parser.parse_args()
+    
+    if args.storage == 'sqlite' and not args.data_dir:
+        parser.error("--storage sqlite требует --data-dir")
+    if args.trace_phases and args.metrics_port is None:
+        parser.error("--trace-phases требует --metrics-port")
+    PHASES.enable(args.trace_phases)
+    log_config = {'level': args.log_level, 'format': args.log_format, 'sample': args.log_sample,
+                  'rate_limit': args.log_rate}
+    try:
+        setup(log_config, args.log_config)
+    except (OSError, ValueError) as e:
+        parser.error(f"настройки журнала: {e}")
+    
+    if args.processes != 1:
+        if args.use_asyncio:
+            parser.error("--async поддерживается только в однопроцессном режиме")
+        from cluster import serve_cluster
+        serve_cluster(args.port, args.processes or None, args.workers, args.data_dir, args.storage,
+                      args.metrics_port, args.trace_phases, (log_config, args.log_config))
+    elif args.use_asyncio:
+        try:
+            asyncio.run(serve_async(args.port, args.data_dir, args.storage, args.metrics_port))
+        except KeyboardInterrupt:
+            print("Сервер остановлен")
+    else:
+        serve(args.port, args.workers, args.data_dir, args.storage, args.metrics_port)
+
 if __name__ == '__main__':
-    serve()
\ No newline at end of file
+    main()
@@ -0,0 +1,409 @@
+"""Хранилище событий в базе SQLite.
+
+В отличие от InMemoryEventStore события не держатся в памяти целиком:
+фильтрация ListEvents и проверка конфликтов выполняются индексированными
+запросами SQL, поэтому календарь может быть больше оперативной памяти.
+
+Схема:
+- events - строка на событие (время в микросекундах от эпохи, участники
+  одной строкой, номер версии события), индексы по local_start,
+  организатору и статусу;
+- event_attendees - таблица участников запланированных событий с ключом
+  (участник, начало, ID) для поиска пересечений;
+- meta - ревизия хранилища и максимальная длительность события.
+
+Серии (повторяющиеся события) хранятся строками events с правилом в
+столбце recurrence, но не попадают в event_attendees и в выдачу запросов
+по local_start: их немного, поэтому при открытии они загружаются в
+SeriesIndex и раскрываются во вхождения в памяти.
+
+База работает в режиме WAL: чтения идут параллельно с записью, каждый поток
+читает через свое соединение. Записи выполняются по одной под общей
+блокировкой в транзакции BEGIN IMMEDIATE, поэтому проверка конфликтов и
+сохранение атомарны. Запросы - постоянные строки с параметрами, их
+подготовленные выражения кешируются соединением.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import phase
+from records import EventRecord
+from recurrence import Recurrence, candidate_conflicts
+from storage import CheckedConflicts, Conflicts, EventStore, VersionMismatch
+
+
+SQLITE_FILE = 'calendar.db'
+
+# Разделитель участников в столбце events.attendees
+ATTENDEE_SEPARATOR = '\x1f'
+
+# Сколько строк iter_query читает первым запросом (хватает на страницу
+# ListEvents по умолчанию) и до скольких удваивает следующие
+QUERY_BATCH = 128
+MAX_QUERY_BATCH = 4096
+
+COLUMNS = ('event_id, title, description, start_time, end_time, location, attendees, '
+           'organizer, status, created_at, updated_at, start_offset, end_offset, recurrence, version')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    attendees TEXT NOT NULL,
+    organizer TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    local_start INTEGER NOT NULL,
+    recurrence TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (local_start, event_id);
+CREATE INDEX IF NOT EXISTS events_organizer ON events (organizer, local_start, event_id);
+CREATE INDEX IF NOT EXISTS events_status ON events (status, local_start, event_id);
+CREATE TABLE IF NOT EXISTS event_attendees (
+    attendee TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    event_id TEXT NOT NULL,
+    end_time INTEGER NOT NULL,
+    PRIMARY KEY (attendee, start_time, event_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+INSERT_EVENT = f'INSERT OR REPLACE INTO events ({COLUMNS}, local_start) VALUES ({", ".join("?" * 16)})'
+DELETE_EVENT = 'DELETE FROM events WHERE event_id = ?'
+SELECT_EVENT = f'SELECT {COLUMNS} FROM events WHERE event_id = ?'
+INSERT_ATTENDEE = 'INSERT OR REPLACE INTO event_attendees VALUES (?, ?, ?, ?)'
+DELETE_ATTENDEE = 'DELETE FROM event_attendees WHERE attendee = ? AND start_time = ? AND event_id = ?'
+SET_META = 'INSERT OR REPLACE INTO meta VALUES (?, ?)'
+GET_META = 'SELECT value FROM meta WHERE key = ?'
+# Начало пересекающегося события больше start - максимальная длительность,
+# поэтому поиск - диапазон по ключу (участник, начало)
+SELECT_OVERLAPS = (
+    'SELECT ' + ', '.join(f'e.{column.strip()}' for column in COLUMNS.split(',')) +
+    ' FROM event_attendees a JOIN events e ON e.event_id = a.event_id'
+    ' WHERE a.attendee = ? AND a.start_time > ? AND a.start_time < ? AND a.end_time > ?'
+    ' ORDER BY a.start_time, a.event_id'
+)
+
+SELECT_SERIES = f'SELECT {COLUMNS} FROM events WHERE recurrence IS NOT NULL'
+SERIES_INDEX = 'CREATE INDEX IF NOT EXISTS events_series ON events (event_id) WHERE recurrence IS NOT NULL'
+
+SELECT_INTERVALS = (
+    'SELECT start_time, end_time FROM event_attendees'
+    ' WHERE attendee = ? AND start_time > ? AND start_time < ? AND end_time > ?'
+    ' ORDER BY start_time'
+)
+
+
+def event_values(event: EventRecord) -> tuple:
+    """Параметры INSERT_EVENT для записи"""
+    row = event.to_row()
+    recurrence = None if event.recurrence is None else event.recurrence.to_text()
+    return (row[:6] + (ATTENDEE_SEPARATOR.join(event.attendees),) + row[7:13] +
+            (recurrence, event.version, event.local_start))
+
+
+def event_from_row(row) -> EventRecord:
+    """Запись из строки SELECT {COLUMNS} (лишние столбцы в конце пропускаются)"""
+    attendees = row[6].split(ATTENDEE_SEPARATOR) if row[6] else ()
+    recurrence = None if row[13] is None else Recurrence.from_text(row[13])
+    return EventRecord(*row[:6], attendees, *row[7:13], recurrence, row[14])
+
+
+class SqliteEventStore(EventStore):
+    """Хранилище событий в файле SQLite (см. описание модуля)"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.executescript(SCHEMA)
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(events)')]
+        if 'recurrence' not in columns:
+            # База предыдущей версии - без повторяющихся событий
+            connection.execute('ALTER TABLE events ADD COLUMN recurrence TEXT')
+        if 'version' not in columns:
+            # База предыдущей версии - без номеров версий событий
+            connection.execute('ALTER TABLE events ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        connection.execute(SERIES_INDEX)
+        self.revision = self._get_meta(connection, 'revision')
+        self._max_duration = self._get_meta(connection, 'max_duration')
+        self.series.load(map(event_from_row, connection.execute(SELECT_SERIES)))
+
+    def _connect(self) -> sqlite3.Connection:
+        # Транзакциями управляем сами (isolation_level=None)
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                     cached_statements=64)
+        # Запись подтверждается только после fsync, как с журналом InMemoryEventStore
+        connection.execute('PRAGMA synchronous = FULL')
+        connection.execute('PRAGMA busy_timeout = 5000')
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @staticmethod
+    def _get_meta(connection: sqlite3.Connection, key: str) -> int:
+        row = connection.execute(GET_META, (key,)).fetchone()
+        return 0 if row is None else row[0]
+
+    @property
+    def blocks_on_write(self) -> bool:
+        return True
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def get(self, event_id: str) -> Optional[EventRecord]:
+        return self._get(self._connection(), event_id)
+
+    def values(self) -> Iterator[EventRecord]:
+        return self._select([], [])
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция записи под блокировкой записи; без _commit откатывается"""
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            finally:
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+
+    def _commit(self, connection: sqlite3.Connection,
+                current: Optional[EventRecord], event: Optional[EventRecord]):
+        """Заменяет current на event (None - нет записи) и фиксирует транзакцию"""
+        with phase('store_write'):
+            if current is not None:
+                if current.status == 'scheduled' and current.recurrence is None:
+                    connection.executemany(DELETE_ATTENDEE, [
+                        (attendee, current.start, current.event_id) for attendee in current.attendees
+                    ])
+                if event is None:
+                    connection.execute(DELETE_EVENT, (current.event_id,))
+            if event is not None:
+                connection.execute(INSERT_EVENT, event_values(event))
+                if event.status == 'scheduled' and event.recurrence is None:
+                    self._add_attendees(connection, [event])
+            revision = self.revision + 1
+            connection.execute(SET_META, ('revision', revision))
+            connection.execute('COMMIT')
+            self.revision = revision
+            if current is not None and current.recurrence is not None:
+                self.series.remove(current)
+            if event is not None and event.recurrence is not None:
+                self.series.add(event)
+            self._notify(revision, current, event)
+
+    def _add_attendees(self, connection: sqlite3.Connection, events: List[EventRecord]):
+        connection.executemany(INSERT_ATTENDEE, [
+            (attendee, event.start, event.event_id, event.end) for event in events for attendee in event.attendees
+        ])
+        duration = max(event.end - event.start for event in events)
+        if duration > self._max_duration:
+            # Граница поиска расширяется до фиксации, чтобы читатели не пропустили событие
+            self._max_duration = duration
+            connection.execute(SET_META, ('max_duration', duration))
+
+    def put(self, event: EventRecord):
+        with self._transaction() as connection:
+            self._commit(connection, self._get(connection, event.event_id), event)
+
+    def _get(self, connection: sqlite3.Connection, event_id: str) -> Optional[EventRecord]:
+        row = connection.execute(SELECT_EVENT, (event_id,)).fetchone()
+        return None if row is None else event_from_row(row)
+
+    def create(self, event: EventRecord, checked: Optional[CheckedConflicts] = None) -> Conflicts:
+        with self._transaction() as connection:
+            if checked is not None and checked.revision == self.revision:
+                conflicts = checked.conflicts
+            else:
+                conflicts = self._find_conflicts(connection, event)
+            if conflicts:
+                return conflicts
+            if self._get(connection, event.event_id) is not None:
+                raise KeyError(event.event_id)
+            self._commit(connection, None, event)
+        return []
+
+    def update(self, event_id: str,
+               make: Callable[[EventRecord], EventRecord]) -> Tuple[Optional[EventRecord], Conflicts]:
+        with self._transaction() as connection:
+            current = self._get(connection, event_id)
+            if current is None:
+                return None, []
+            event = make(current)
+            if not event.same_schedule(current):
+                conflicts = self._find_conflicts(connection, event)
+                if conflicts:
+                    return None, conflicts
+            self._commit(connection, current, event)
+        return event, []
+
+    def delete(self, event_id: str, version: Optional[int] = None) -> Optional[EventRecord]:
+        with self._transaction() as connection:
+            current = self._get(connection, event_id)
+            if current is not None:
+                if version is not None and current.version != version:
+                    raise VersionMismatch(current)
+                self._commit(connection, current, None)
+        return current
+
+    def load(self, events: Iterable[EventRecord], revision: int = 0):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM events')
+            connection.execute('DELETE FROM event_attendees')
+            self._max_duration = 0
+            series = []
+            events = iter(events)
+            while True:
+                # Вставляем порциями, не собирая все записи в памяти
+                chunk = list(islice(events, 10_000))
+                if not chunk:
+                    break
+                connection.executemany(INSERT_EVENT, map(event_values, chunk))
+                series.extend(event for event in chunk if event.recurrence is not None)
+                scheduled = [event for event in chunk if event.status == 'scheduled' and event.recurrence is None]
+                if scheduled:
+                    self._add_attendees(connection, scheduled)
+            connection.execute(SET_META, ('revision', revision))
+            connection.execute(SET_META, ('max_duration', self._max_duration))
+            connection.execute('COMMIT')
+            self.revision = revision
+            self.series.load(series)
+
+    def dump(self) -> Tuple[int, Iterator[EventRecord]]:
+        # Отдельное соединение держит одну транзакцию чтения на весь обход
+        connection = self._connect()
+        connection.execute('BEGIN')
+        revision = self._get_meta(connection, 'revision')
+
+        def records():
+            try:
+                cursor = connection.execute(f'SELECT {COLUMNS} FROM events ORDER BY local_start, event_id')
+                for row in cursor:
+                    yield event_from_row(row)
+            finally:
+                connection.close()
+
+        return revision, records()
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM events')
+            connection.execute('DELETE FROM event_attendees')
+            connection.execute(SET_META, ('max_duration', 0))
+            connection.execute('COMMIT')
+            self._max_duration = 0
+            self.series.clear()
+
+    def _find_conflicts(self, connection: sqlite3.Connection, event: EventRecord) -> Conflicts:
+        def find_single(start, end, attendees, exclude_id):
+            return self._overlaps(connection, start, end, attendees, exclude_id)
+
+        with phase('conflict_check'):
+            return candidate_conflicts(event, find_single, self.series)
+
+    def find_single_conflicts(self, start: int, end: int, attendees: Iterable[str],
+                              exclude_id: Optional[str] = None) -> Conflicts:
+        return self._overlaps(self._connection(), start, end, attendees, exclude_id)
+
+    def _overlaps(self, connection: sqlite3.Connection, start: int, end: int, attendees: Iterable[str],
+                  exclude_id: Optional[str]) -> Conflicts:
+        found = {}
+        lowest = start - self._max_duration
+        for attendee in dict.fromkeys(attendees):
+            for row in connection.execute(SELECT_OVERLAPS, (attendee, lowest, end, start)):
+                if row[0] == exclude_id:
+                    continue
+                entry = found.get(row[0])
+                if entry is None:
+                    found[row[0]] = (event_from_row(row), [attendee])
+                else:
+                    entry[1].append(attendee)
+        conflicts = list(found.values())
+        conflicts.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+        return conflicts
+
+    def busy_intervals(self, start: int, end: int, attendees: Iterable[str]) -> Dict[str, List[Tuple[int, int]]]:
+        connection = self._connection()
+        lowest = start - self._max_duration
+        return self._add_series_busy({
+            attendee: connection.execute(SELECT_INTERVALS, (attendee, lowest, end, start)).fetchall()
+            for attendee in dict.fromkeys(attendees)
+        }, start, end)
+
+    def iter_query(self, lower: Optional[int] = None, upper: Optional[int] = None,
+                   organizer: str = '', status: str = '',
+                   after: Optional[Tuple[int, str]] = None) -> Iterator[EventRecord]:
+        conditions = ['recurrence IS NULL']
+        params: list = []
+        if lower is not None:
+            conditions.append('local_start >= ?')
+            params.append(lower)
+        if upper is not None:
+            conditions.append('local_start < ?')
+            params.append(upper)
+        if organizer:
+            conditions.append('organizer = ?')
+            params.append(organizer)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        return self._with_occurrences(self._select(conditions, params, after),
+                                      lower, upper, organizer, status, after)
+
+    def _select(self, conditions: List[str], params: list,
+                after: Optional[Tuple[int, str]] = None) -> Iterator[EventRecord]:
+        """Читает строки events по условиям растущими порциями, продолжая каждую
+        порцию после последнего выданного события. Курсор не остается открытым
+        между порциями, поэтому брошенная выдача не держит транзакцию чтения.
+        """
+        conditions = conditions + ['(local_start, event_id) > (?, ?)']
+        sql = (f'SELECT {COLUMNS}, local_start FROM events WHERE {" AND ".join(conditions)} '
+               f'ORDER BY local_start, event_id LIMIT ?')
+
+        position = after if after is not None else (-2 ** 63, '')
+        batch = QUERY_BATCH
+        while True:
+            rows = self._connection().execute(sql, (*params, *position, batch)).fetchall()
+            for row in rows:
+                yield event_from_row(row)
+            if len(rows) < batch:
+                return
+            position = (rows[-1][-1], rows[-1][0])
+            batch = min(batch * 2, MAX_QUERY_BATCH)
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
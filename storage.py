@@ -0,0 +1,657 @@
+import heapq
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from columnar import ColumnarSnapshot
+from indexes import AttendeeIntervalIndex, HashIndex, SortedIndex
+from metrics import phase
+from records import EventRecord
+from recurrence import SeriesIndex, candidate_conflicts
+
+
+# Число полос блокировок участников
+LOCK_STRIPES = 64
+
+Conflicts = List[Tuple[EventRecord, List[str]]]
+
+
+class CheckedConflicts(NamedTuple):
+    """Конфликты кандидата, заранее вычисленные по хранилищу на ревизии revision"""
+    revision: int
+    conflicts: Conflicts
+
+Listener = Callable[[int, Optional[EventRecord], Optional[EventRecord]], None]
+
+
+class VersionMismatch(Exception):
+    """Версия записи не совпала с ожидаемой (условное изменение не выполнено)"""
+
+    def __init__(self, current: EventRecord):
+        super().__init__(current.event_id, current.version)
+        self.current = current
+
+
+class EventStore(ABC):
+    """Интерфейс хранилища событий, на котором работает CalendarServicer.
+
+    Реализации: InMemoryEventStore (индексы в памяти, журнал на диске по
+    желанию) и SqliteEventStore из sqlite_storage.py. Все методы можно
+    вызывать из нескольких потоков; create и update проверяют конфликты и
+    сохраняют запись атомарно. Каждое изменение увеличивает revision и
+    передается подписчикам add_listener в порядке ревизий.
+
+    Повторяющиеся события (серии) хранятся как обычные записи, но в индексы
+    по времени не попадают: реализации держат их в SeriesIndex, а запросы
+    сливают свою выдачу с вхождениями серий, раскрытыми внутри окна.
+    """
+
+    def __init__(self):
+        # Номер последнего изменения хранилища
+        self.revision = 0
+        # Эпоха истории изменений: ревизии разных запусков хранилища несравнимы
+        self.epoch = os.urandom(4).hex()
+        self._listeners: List[Listener] = []
+        # Журнал для сохранения изменений на диск (см. persistence.Journal)
+        self.journal = None
+        self.series = SeriesIndex()
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, event_id: str) -> bool:
+        return self.get(event_id) is not None
+
+    @property
+    def blocks_on_write(self) -> bool:
+        """Ждет ли запись ввода-вывода (тогда асинхронный сервер выносит ее в пул потоков)"""
+        return self.journal is not None
+
+    def add_listener(self, listener: Listener):
+        """Подписывает listener(ревизия, старая запись, новая запись) на изменения.
+
+        Вызывается под блокировкой фиксации в порядке ревизий, поэтому
+        обработчик должен быть быстрым и не обращаться к хранилищу на запись.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, revision: int, current: Optional[EventRecord], event: Optional[EventRecord]):
+        for listener in self._listeners:
+            listener(revision, current, event)
+
+    @abstractmethod
+    def get(self, event_id: str) -> Optional[EventRecord]:
+        ...
+
+    @abstractmethod
+    def values(self) -> Iterator[EventRecord]:
+        ...
+
+    @abstractmethod
+    def put(self, event: EventRecord):
+        """Сохраняет новую запись или заменяет существующую с тем же ID без проверок"""
+
+    @abstractmethod
+    def create(self, event: EventRecord, checked: Optional[CheckedConflicts] = None) -> Conflicts:
+        """Атомарно проверяет конфликты и сохраняет новую запись.
+
+        Возвращает найденные конфликты; пустой список означает, что запись
+        сохранена. KeyError - запись с таким ID уже есть. Если хранилище не
+        менялось с ревизии checked, конфликты берутся из checked без
+        повторной проверки (BulkConflictChecker).
+        """
+
+    @abstractmethod
+    def update(self, event_id: str,
+               make: Callable[[EventRecord], EventRecord]) -> Tuple[Optional[EventRecord], Conflicts]:
+        """Атомарно заменяет запись на make(текущая), если нет конфликтов.
+
+        Конфликты проверяются, только если изменилось время, участники,
+        повторение или статус (EventRecord.same_schedule). Возвращает
+        (новая запись, []) при успехе, (None, конфликты) при конфликте
+        и (None, []) если записи нет.
+        """
+
+    @abstractmethod
+    def delete(self, event_id: str, version: Optional[int] = None) -> Optional[EventRecord]:
+        """Удаляет запись и возвращает ее, None если записи не было.
+
+        С version запись удаляется, только если ее версия совпадает,
+        иначе - VersionMismatch. Для условного update проверку выполняет make,
+        вызывая VersionMismatch сам.
+        """
+
+    @abstractmethod
+    def load(self, events: Iterable[EventRecord], revision: int = 0):
+        """Заменяет содержимое хранилища целиком; подписчики не уведомляются"""
+
+    @abstractmethod
+    def dump(self) -> Tuple[int, Iterator[EventRecord]]:
+        """Согласованный срез хранилища: (ревизия, все записи в порядке (local_start, ID))"""
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def find_single_conflicts(self, start: int, end: int, attendees: Iterable[str],
+                              exclude_id: Optional[str] = None) -> Conflicts:
+        """Как find_conflicts, но только среди обычных событий, без серий"""
+
+    def find_conflicts(self, start: int, end: int, attendees: Iterable[str],
+                       exclude_id: Optional[str] = None) -> Conflicts:
+        """Находит запланированные события участников, пересекающиеся с [start, end).
+
+        Вхождения серий входят в результат как отдельные события с ID серии.
+        Результат упорядочен по (началу, ID) и носит справочный характер:
+        для записи используйте create и update.
+        """
+        attendees = list(dict.fromkeys(attendees))
+        conflicts = self.find_single_conflicts(start, end, attendees, exclude_id)
+        overlaps = self.series.find_overlaps(start, end, attendees, exclude_id)
+        if not overlaps:
+            return conflicts
+        conflicts.extend(overlaps)
+        conflicts.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+        return conflicts
+
+    def event_conflicts(self, event: EventRecord) -> Conflicts:
+        """Конфликты события-кандидата с хранилищем; для серии - всех ее вхождений"""
+        return candidate_conflicts(event, self.find_single_conflicts, self.series)
+
+    def busy_intervals(self, start: int, end: int, attendees: Iterable[str]) -> Dict[str, List[Tuple[int, int]]]:
+        """(начало, конец) запланированных событий каждого участника, пересекающихся с [start, end).
+
+        Интервалы участника упорядочены по началу; реализации переопределяют
+        метод, чтобы не создавать записи событий.
+        """
+        busy: Dict[str, List[Tuple[int, int]]] = {attendee: [] for attendee in attendees}
+        for event, common in self.find_conflicts(start, end, busy):
+            for attendee in common:
+                busy[attendee].append((event.start, event.end))
+        return busy
+
+    def _add_series_busy(self, busy: Dict[str, List[Tuple[int, int]]],
+                         start: int, end: int) -> Dict[str, List[Tuple[int, int]]]:
+        """Добавляет к занятости участников вхождения их серий"""
+        for attendee, intervals in self.series.busy_intervals(start, end, busy).items():
+            busy[attendee] = sorted(busy[attendee] + intervals)
+        return busy
+
+    def _with_occurrences(self, events: Iterator[EventRecord], lower: Optional[int], upper: Optional[int],
+                          organizer: str, status: str,
+                          after: Optional[Tuple[int, str]]) -> Iterator[EventRecord]:
+        """Сливает выдачу обычных событий с вхождениями серий в порядке (local_start, ID)"""
+        if not len(self.series):
+            return events
+        return heapq.merge(events, self.series.query(lower, upper, organizer, status, after),
+                           key=lambda event: (event.local_start, event.event_id))
+
+    def query(self, lower: Optional[int] = None, upper: Optional[int] = None,
+              organizer: str = '', status: str = '') -> List[EventRecord]:
+        """Возвращает все события, подходящие под фильтр, в порядке времени начала"""
+        return list(self.iter_query(lower, upper, organizer, status))
+
+    @abstractmethod
+    def iter_query(self, lower: Optional[int] = None, upper: Optional[int] = None,
+                   organizer: str = '', status: str = '',
+                   after: Optional[Tuple[int, str]] = None) -> Iterator[EventRecord]:
+        """Лениво выдает события, подходящие под фильтр, в порядке (local_start, ID).
+
+        lower и upper ограничивают локальное время начала полуинтервалом
+        [lower, upper), after = (время начала, ID) продолжает выдачу после
+        указанного события. Серии выдаются вхождениями (см. SeriesIndex.query).
+        """
+
+    def planner_stats(self) -> Dict[str, Dict[str, int]]:
+        """Индекс запроса -> сколько раз выбран, сколько кандидатов перебрано и выдано.
+
+        Пусто, если индекс выбирает не хранилище (SQLite планирует запросы сам).
+        """
+        return {}
+
+    def close(self):
+        """Дописывает несохраненные изменения на диск и освобождает ресурсы"""
+        if self.journal is not None:
+            self.journal.close()
+
+
+class InMemoryEventStore(EventStore):
+    """Хранилище событий в памяти с поддерживаемыми индексами.
+
+    Помимо словаря записей по ID ведутся:
+    - индекс интервалов по участникам для проверки конфликтов;
+    - упорядоченный индекс по времени начала для фильтрации по датам;
+    - хеш-индексы по организатору и статусу.
+
+    Модель конкурентного доступа:
+    - проверка конфликтов и последующая запись выполняются под полосовыми
+      блокировками участников события (для изменения - старых и новых
+      участников), поэтому записи с непересекающимися участниками не ждут
+      друг друга, а две записи с общим участником не могут обе пройти проверку;
+    - сами изменения словаря и индексов делаются под короткой блокировкой
+      фиксации;
+    - записи EventRecord неизменяемы (изменение заменяет запись целиком),
+      а индексы для чтения меняются атомарными относительно GIL операциями,
+      поэтому get и query читают без блокировок и видят каждую запись либо
+      до, либо после изменения.
+
+    Хранилище может работать поверх базового снимка ColumnarSnapshot,
+    открытого через mmap: тогда словарь и индексы в памяти содержат только
+    изменения после снимка, а ID измененных и удаленных событий снимка
+    перечислены в _shadowed. Чтения объединяют оба источника.
+    """
+
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        super().__init__()
+        self._events: Dict[str, EventRecord] = {}
+        self.attendee_index = AttendeeIntervalIndex()
+        self.start_index = SortedIndex()
+        self.organizer_index = HashIndex()
+        self.status_index = HashIndex()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._commit_lock = threading.Lock()
+        self.base: Optional[ColumnarSnapshot] = None
+        self._shadowed: Set[str] = set()
+        # Счетчики планировщика запросов: индекс -> queries, scanned, returned
+        self._plans = {plan: {'queries': 0, 'scanned': 0, 'returned': 0}
+                       for plan in ('start', 'organizer', 'status')}
+        self._plans_lock = threading.Lock()
+
+    def __len__(self):
+        base = self.base
+        if base is None:
+            return len(self._events)
+        return len(self._events) + len(base) - len(self._shadowed)
+
+    def get(self, event_id: str) -> Optional[EventRecord]:
+        event = self._events.get(event_id)
+        base = self.base
+        if event is not None or base is None or event_id in self._shadowed:
+            return event
+        row = base.find(event_id)
+        return None if row is None else base.record(row)
+
+    def values(self) -> Iterator[EventRecord]:
+        events = list(self._events.values())
+        base = self.base
+        if base is None:
+            return iter(events)
+        return chain(events, self._base_records(base, set(self._shadowed)))
+
+    @staticmethod
+    def _base_records(base: ColumnarSnapshot, shadowed: Set[str]) -> Iterator[EventRecord]:
+        """Записи базового снимка в порядке выдачи, кроме перекрытых"""
+        for row in base.rows():
+            if base.event_id(row) not in shadowed:
+                yield base.record(row)
+
+    def _is_current(self, event_id: str, current: Optional[EventRecord]) -> bool:
+        """Проверяет под блокировками, что запись не изменилась с момента чтения"""
+        latest = self._events.get(event_id)
+        if latest is not None:
+            return latest is current
+        if current is None:
+            return event_id not in self
+        # Прочитанная запись была из снимка и остается текущей, пока ее не перекрыли
+        base = self.base
+        return base is not None and event_id not in self._shadowed and base.find(event_id) is not None
+
+    @contextmanager
+    def _locked(self, *attendee_groups: Iterable[str]):
+        """Захватывает полосы блокировок участников в фиксированном порядке"""
+        stripes = sorted({hash(attendee) % len(self._stripes)
+                          for attendees in attendee_groups for attendee in attendees})
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+
+    def _commit(self, current: Optional[EventRecord], event: Optional[EventRecord]) -> int:
+        """Заменяет current на event в словаре и индексах (None - нет записи)"""
+        with phase('store_write'), self._commit_lock:
+            return self._apply(current, event)
+
+    def _apply(self, current: Optional[EventRecord], event: Optional[EventRecord]) -> int:
+        from_base = current is not None and self._events.get(current.event_id) is not current
+        if current is not None and not from_base:
+            self._unindex(current)
+        if event is None:
+            if not from_base:
+                del self._events[current.event_id]
+        else:
+            self._events[event.event_id] = event
+            self._index(event)
+        if from_base:
+            # Новая версия уже видна, теперь скрываем запись снимка
+            self._shadowed.add(current.event_id)
+        self.revision += 1
+        if self.journal is not None:
+            self.journal.append(self.revision, current, event)
+        self._notify(self.revision, current, event)
+        return self.revision
+
+    def _sync(self, revision: int):
+        """Ждет, пока изменение revision сохранится на диск (вне блокировок)"""
+        if self.journal is not None:
+            with phase('journal_sync'):
+                self.journal.wait(revision)
+
+    def put(self, event: EventRecord):
+        while True:
+            current = self.get(event.event_id)
+            old_attendees = current.attendees if current is not None else ()
+            with self._locked(old_attendees, event.attendees):
+                if not self._is_current(event.event_id, current):
+                    continue  # Запись изменили, пока ждали блокировки
+                revision = self._commit(current, event)
+            self._sync(revision)
+            return
+
+    def create(self, event: EventRecord, checked: Optional[CheckedConflicts] = None) -> Conflicts:
+        with self._locked(event.attendees):
+            # Изменить события участников можно только под их блокировками, поэтому
+            # совпавшая ревизия означает, что проверенные конфликты все еще верны
+            if checked is not None and checked.revision == self.revision:
+                conflicts = checked.conflicts
+            else:
+                conflicts = self._find_conflicts(event)
+            if conflicts:
+                return conflicts
+            with phase('store_write'), self._commit_lock:
+                if event.event_id in self:
+                    raise KeyError(event.event_id)
+                revision = self._apply(None, event)
+        self._sync(revision)
+        return []
+
+    def update(self, event_id: str,
+               make: Callable[[EventRecord], EventRecord]) -> Tuple[Optional[EventRecord], Conflicts]:
+        while True:
+            current = self.get(event_id)
+            if current is None:
+                return None, []
+            event = make(current)
+            with self._locked(current.attendees, event.attendees):
+                if not self._is_current(event_id, current):
+                    continue  # Запись изменили, пока ждали блокировки
+                if not event.same_schedule(current):
+                    conflicts = self._find_conflicts(event)
+                    if conflicts:
+                        return None, conflicts
+                revision = self._commit(current, event)
+            self._sync(revision)
+            return event, []
+
+    def delete(self, event_id: str, version: Optional[int] = None) -> Optional[EventRecord]:
+        while True:
+            current = self.get(event_id)
+            if current is None:
+                return None
+            with self._locked(current.attendees):
+                if not self._is_current(event_id, current):
+                    continue  # Запись изменили, пока ждали блокировки
+                if version is not None and current.version != version:
+                    raise VersionMismatch(current)
+                revision = self._commit(current, None)
+            self._sync(revision)
+            return current
+
+    def load(self, events: Iterable[EventRecord], revision: int = 0,
+             base: Optional[ColumnarSnapshot] = None, deleted: Iterable[str] = ()):
+        """Заменяет содержимое хранилища, строя индексы целиком, а не по одной записи.
+
+        base - базовый снимок, events и deleted - измененные и удаленные после
+        него события. Используется при восстановлении; журнал и подписчики
+        не уведомляются.
+        """
+        deleted = set(deleted)
+        with self._commit_lock:
+            self._events = {event.event_id: event for event in events}
+            self.base = base
+            self._shadowed = set()
+            if base is not None:
+                self._shadowed = {event_id for event_id in chain(self._events, deleted)
+                                  if base.find(event_id) is not None}
+                # Серии снимка немногочисленны и переходят в память целиком
+                for event in base.series():
+                    if event.event_id not in self._events and event.event_id not in deleted:
+                        self._events[event.event_id] = event
+            records = [event for event in self._events.values() if event.recurrence is None]
+            self.series.load(event for event in self._events.values() if event.recurrence is not None)
+            self.attendee_index.load(
+                (event.event_id, event.start, event.end, event.attendees)
+                for event in records if event.status == 'scheduled'
+            )
+            self.start_index.load((event.local_start, event.event_id) for event in records)
+            self.organizer_index.load((event.organizer, event.event_id) for event in records)
+            self.status_index.load((event.status, event.event_id) for event in records)
+            self.revision = revision
+
+    def dump(self) -> Tuple[int, Iterator[EventRecord]]:
+        with self._commit_lock:
+            revision = self.revision
+            events = sorted(self._events.values(), key=lambda event: (event.local_start, event.event_id))
+            base = self.base
+            shadowed = set(self._shadowed)
+        if base is None:
+            return revision, iter(events)
+        # Записи снимка неизменны, поэтому читаем их уже без блокировки
+        return revision, heapq.merge(events, self._base_records(base, shadowed),
+                                     key=lambda event: (event.local_start, event.event_id))
+
+    def rebase(self, base: ColumnarSnapshot, changed: Set[str]):
+        """Переводит хранилище на новый базовый снимок base.
+
+        changed - ID событий, которые могли измениться после ревизии снимка
+        (допустимо с запасом); вызывающий пополняет его под блокировкой
+        фиксации, поэтому здесь он полон. Их записи и серии остаются в
+        памяти, остальные записи уже есть в снимке и освобождаются вместе с
+        индексами. Читатели без блокировок на время переключения могут
+        увидеть событие дважды, но не теряют его.
+        """
+        with self._commit_lock:
+            events = {event_id: event for event_id, event in self._events.items()
+                      if event.recurrence is not None or event_id in changed}
+            shadowed = {event_id for event_id in changed if base.find(event_id) is not None}
+            records = [event for event in events.values() if event.recurrence is None]
+            attendee_index, start_index = AttendeeIntervalIndex(), SortedIndex()
+            organizer_index, status_index = HashIndex(), HashIndex()
+            attendee_index.load(
+                (event.event_id, event.start, event.end, event.attendees)
+                for event in records if event.status == 'scheduled'
+            )
+            start_index.load((event.local_start, event.event_id) for event in records)
+            organizer_index.load((event.organizer, event.event_id) for event in records)
+            status_index.load((event.status, event.event_id) for event in records)
+
+            # Сначала записи снимка становятся видны, потом освобождаются копии в памяти
+            self._shadowed = self._shadowed | shadowed
+            self.base = base
+            self._shadowed = shadowed
+            self.attendee_index, self.start_index = attendee_index, start_index
+            self.organizer_index, self.status_index = organizer_index, status_index
+            self._events = events
+
+    def clear(self):
+        with self._commit_lock:
+            self.base = None
+            self._shadowed = set()
+            self._events.clear()
+            self.series.clear()
+            self.attendee_index.clear()
+            self.start_index.clear()
+            self.organizer_index.clear()
+            self.status_index.clear()
+
+    def _index(self, event: EventRecord):
+        if event.recurrence is not None:
+            self.series.add(event)
+            return
+        if event.status == 'scheduled':
+            self.attendee_index.add(event.event_id, event.start, event.end, event.attendees)
+        self.start_index.add(event.local_start, event.event_id)
+        self.organizer_index.add(event.organizer, event.event_id)
+        self.status_index.add(event.status, event.event_id)
+
+    def _unindex(self, event: EventRecord):
+        if event.recurrence is not None:
+            self.series.remove(event)
+            return
+        if event.status == 'scheduled':
+            self.attendee_index.remove(event.event_id, event.start, event.end, event.attendees)
+        self.start_index.remove(event.local_start, event.event_id)
+        self.organizer_index.remove(event.organizer, event.event_id)
+        self.status_index.remove(event.status, event.event_id)
+
+    def _find_conflicts(self, event: EventRecord) -> Conflicts:
+        with phase('conflict_check'):
+            return self.event_conflicts(event)
+
+    def find_single_conflicts(self, start: int, end: int, attendees: Iterable[str],
+                              exclude_id: Optional[str] = None) -> Conflicts:
+        attendees = list(dict.fromkeys(attendees))
+        overlaps = self.attendee_index.find_overlaps(start, end, attendees, exclude_id=exclude_id)
+        conflicts = []
+        for event_id, common in overlaps:
+            event = self._events.get(event_id)
+            if event is not None:
+                conflicts.append((event, common))
+        base = self.base
+        if base is None:
+            return conflicts
+
+        found: Dict[int, List[str]] = {}
+        for attendee in attendees:
+            for _, row in base.overlapping(attendee, start, end):
+                found.setdefault(row, []).append(attendee)
+        if not found:
+            return conflicts
+        shadowed = self._shadowed
+        for row, common in found.items():
+            event_id = base.event_id(row)
+            if event_id == exclude_id or event_id in shadowed:
+                continue
+            conflicts.append((base.record(row), common))
+        conflicts.sort(key=lambda conflict: (conflict[0].start, conflict[0].event_id))
+        return conflicts
+
+    def busy_intervals(self, start: int, end: int, attendees: Iterable[str]) -> Dict[str, List[Tuple[int, int]]]:
+        busy = {}
+        for attendee in dict.fromkeys(attendees):
+            intervals = self.attendee_index.intervals(attendee, start, end)
+            base = self.base
+            if base is not None:
+                shadowed = self._shadowed
+                stored = [(event_start, base.end(row)) for event_start, row in base.overlapping(attendee, start, end)
+                          if not shadowed or base.event_id(row) not in shadowed]
+                if stored:
+                    intervals = sorted(intervals + stored)
+            busy[attendee] = intervals
+        return self._add_series_busy(busy, start, end)
+
+    def iter_query(self, lower: Optional[int] = None, upper: Optional[int] = None,
+                   organizer: str = '', status: str = '',
+                   after: Optional[Tuple[int, str]] = None) -> Iterator[EventRecord]:
+        """Планировщик выбирает самый избирательный индекс,
+        перебирает только его кандидатов и проверяет на них остальные условия,
+        поэтому стоимость запроса пропорциональна размеру меньшего из индексов,
+        а не числу событий в хранилище.
+
+        С базовым снимком его выдача сливается с выдачей изменений в памяти,
+        а записи снимка создаются только для выданных событий.
+        """
+        return self._with_occurrences(self._iter_single(lower, upper, organizer, status, after),
+                                      lower, upper, organizer, status, after)
+
+    def _iter_single(self, lower: Optional[int], upper: Optional[int], organizer: str, status: str,
+                     after: Optional[Tuple[int, str]]) -> Iterator[EventRecord]:
+        """Выдача iter_query по обычным событиям в памяти и в снимке"""
+        events = self._iter_memory(lower, upper, organizer, status, after)
+        base = self.base
+        if base is None:
+            yield from events
+            return
+
+        shadowed = self._shadowed
+        merged = heapq.merge(
+            ((event.local_start, event.event_id, event) for event in events),
+            ((key, event_id, row) for key, event_id, row in base.query(lower, upper, organizer, status, after)
+             if event_id not in shadowed),
+            key=lambda item: (item[0], item[1])
+        )
+        for _, _, item in merged:
+            yield item if isinstance(item, EventRecord) else base.record(item)
+
+    def planner_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._plans_lock:
+            return {plan: dict(counters) for plan, counters in self._plans.items()}
+
+    def _iter_memory(self, lower: Optional[int], upper: Optional[int], organizer: str, status: str,
+                     after: Optional[Tuple[int, str]]) -> Iterator[EventRecord]:
+        """Выдача iter_query по записям в памяти"""
+        plans = [(self.start_index.count(lower, upper), 'start')]
+        if organizer:
+            plans.append((self.organizer_index.count(organizer), 'organizer'))
+        if status:
+            plans.append((self.status_index.count(status), 'status'))
+        _, best = min(plans)
+
+        scanned = returned = 0
+        try:
+            if best == 'start':
+                for key, event_id in self.start_index.scan(lower, upper, after):
+                    scanned += 1
+                    event = self._events.get(event_id)
+                    if event is None or event.local_start != key:
+                        continue  # Запись удалили или перенесли во время обхода
+                    if organizer and event.organizer != organizer:
+                        continue
+                    if status and event.status != status:
+                        continue
+                    returned += 1
+                    yield event
+                return
+
+            if best == 'organizer':
+                candidates = self.organizer_index.get(organizer)
+            else:
+                candidates = self.status_index.get(status)
+
+            matched = []
+            candidates = list(candidates)
+            scanned = len(candidates)
+            for event_id in candidates:
+                event = self._events.get(event_id)
+                if event is None:
+                    continue
+                if lower is not None and event.local_start < lower:
+                    continue
+                if upper is not None and event.local_start >= upper:
+                    continue
+                if after is not None and (event.local_start, event.event_id) <= after:
+                    continue
+                if organizer and event.organizer != organizer:
+                    continue
+                if status and event.status != status:
+                    continue
+                matched.append(event)
+
+            # Хеш-индексы не упорядочены, сортируем только найденное
+            matched.sort(key=lambda event: (event.local_start, event.event_id))
+            returned = len(matched)
+            yield from matched
+        finally:
+            # Выдачу могут бросить на середине (страница заполнена), счет - при закрытии
+            with self._plans_lock:
+                counters = self._plans[best]
+                counters['queries'] += 1
+                counters['scanned'] += scanned
+                counters['returned'] += returned
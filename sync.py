@@ -0,0 +1,127 @@
+"""Индекс изменений для инкрементальной синхронизации клиентов (SyncEvents).
+
+Клиент, работающий без постоянного подключения, хранит копию событий и
+токен синхронизации. По токену SyncEvents возвращает ID событий, созданных
+или измененных после него, ID удаленных и новый токен, а сами события
+клиент загружает через BatchGetEvents.
+
+SyncIndex подписывается на изменения хранилища (EventStore.add_listener)
+и для каждого измененного события помнит ревизию последнего изменения и
+признак удаления: хранилище удаляет запись бесследно, а в индексе от нее
+остается надгробие. Изменения лежат в списке по возрастанию ревизий,
+поэтому начало ответа находится двоичным поиском, и ответ стоит
+пропорционально числу изменений после токена, а не размеру календаря.
+
+Индекс хранится в памяти и помнит не больше capacity событий: давние
+изменения вытесняются. Пустой токен, токен старше вытесненных изменений и
+токен другой эпохи хранилища (выданный до перезапуска сервера) получают
+SyncReset: клиент загружает события заново через ListEvents и дальше
+синхронизируется с токена, выданного перед загрузкой.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from records import EventRecord
+from storage import EventStore
+
+
+# Сколько последних измененных событий помнит индекс
+DEFAULT_CAPACITY = 100_000
+
+
+class SyncReset(LookupError):
+    """Изменения после токена неизвестны, нужна полная загрузка событий"""
+
+
+def encode_sync_token(epoch: str, revision: int) -> str:
+    return f'{epoch}.{revision}'
+
+
+def decode_sync_token(token: str) -> Tuple[str, int]:
+    epoch, _, revision = token.partition('.')
+    if not epoch or not revision.isdigit():
+        raise ValueError("Некорректный токен синхронизации")
+    return epoch, int(revision)
+
+
+class SyncIndex:
+    """Последняя ревизия изменения каждого измененного события, включая удаленные"""
+
+    def __init__(self, store: EventStore, capacity: int = DEFAULT_CAPACITY):
+        self.store = store
+        self.capacity = capacity
+        # Ревизия последнего изменения; изменения до _floor включительно индексу неизвестны
+        self.revision = store.revision
+        self._floor = store.revision
+        # ID события -> (ревизия последнего изменения, удалено ли)
+        self._latest: Dict[str, Tuple[int, bool]] = {}
+        # Ревизии и ID изменений по возрастанию, включая перекрытые более поздними
+        self._revisions: List[int] = []
+        self._ids: List[str] = []
+        self._lock = threading.Lock()
+        store.add_listener(self.append)
+
+    def append(self, revision: int, current: Optional[EventRecord], event: Optional[EventRecord]):
+        """Подписчик EventStore.add_listener"""
+        event_id = (current if event is None else event).event_id
+        with self._lock:
+            if revision != self.revision + 1:
+                # Пропуск ревизий (load хранилища): прежние изменения уже не полны
+                self._forget(revision - 1)
+            self._latest[event_id] = (revision, event is None)
+            self._revisions.append(revision)
+            self._ids.append(event_id)
+            self.revision = revision
+            # Перекрытые изменения и лишние события убираем пачками
+            if len(self._ids) > 2 * self.capacity:
+                self._compact()
+
+    def _forget(self, floor: int):
+        self._floor = floor
+        self._latest = {}
+        self._revisions = []
+        self._ids = []
+
+    def _compact(self):
+        """Оставляет только последние изменения не более чем capacity событий"""
+        entries = [(revision, event_id) for revision, event_id in zip(self._revisions, self._ids)
+                   if self._latest[event_id][0] == revision]
+        evicted = len(entries) - self.capacity
+        if evicted > 0:
+            for _, event_id in entries[:evicted]:
+                del self._latest[event_id]
+            self._floor = entries[evicted - 1][0]
+            entries = entries[evicted:]
+        self._revisions = [revision for revision, _ in entries]
+        self._ids = [event_id for _, event_id in entries]
+
+    def token(self) -> str:
+        """Токен текущего состояния (для полной загрузки после SyncReset)"""
+        with self._lock:
+            return encode_sync_token(self.store.epoch, self.revision)
+
+    def read(self, token: str, limit: int) -> Tuple[List[str], List[str], str, bool]:
+        """Изменения после token: (измененные ID, удаленные ID, новый токен, есть ли еще).
+
+        Каждое событие попадает в ответ один раз, по последнему изменению.
+        ValueError - некорректный токен, SyncReset - нужна полная загрузка.
+        """
+        epoch, after = decode_sync_token(token)
+        with self._lock:
+            if epoch != self.store.epoch or not self._floor <= after <= self.revision:
+                raise SyncReset("Изменения после токена недоступны, нужна полная загрузка событий")
+            changed, deleted = [], []
+            start = bisect.bisect_right(self._revisions, after)
+            last = self.revision
+            for position in range(start, len(self._ids)):
+                event_id = self._ids[position]
+                revision, removed = self._latest[event_id]
+                if revision != self._revisions[position]:
+                    continue  # Событие изменилось еще раз позже
+                if len(changed) + len(deleted) == limit:
+                    last = after
+                    break
+                (deleted if removed else changed).append(event_id)
+                after = revision
+            return changed, deleted, encode_sync_token(epoch, last), last != self.revision
@@ -0,0 +1,40 @@
+"""Асинхронный клиент на grpc.aio"""
+import asyncio
+
+import pytest
+
+from async_client import AsyncCalendarClient
+from channels import ChannelConfig
+from server import create_server
+from storage import InMemoryEventStore
+
+
+@pytest.fixture
+def target():
+    server, port = create_server(InMemoryEventStore(), port=0, sample_data=False)
+    yield f'localhost:{port}'
+    server.stop(0).wait()
+
+
+def test_gather_events(target):
+    async def run():
+        async with AsyncCalendarClient(ChannelConfig(target=target)) as client:
+            created = [
+                (await client.create_event(title=f'Встреча {hour}', start_time=f'2030-01-01T{hour:02d}:00:00',
+                                           end_time=f'2030-01-01T{hour:02d}:30:00', attendees=['a@company.com'])).event
+                for hour in range(8, 12)
+            ]
+            ids = [event.event_id for event in created] + ['missing']
+            events = await client.gather_events(ids, concurrency=2)
+            assert [event and event.event_id for event in events] == ids[:-1] + [None]
+
+    asyncio.run(run())
+
+
+def test_gather_events_rejects_zero_concurrency(target):
+    async def run():
+        async with AsyncCalendarClient(ChannelConfig(target=target)) as client:
+            with pytest.raises(ValueError):
+                await client.gather_events(['missing'], concurrency=0)
+
+    asyncio.run(run())
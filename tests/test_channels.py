@@ -0,0 +1,47 @@
+"""Проверка настроек каналов клиента"""
+import json
+
+import pytest
+
+from channels import MIN_KEEPALIVE_TIME, ChannelConfig, ChannelPool, channel_options, service_config
+
+
+def method_configs(config: ChannelConfig) -> dict:
+    """Метод -> его запись methodConfig"""
+    return {name['method']: method_config
+            for method_config in service_config(config)['methodConfig'] for name in method_config['name']}
+
+
+def test_service_config_timeouts_and_retries():
+    configs = method_configs(ChannelConfig(timeout=2.5, method_timeouts=(('ListEvents', 30),), max_attempts=4))
+    assert configs['GetEvent']['timeout'] == '2.5s' and configs['GetEvent']['retryPolicy']['maxAttempts'] == 4
+    assert configs['ListEvents']['timeout'] == '30s'
+    # Записи не повторяются, потоковые методы идут без срока по умолчанию
+    assert 'retryPolicy' not in configs['CreateEvent']
+    assert 'timeout' not in configs['WatchEvents']
+    assert 'retryPolicy' not in method_configs(ChannelConfig(max_attempts=1))['GetEvent']
+
+
+def test_channel_options_validation():
+    options = dict(channel_options(ChannelConfig(compression='gzip')))
+    assert json.loads(options['grpc.service_config']) == service_config(ChannelConfig())
+    with pytest.raises(ValueError):
+        channel_options(ChannelConfig(compression='brotli'))
+    with pytest.raises(ValueError):
+        channel_options(ChannelConfig(retry_codes=('NOT_A_CODE',)))
+
+
+def test_pool_hands_out_channels_round_robin():
+    with ChannelPool(ChannelConfig(pool_size=3)) as pool:
+        stubs = [pool.stub() for _ in range(6)]
+        assert stubs[:3] == stubs[3:] and len(set(map(id, stubs[:3]))) == 3
+    with pytest.raises(ValueError):
+        ChannelPool(ChannelConfig(pool_size=0))
+
+
+def test_keepalive_below_server_minimum_rejected():
+    with pytest.raises(ValueError):
+        channel_options(ChannelConfig(keepalive_time=1))
+    options = dict(channel_options(ChannelConfig(keepalive_time=MIN_KEEPALIVE_TIME)))
+    assert options['grpc.keepalive_time_ms'] == MIN_KEEPALIVE_TIME * 1000
+    assert 'grpc.keepalive_time_ms' not in dict(channel_options(ChannelConfig(keepalive_time=0)))
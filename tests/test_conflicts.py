@@ -0,0 +1,66 @@
+"""Конфликты, заранее вычисленные BulkConflictChecker, и их прием хранилищем"""
+import random
+
+import pytest
+
+from conflicts import BulkConflictChecker, check_series
+from records import DAY, EventRecord
+from recurrence import Recurrence
+from storage import CheckedConflicts, InMemoryEventStore
+
+pytest.importorskip('numpy')
+
+HOUR = 3600 * 1_000_000
+PEOPLE = [f'user{i}@company.com' for i in range(6)]
+
+
+def event(event_id: str, start: int, attendees, recurrence=None) -> EventRecord:
+    return EventRecord(event_id, 'Встреча', '', start, start + HOUR, '', attendees,
+                       'b@company.com', 'scheduled', 0, 0, recurrence=recurrence)
+
+
+def keys(conflicts):
+    """Конфликты без самих записей: вхождения серий создаются заново при каждой проверке"""
+    return [(other.event_id, other.start, common) for other, common in conflicts]
+
+
+@pytest.fixture
+def store():
+    rng = random.Random(1)
+    store = InMemoryEventStore()
+    for i in range(2000):
+        store.put(event(f'e{i}', rng.randrange(200 * 24) * HOUR, rng.sample(PEOPLE, 2)))
+    store.put(event('weekly', 9 * HOUR, PEOPLE[:2], Recurrence('weekly', 2, 30)))
+    return store
+
+
+def test_check_series_matches_store(store):
+    rng = random.Random(2)
+    checked = 0
+    for i in range(50):
+        candidate = event(f'c{i}', rng.randrange(100 * 24) * HOUR, rng.sample(PEOPLE, 2),
+                          Recurrence(rng.choice(['daily', 'weekly']), rng.randint(1, 3), rng.randint(16, 100)))
+        result = check_series(store, candidate)
+        if result is not None:
+            checked += 1
+            assert result.revision == store.revision
+            assert keys(result.conflicts) == keys(store.event_conflicts(candidate))
+    assert checked
+
+
+def test_create_rechecks_after_store_changed(store):
+    candidate = event('new', 500 * DAY, PEOPLE[:1])
+    stale = CheckedConflicts(store.revision, [])
+    store.put(event('blocker', 500 * DAY, PEOPLE[:1]))
+    assert [other.event_id for other, _ in store.create(candidate, stale)] == ['blocker']
+
+
+def test_checker_revision_follows_accepted_events(store):
+    candidates = [event(f'n{i}', (1000 * 24 + i) * HOUR, PEOPLE[:2]) for i in range(20)]
+    checker = BulkConflictChecker(store, candidates)
+    assert checker.bulk
+    for index, candidate in enumerate(candidates):
+        checked = checker.checked(index)
+        assert checked.revision == store.revision
+        assert store.create(candidate, checked) == []
+        checker.accept(candidate)
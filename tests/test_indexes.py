@@ -0,0 +1,46 @@
+"""Индекс интервалов участников при чтении без блокировок"""
+import threading
+
+from indexes import AttendeeIntervalIndex
+
+
+def test_intervals_consistent_during_writes():
+    index = AttendeeIntervalIndex()
+    # Длительность события однозначно задается его началом
+    duration = {start: 1 + start % 97 for start in range(0, 20000, 10)}
+    stop = threading.Event()
+    errors = []
+
+    def write():
+        while not stop.is_set():
+            for start in duration:
+                index.add(f'e{start}', start, start + duration[start], ['a'])
+            for start in duration:
+                index.remove(f'e{start}', start, start + duration[start], ['a'])
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(2000):
+            try:
+                for start, end in index.intervals('a', 0, 20000):
+                    if end - start != duration[start]:
+                        errors.append((start, end))
+                for event_id, common in index.find_overlaps(0, 20000, ['a']):
+                    if common != ['a']:
+                        errors.append(event_id)
+            except IndexError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+    assert not errors
+
+
+def test_remove_with_equal_starts():
+    index = AttendeeIntervalIndex()
+    index.load([('b', 10, 30, ['a']), ('a', 10, 20, ['a']), ('c', 5, 40, ['a'])])
+    index.add('d', 10, 15, ['a'])
+    index.remove('a', 10, 20, ['a'])
+    assert index.intervals('a', 0, 100) == [(5, 40), (10, 15), (10, 30)]
+    assert [event_id for event_id, _ in index.find_overlaps(0, 100, ['a'])] == ['c', 'b', 'd']
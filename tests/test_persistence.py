@@ -0,0 +1,159 @@
+"""Журнал, снимки и восстановление хранилища с диска"""
+import os
+import time
+
+from persistence import ORPHANED_SUFFIX, SNAPSHOT_FILE, list_segments, open_store, read_snapshot
+from records import EventRecord
+
+
+def record(number: int, attendee: str = 'a@company.com', title: str = '') -> EventRecord:
+    return EventRecord(f'event_{number:05d}', title or f'Событие {number}', '', number * 1000, number * 1000 + 500,
+                       '', [attendee], 'b@company.com', 'scheduled', 0, 0)
+
+
+def contents(store):
+    return {event.event_id: event.to_row() for event in store.values()}
+
+
+def fill(store, numbers):
+    for number in numbers:
+        assert store.create(record(number)) == []
+
+
+def test_restart_round_trip(tmp_path):
+    store = open_store(str(tmp_path))
+    fill(store, range(20))
+    store.update('event_00001', lambda event: event.replace(title='Изменено'))
+    store.delete('event_00002')
+    expected, revision = contents(store), store.revision
+    store.journal.close()
+
+    restored = open_store(str(tmp_path))
+    assert contents(restored) == expected and restored.revision == revision
+    # Журнал продолжается с восстановленной ревизии
+    restored.create(record(100))
+    restored.journal.close()
+    again = open_store(str(tmp_path))
+    assert again.revision == revision + 1 and again.get('event_00100') is not None
+
+
+def test_torn_last_frame_is_dropped(tmp_path):
+    store = open_store(str(tmp_path))
+    fill(store, range(5))
+    expected, revision = contents(store), store.revision
+    store.journal.close()
+    (_, path), = list_segments(str(tmp_path))
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        # Заголовок кадра на 64 байта, от данных которого дописана только часть
+        f.write(b'\x40\x00\x00\x00\x00\x00\x00\x00partial')
+
+    restored = open_store(str(tmp_path))
+    assert contents(restored) == expected and restored.revision == revision
+    assert os.path.getsize(path) == size
+    restored.create(record(5))
+    restored.journal.close()
+    assert open_store(str(tmp_path)).revision == revision + 1
+
+
+def test_corrupt_frame_stops_replay_before_later_segments(tmp_path):
+    store = open_store(str(tmp_path))
+    fill(store, range(5))
+    store.journal._wal.rotate()
+    fill(store, range(5, 10))
+    store.close()
+    (_, first), (_, second) = list_segments(str(tmp_path))
+    # Портится последний кадр первого сегмента (ревизия 5)
+    with open(first, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    restored = open_store(str(tmp_path))
+    # Изменения второго сегмента (ревизии 6-10) не применяются поверх пропуска
+    assert restored.revision == 4
+    assert sorted(contents(restored)) == [f'event_{number:05d}' for number in range(4)]
+    assert os.path.exists(second + ORPHANED_SUFFIX)
+    assert second not in [path for _, path in list_segments(str(tmp_path))]
+
+    restored.create(record(20))
+    restored.close()
+    again = open_store(str(tmp_path))
+    assert again.revision == 5 and sorted(contents(again))[-1] == 'event_00020'
+
+
+def test_snapshot_removes_old_segments(tmp_path):
+    store = open_store(str(tmp_path))
+    store.journal.snapshot_every = 10
+    fill(store, range(25))
+    # Снимок пишется фоновым потоком
+    deadline = time.monotonic() + 10
+    while read_snapshot(str(tmp_path)) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.journal.snapshot()
+    assert read_snapshot(str(tmp_path)).revision == store.revision
+    assert [path for _, path in list_segments(str(tmp_path))] == [store.journal._wal.path]
+    assert not os.path.exists(os.path.join(str(tmp_path), SNAPSHOT_FILE + '.tmp'))
+
+    store.delete('event_00000')
+    expected, revision = contents(store), store.revision
+    store.close()
+    restored = open_store(str(tmp_path))
+    assert contents(restored) == expected and restored.revision == revision
+    assert restored.base is not None and len(restored._events) == 0
+
+
+def test_snapshot_moves_store_onto_new_base(tmp_path):
+    store = open_store(str(tmp_path))
+    for number in range(100):
+        assert store.create(record(number)) == []
+    store.delete('event_00003')
+    store.update('event_00004', lambda event: event.replace(title='Перенесено'))
+    expected = contents(store)
+
+    store.journal.snapshot()
+    # Все записи теперь читаются из снимка, в памяти ничего не осталось
+    assert store.base is not None and store.base.revision == store.revision
+    assert not store._events and not store._shadowed
+    assert contents(store) == expected and len(store) == 99
+    assert [event.event_id for event, _ in store.find_conflicts(5000, 5100, ['a@company.com'])] == ['event_00005']
+
+    # Изменения поверх нового снимка снова перекрывают его записи
+    store.update('event_00005', lambda event: event.replace(title='Снова'))
+    store.delete('event_00006')
+    assert store.get('event_00005').title == 'Снова' and store.get('event_00006') is None
+    assert store._shadowed == {'event_00005', 'event_00006'} and len(store) == 98
+    expected = contents(store)
+    store.close()
+
+    assert contents(open_store(str(tmp_path))) == expected
+
+
+def test_changes_during_snapshot_stay_in_memory(tmp_path):
+    store = open_store(str(tmp_path))
+    for number in range(10):
+        store.create(record(number))
+    dump = store.dump
+
+    def dump_then_write():
+        # Изменения после среза не попадают в снимок
+        snapshot = dump()
+        store.update('event_00001', lambda event: event.replace(title='После среза'))
+        store.delete('event_00002')
+        store.create(record(10))
+        return snapshot
+
+    store.dump = dump_then_write
+    store.journal.snapshot()
+    del store.dump
+
+    assert store.base.revision == store.revision - 3
+    assert set(store._events) == {'event_00001', 'event_00010'}
+    assert store._shadowed == {'event_00001', 'event_00002'}
+    assert store.get('event_00001').title == 'После среза' and store.get('event_00002') is None
+    assert len(store) == 10
+    expected = contents(store)
+    store.close()
+
+    assert contents(open_store(str(tmp_path))) == expected
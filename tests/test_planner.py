@@ -0,0 +1,22 @@
+"""Счетчики планировщика запросов InMemoryEventStore"""
+from records import DAY, EventRecord
+from storage import InMemoryEventStore
+
+HOUR = 3600 * 1_000_000
+
+
+def test_planner_counts_chosen_index():
+    store = InMemoryEventStore()
+    for i in range(100):
+        store.put(EventRecord(f'e{i}', 'Встреча', '', i * HOUR, i * HOUR + HOUR, '', ['a@company.com'],
+                              'boss@company.com' if i % 10 == 0 else 'b@company.com', 'scheduled', 0, 0))
+
+    assert len(store.query(organizer='boss@company.com')) == 10
+    assert len(store.query(lower=0, upper=DAY, organizer='b@company.com')) == 21
+    # Брошенная на середине выдача тоже учитывается
+    next(store.iter_query(lower=0, upper=DAY))
+
+    stats = store.planner_stats()
+    assert stats['organizer'] == {'queries': 1, 'scanned': 10, 'returned': 10}
+    assert stats['start'] == {'queries': 2, 'scanned': 25, 'returned': 22}
+    assert stats['status']['queries'] == 0
@@ -0,0 +1,75 @@
+"""Окончание серий, ограничения правила повторения и конфликты с вхождениями"""
+import random
+
+import pytest
+
+import calendar_pb2
+from records import DAY, EventRecord
+from recurrence import MAX_COUNT, Recurrence, series_end
+from storage import InMemoryEventStore
+
+HOUR = 3600 * 1_000_000
+
+
+def series(recurrence: Recurrence, start: int = 100 * DAY + 9 * HOUR) -> EventRecord:
+    return EventRecord('series', 'Серия', '', start, start + HOUR, '', ['a@company.com'],
+                       'b@company.com', 'scheduled', 0, 0, recurrence=recurrence)
+
+
+def walked_end(event: EventRecord) -> int:
+    """Окончание серии перебором всех вхождений"""
+    last = event.start
+    for last in event.recurrence.starts(event.start, 0):
+        pass
+    return last + event.end - event.start
+
+
+@pytest.mark.parametrize('frequency', ['daily', 'weekly', 'monthly'])
+def test_series_end_matches_walk(frequency):
+    rng = random.Random(frequency)
+    for _ in range(500):
+        start = rng.randrange(1000) * DAY + 9 * HOUR
+        weekdays = ()
+        if frequency == 'weekly' and rng.random() < 0.5:
+            weekdays = tuple(sorted({((start // DAY) + 3) % 7, *rng.sample(range(7), 2)}))
+        count = rng.choice([0, rng.randint(1, 50)])
+        until = start + rng.randrange(-DAY, 300 * DAY) if not count or rng.random() < 0.3 else None
+        recurrence = Recurrence(frequency, rng.randint(1, 3), count, until, weekdays)
+        # Исключаются последние вхождения, чтобы окончание сдвигалось назад
+        starts = list(recurrence.starts(start, 0))
+        recurrence = recurrence._replace(exceptions=frozenset(starts[-rng.randint(0, 3):]))
+        event = series(recurrence, start)
+        assert series_end(event) == walked_end(event)
+
+
+def test_series_end_of_endless_series():
+    assert series_end(series(Recurrence('daily'))) is None
+
+
+def test_single_event_conflicts_with_occurrence():
+    store = InMemoryEventStore()
+    daily = series(Recurrence('daily', 1, 10))
+    assert store.create(daily) == []
+    single = EventRecord('single', 'Встреча', '', daily.start + 5 * DAY, daily.start + 5 * DAY + HOUR, '',
+                         ['a@company.com'], 'b@company.com', 'scheduled', 0, 0)
+    assert [(other.event_id, other.start) for other, _ in store.create(single)] == [('series', single.start)]
+    later = single.replace(event_id='later', start=single.start + 10 * DAY, end=single.end + 10 * DAY)
+    assert store.create(later) == []
+
+
+def test_rule_limits():
+    with pytest.raises(ValueError):
+        Recurrence.from_proto(calendar_pb2.Recurrence(frequency='daily', count=MAX_COUNT + 1))
+    with pytest.raises(ValueError):
+        Recurrence.from_proto(calendar_pb2.Recurrence(frequency='daily', until='2500-01-01T00:00:00'))
+    assert Recurrence.from_proto(calendar_pb2.Recurrence(frequency='daily', count=MAX_COUNT)).count == MAX_COUNT
+
+
+def test_finite_series_conflict_beyond_horizon():
+    # Раз в 53 недели и каждый день: первое общее вхождение через 371 день
+    store = InMemoryEventStore()
+    weekly = series(Recurrence('weekly', 53, 3))
+    assert store.create(weekly) == []
+    daily = series(Recurrence('daily', 1, 800), weekly.start + DAY).replace(event_id='daily')
+    conflicts = store.create(daily)
+    assert [(other.event_id, other.start) for other, _ in conflicts] == [('series', weekly.start + 371 * DAY)]
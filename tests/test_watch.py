@@ -0,0 +1,83 @@
+"""Подписки WatchEvents; на синхронном сервере они не занимают весь пул потоков"""
+from concurrent import futures
+
+import grpc
+import pytest
+
+import calendar_pb2
+import calendar_pb2_grpc
+from server import CalendarServicer, add_servicer, create_server, watcher_limit
+from storage import InMemoryEventStore
+
+
+MAX_WORKERS = 4
+
+
+def test_watch_streams_changes_in_revision_order():
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_servicer(CalendarServicer(InMemoryEventStore(), sample_data=False), server)
+    port = server.add_insecure_port('localhost:0')
+    server.start()
+    channel = grpc.insecure_channel(f'localhost:{port}')
+    stub = calendar_pb2_grpc.CalendarServiceStub(channel)
+    try:
+        call = stub.WatchEvents(calendar_pb2.WatchRequest(), timeout=30)
+        start = next(call)
+        assert start.type == 'progress'
+
+        created = stub.CreateEvent(calendar_pb2.EventDetails(
+            title='Встреча', start_time='2030-01-01T10:00:00', end_time='2030-01-01T11:00:00',
+            attendees=['a@company.com'], organizer='b@company.com'
+        ), timeout=3).event
+        stub.DeleteEvent(calendar_pb2.EventRequest(event_id=created.event_id), timeout=3)
+        changes = [next(call), next(call)]
+        assert [(change.type, change.event.event_id) for change in changes] == [
+            ('created', created.event_id), ('deleted', created.event_id)
+        ]
+        assert [change.revision for change in changes] == [start.revision + 1, start.revision + 2]
+        call.cancel()
+    finally:
+        channel.close()
+        server.stop(0).wait()
+
+
+@pytest.fixture
+def stub():
+    server, port = create_server(InMemoryEventStore(), port=0, max_workers=MAX_WORKERS, sample_data=False)
+    channel = grpc.insecure_channel(f'localhost:{port}')
+    yield calendar_pb2_grpc.CalendarServiceStub(channel)
+    channel.close()
+    server.stop(0).wait()
+
+
+def test_write_succeeds_with_max_workers_watchers(stub):
+    watchers, refused = [], 0
+    for _ in range(MAX_WORKERS):
+        call = stub.WatchEvents(calendar_pb2.WatchRequest(), timeout=30)
+        try:
+            assert next(call).type == 'progress'
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+            refused += 1
+        watchers.append(call)
+    try:
+        assert refused == MAX_WORKERS - watcher_limit(MAX_WORKERS)
+
+        response = stub.CreateEvent(calendar_pb2.EventDetails(
+            title='Встреча', start_time='2030-01-01T10:00:00', end_time='2030-01-01T11:00:00',
+            attendees=['a@company.com'], organizer='b@company.com'
+        ), timeout=3)
+        assert response.success
+
+        # Принятые подписки получают созданное событие
+        for call in watchers[:MAX_WORKERS - refused]:
+            change = next(call)
+            assert change.type == 'created' and change.event.event_id == response.event.event_id
+    finally:
+        for call in watchers:
+            call.cancel()
+
+
+def test_watcher_limit_allows_one_watcher_on_single_worker():
+    assert watcher_limit(1) == 1
+    assert watcher_limit(MAX_WORKERS) == MAX_WORKERS // 2